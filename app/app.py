@@ -1,9 +1,10 @@
 import os
 import json
+import contextlib
 import random
 import logging
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, send_file, Response, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
 import io
 from reportlab.pdfgen import canvas
@@ -19,7 +20,18 @@ app.secret_key = os.environ.get("APP_SECRET", "dev-secret-key-change-in-producti
 # Импорт и инициализация базы данных
 try:
     from database import db_instance
+    from async_database import async_db_instance
+    from session_storage import save_session, save_session_async, iter_sessions
+    from query_stats import query_stats
+    import stats_rollups
+    from session_archive import find_session
+    from settings_cache import SettingsCache
     db = db_instance
+    # Кэш таблицы settings (сброс по NOTIFY / опросу ревизии)
+    settings_cache = SettingsCache(db)
+    async_db = async_db_instance
+    # Асинхронный бэкенд для пути кандидата (DB_ASYNC=true и установлен asyncpg/aiosqlite)
+    use_async_db = os.environ.get("DB_ASYNC", "false").lower() == "true" and async_db.available
 except ImportError:
     logger.error("Не удалось импортировать database.py")
     # Создаем заглушку
@@ -28,12 +40,80 @@ except ImportError:
             return []
         def init_database(self):
             return True
+        def release_connection(self, discard=False):
+            pass
+        def pool_stats(self):
+            return {}
+        def bulk_insert(self, table, rows, columns=None, batch_size=None, ignore_conflicts=False):
+            return {'inserted': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+        def iter_query(self, *args, **kwargs):
+            return iter([])
+        def transaction(self):
+            return contextlib.nullcontext(self)
+    class SettingsStub:
+        def get_all(self):
+            return {}
+        def get(self, key, default=None):
+            return default
+        def get_int(self, key, default=0):
+            return default
+        def stats(self):
+            return {}
     db = DBStub()
+    settings_cache = SettingsStub()
+    use_async_db = False
+    query_stats = None
+    stats_rollups = None
+
+@app.before_request
+def begin_query_budget():
+    """Начало подсчета обращений к БД для текущего запроса"""
+    if query_stats is not None:
+        query_stats.begin_request(request.endpoint or request.path)
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    """Возврат соединения запроса в пул"""
+    if query_stats is not None:
+        query_stats.end_request()
+    db.release_connection()
+
+try:
+    import generators
+    from generators.question_pool import ReloadableBank
+    from generated_questions import save_generated_questions
+    import bank_builder
+    from generators.blueprint import BlueprintError, allocate, blueprint_sampler, parse_blueprint
+
+    def _warm_bank(bank):
+        """Сборка сэмплера бланка для новой версии банка до подмены"""
+        try:
+            blueprint_sampler(bank, settings_cache.get('test_blueprint'), settings_cache.get_int('questions_per_test', 50))
+        finally:
+            # Фоновый поток: соединение, взятое чтением настроек, возвращается в пул
+            db.release_connection()
+
+    # Скомпилированный банк вопросов (общий для воркеров через mmap): открывается
+    # при первом тесте в воркере; новая сборка файла подхватывается без перезапуска
+    question_pool = ReloadableBank(prepare=_warm_bank)
+except ImportError:
+    question_pool = None
+    parse_blueprint = None
+    generators = None
 
 class QuestionGenerator:
     """Заглушка генератора вопросов"""
-    def get_test_questions(self, count=50):
-        """Генерация тестовых вопросов"""
+    def __init__(self):
+        self._generator = None
+    
+    def get_test_questions(self, count=50, blueprint=None, snapshot=None):
+        """Генерация тестовых вопросов из снимка банка (версия, банк)"""
+        if snapshot is None and question_pool is not None:
+            snapshot = question_pool.snapshot()
+        bank = snapshot[1] if snapshot else None
+        if bank:
+            # Квоты бланка теста; перефразировки одного факта - только если фактов не хватает
+            return blueprint_sampler(bank, blueprint, count).sample()
         questions = []
         for i in range(count):
             questions.append({
@@ -46,9 +126,12 @@ class QuestionGenerator:
             })
         return questions
     
-    def generate_question_pool(self, count=100):
-        """Генерация пула вопросов"""
-        return self.get_test_questions(count)
+    def iter_questions(self, count, seed=None):
+        """Поток вопросов пула из базы знаний: тот же seed - те же вопросы"""
+        if self._generator is None:
+            # База знаний загружается при первой генерации, а не при импорте
+            self._generator = generators.QuestionGenerator(bank=False)
+        return self._generator.iter_questions(count, seed)
 
 question_generator = QuestionGenerator()
 
@@ -63,8 +146,7 @@ def is_admin_authenticated():
 def get_smtp_settings():
     """Получение настроек SMTP"""
     try:
-        settings = db.execute_query("SELECT key, value FROM settings")
-        return {s['key']: s['value'] for s in settings}
+        return dict(settings_cache.get_all())
     except:
         return {}
 
@@ -85,11 +167,14 @@ def start_test():
         return redirect(url_for('index'))
     
     try:
-        # Получаем вопросы для теста
-        test_questions = question_generator.get_test_questions(50)
+        # Получаем вопросы для теста; тест целиком из одной версии банка
+        snapshot = question_pool.snapshot() if question_pool is not None else (None, None)
+        test_questions = question_generator.get_test_questions(settings_cache.get_int('questions_per_test', 50),
+                                                               settings_cache.get('test_blueprint'), snapshot)
         
         # Инициализируем сессию теста
         session['test_questions'] = test_questions
+        session['pool_version'] = snapshot[0]
         session['user_name'] = full_name
         session['current_question'] = 0
         session['answers'] = []
@@ -165,13 +250,8 @@ def process_answer():
     else:
         return redirect(url_for('test_page'))
 
-@app.route('/test/results')
-def test_results():
-    """Страница результатов"""
-    if 'test_questions' not in session or 'answers' not in session:
-        flash('Результаты недоступны. Пожалуйста, пройдите тест.')
-        return redirect(url_for('index'))
-    
+def _test_results_data():
+    """Итоги теста из сессии: (аргументы save_session, данные шаблона)"""
     questions = session['test_questions']
     answers = session['answers']
     
@@ -181,23 +261,15 @@ def test_results():
     percent_score = (total_score / total_questions) * 100 if total_questions > 0 else 0
     level = 'L2' if percent_score >= 70 else 'L1'
     
-    # Сохранение результатов в базу
-    try:
-        db.execute_query('''
-            INSERT INTO test_sessions 
-            (user_identifier, user_display_name, questions_data, answers_data, score, percent, level)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            session.get('user_name', 'unknown'),
-            session.get('user_name', 'Unknown User'),
-            json.dumps(questions),
-            json.dumps(answers),
-            total_score,
-            round(percent_score, 2),
-            level
-        ))
-    except Exception as e:
-        logger.error(f"Ошибка сохранения результатов: {e}")
+    result_args = (
+        session.get('user_name', 'unknown'),
+        session.get('user_name', 'Unknown User'),
+        questions,
+        answers,
+        total_score,
+        round(percent_score, 2),
+        level
+    )
     
     # Подготовка данных для шаблона
     results_data = []
@@ -210,18 +282,56 @@ def test_results():
             'is_correct': answer.get('is_correct', False)
         })
     
+    context = {
+        'score': total_score,
+        'total': total_questions,
+        'percent': round(percent_score, 2),
+        'level': level,
+        'results': results_data
+    }
+    return result_args, context
+
+def _render_test_results(context):
     # Очистка сессии
     session.pop('test_questions', None)
     session.pop('answers', None)
     session.pop('current_question', None)
     session.pop('user_name', None)
     
-    return render_template('results.html', 
-                         score=total_score, 
-                         total=total_questions, 
-                         percent=round(percent_score, 2),
-                         level=level,
-                         results=results_data)
+    return render_template('results.html', **context)
+
+def test_results():
+    """Страница результатов"""
+    if 'test_questions' not in session or 'answers' not in session:
+        flash('Результаты недоступны. Пожалуйста, пройдите тест.')
+        return redirect(url_for('index'))
+    
+    result_args, context = _test_results_data()
+    # Сохранение результатов в базу (соединение потока запроса, возврат - в teardown)
+    try:
+        save_session(db, *result_args)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения результатов: {e}")
+    
+    return _render_test_results(context)
+
+async def test_results_async():
+    """Страница результатов: сохранение через AsyncDatabase (DB_ASYNC=true)"""
+    if 'test_questions' not in session or 'answers' not in session:
+        flash('Результаты недоступны. Пожалуйста, пройдите тест.')
+        return redirect(url_for('index'))
+    
+    result_args, context = _test_results_data()
+    try:
+        await save_session_async(async_db, *result_args)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения результатов: {e}")
+    
+    return _render_test_results(context)
+
+# async view только с асинхронным бэкендом: синхронный save_session из async view
+# выполнился бы в отдельном потоке, и его соединение не вернулось бы в пул
+app.add_url_rule('/test/results', 'test_results', test_results_async if use_async_db else test_results)
 
 # Админ-панель
 @app.route('/admin/login', methods=['GET', 'POST'])
@@ -250,11 +360,11 @@ def admin_dashboard():
         return redirect(url_for('admin_login'))
     
     try:
-        # Получаем статистику
-        total_questions = len(db.execute_query("SELECT id FROM questions") or [])
-        total_sessions = len(db.execute_query("SELECT id FROM test_sessions") or [])
-        avg_result = db.execute_query("SELECT AVG(percent) as avg FROM test_sessions")
-        avg_score = avg_result[0]['avg'] if avg_result else 0
+        # Получаем статистику из агрегатов (одна строка)
+        totals = stats_rollups.summary(db)
+        total_questions = totals['total_questions']
+        total_sessions = totals['total_sessions']
+        avg_score = totals['avg_score']
     except Exception as e:
         logger.error(f"Ошибка получения статистики: {e}")
         total_questions = total_sessions = avg_score = 0
@@ -271,7 +381,7 @@ def admin_questions():
         return redirect(url_for('admin_login'))
     
     try:
-        questions = db.execute_query("SELECT * FROM questions ORDER BY id")
+        questions = db.execute_query("SELECT * FROM questions ORDER BY id", replica=True)
     except:
         questions = []
     
@@ -285,28 +395,22 @@ def generate_questions():
     
     try:
         count = int(request.json.get('count', 100))
-        questions = question_generator.generate_question_pool(count)
+        batch_size = request.json.get('batch_size')
         
-        added_count = 0
-        for q in questions:
-            try:
-                db.execute_query('''
-                    INSERT INTO questions 
-                    (question_text, question_type, options, correct_answer, category, level)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    q.get('question', ''),
-                    q.get('type', 'single_choice'),
-                    json.dumps(q.get('options', [])),
-                    json.dumps(q.get('correct', [])),
-                    'generated',
-                    q.get('level', 'L1')
-                ))
-                added_count += 1
-            except Exception as e:
-                logger.error(f"Ошибка сохранения вопроса: {e}")
+        # Вопросы идут потоком и сохраняются пачками: память не растет с count
+        questions = question_generator.iter_questions(count, seed=request.json.get('seed'))
+        result = save_generated_questions(db, questions, batch_size)
+        added_count = result['inserted']
+        if added_count:
+            # Новые вопросы попадают в банк после фоновой пересборки (воркеры подхватят файл)
+            bank_builder.schedule_refresh(db)
         
-        return jsonify({'message': f'Сгенерировано {added_count} вопросов'})
+        return jsonify({
+            'message': f'Сгенерировано {added_count} вопросов',
+            'skipped': result['skipped'],
+            'failed': result['failed'],
+            'errors': result['errors']
+        })
     except Exception as e:
         logger.error(f"Ошибка генерации вопросов: {e}")
         return jsonify({'error': str(e)}), 500
@@ -318,22 +422,129 @@ def admin_stats():
         return redirect(url_for('admin_login'))
     
     try:
-        total_questions = len(db.execute_query("SELECT id FROM questions") or [])
-        total_sessions = len(db.execute_query("SELECT id FROM test_sessions") or [])
-        avg_result = db.execute_query("SELECT AVG(percent) as avg FROM test_sessions")
-        avg_score = avg_result[0]['avg'] if avg_result else 0
-        recent_sessions = db.execute_query("SELECT * FROM test_sessions ORDER BY completed_at DESC LIMIT 10") or []
+        totals = stats_rollups.summary(db)
+        total_questions = totals['total_questions']
+        total_sessions = totals['total_sessions']
+        avg_score = totals['avg_score']
+        levels = stats_rollups.by_level(db)
+        daily = stats_rollups.by_day(db)
+        categories = stats_rollups.by_category(db)
+        recent_sessions = db.execute_query('''
+            SELECT id, user_identifier, user_display_name, score, percent, level, completed_at
+            FROM test_sessions ORDER BY completed_at DESC LIMIT 10
+        ''', replica=True) or []
     except Exception as e:
         logger.error(f"Ошибка загрузки статистики: {e}")
         total_questions = total_sessions = avg_score = 0
-        recent_sessions = []
+        levels = daily = categories = recent_sessions = []
     
     return render_template('admin_stats.html',
                          total_questions=total_questions,
                          total_sessions=total_sessions,
                          avg_score=round(avg_score or 0, 1),
+                         levels=levels,
+                         daily=daily,
+                         categories=categories,
                          recent_sessions=recent_sessions)
 
+@app.route('/admin/sessions/export')
+def admin_sessions_export():
+    """Выгрузка всех сессий тестирования в JSON Lines (потоково)"""
+    if not is_admin_authenticated():
+        return redirect(url_for('admin_login'))
+    
+    def generate():
+        for test_session in iter_sessions(db):
+            yield json.dumps(test_session, ensure_ascii=False, default=str) + '\n'
+    
+    return Response(stream_with_context(generate()),
+                    mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=test_sessions.jsonl'})
+
+@app.route('/admin/sessions/<int:session_id>')
+def admin_session_detail(session_id):
+    """Сессия тестирования по id (в том числе из архива)"""
+    if not is_admin_authenticated():
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    test_session = find_session(db, session_id)
+    if test_session is None:
+        return jsonify({'error': 'Сессия не найдена'}), 404
+    return app.response_class(json.dumps(test_session, ensure_ascii=False, default=str),
+                              mimetype='application/json')
+
+@app.route('/admin/settings', methods=['GET', 'POST'])
+def admin_settings():
+    """Просмотр и изменение настроек (JSON)"""
+    if not is_admin_authenticated():
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    if request.method == 'POST':
+        values = request.json or {}
+        if not isinstance(values, dict) or not values:
+            return jsonify({'error': 'Ожидается объект {ключ: значение}'}), 400
+        if isinstance(values.get('test_blueprint'), (dict, list)):
+            values['test_blueprint'] = json.dumps(values['test_blueprint'], ensure_ascii=False)
+        if parse_blueprint is not None and ('test_blueprint' in values or 'questions_per_test' in values):
+            try:
+                total = int(values.get('questions_per_test') or settings_cache.get_int('questions_per_test', 50))
+                blueprint = values.get('test_blueprint', settings_cache.get('test_blueprint'))
+                bank = question_pool.bank
+                if bank:
+                    # Квоты проверяются на загруженном банке: невыполнимый бланк не сохраняется
+                    blueprint_sampler(bank, blueprint, total)
+                else:
+                    allocate(parse_blueprint(blueprint), total)
+            except (BlueprintError, ValueError) as e:
+                return jsonify({'error': str(e)}), 400
+        try:
+            settings_cache.set_many({str(k): None if v is None else str(v) for k, v in values.items()})
+        except Exception as e:
+            logger.error(f"Ошибка сохранения настроек: {e}")
+            return jsonify({'error': str(e)}), 500
+    
+    settings = dict(settings_cache.get_all())
+    if settings.get('smtp_password'):
+        settings['smtp_password'] = '********'
+    return jsonify({'settings': settings, 'cache': settings_cache.stats()})
+
+@app.route('/admin/db/pool')
+def admin_db_pool():
+    """Статистика пула соединений с БД"""
+    if not is_admin_authenticated():
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    return jsonify(db.pool_stats())
+
+@app.route('/admin/questions/pool')
+def admin_question_pool():
+    """Версия загруженного банка вопросов и число перезагрузок"""
+    if not is_admin_authenticated():
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    if question_pool is None:
+        return jsonify({'version': None})
+    
+    if request.args.get('check'):
+        question_pool.check()
+    return jsonify(question_pool.stats())
+
+@app.route('/admin/db/queries')
+def admin_db_queries():
+    """Статистика запросов к БД: задержки по нормализованному SQL"""
+    if not is_admin_authenticated():
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    if query_stats is None:
+        return jsonify({'statements': []})
+    
+    return jsonify({
+        'slow_query_ms': query_stats.slow_query_ms,
+        'request_budget': query_stats.request_budget,
+        'repeat_limit': query_stats.repeat_limit,
+        'statements': query_stats.snapshot(int(request.args.get('limit', 50)))
+    })
+
 @app.route('/logout')
 def logout():
     """Выход из системы"""
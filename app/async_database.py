@@ -0,0 +1,311 @@
+import os
+import asyncio
+import logging
+import threading
+
+from sql_dialect import translate, POSTGRES, SQLITE
+from query_stats import query_stats
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+try:
+    import aiosqlite
+except ImportError:
+    aiosqlite = None
+
+logger = logging.getLogger(__name__)
+
+
+class _SqlitePool:
+    """Простой пул соединений aiosqlite (asyncpg.Pool-совместимый интерфейс)"""
+
+    def __init__(self, path, size):
+        self._path = path
+        self._size = size
+        self._created = 0
+        self._idle = asyncio.LifoQueue()
+
+    async def acquire(self, timeout=None):
+        if self._idle.empty() and self._created < self._size:
+            self._created += 1
+            try:
+                conn = await aiosqlite.connect(self._path, isolation_level=None)
+            except Exception:
+                self._created -= 1
+                raise
+            conn.row_factory = aiosqlite.Row
+            return conn
+        return await asyncio.wait_for(self._idle.get(), timeout)
+
+    async def release(self, conn):
+        if conn.in_transaction:
+            await conn.rollback()
+        self._idle.put_nowait(conn)
+
+    async def close(self):
+        while not self._idle.empty():
+            await self._idle.get_nowait().close()
+            self._created -= 1
+
+
+class AsyncDatabase:
+    """Асинхронная реализация интерфейса Database: asyncpg / aiosqlite.
+
+    Пул и соединения живут в отдельном потоке с собственным event loop, а
+    корутины любого другого loop (например, async view Flask, для которых
+    loop создается на каждый запрос) ожидают результат через
+    run_coroutine_threadsafe. Так пул переживает отдельные запросы.
+    """
+
+    def __init__(self, db_url=None):
+        self.db_url = db_url or os.environ.get("DATABASE_URL") or "sqlite:///quiz_dev.db"
+        self.pool_size = int(os.environ.get("DB_POOL_SIZE", "10"))
+        self.pool_timeout = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+        self.pool_max_idle = float(os.environ.get("DB_POOL_MAX_IDLE", "300"))
+        self._loop = None
+        self._loop_pid = None
+        self._loop_lock = threading.Lock()
+        self._pool = None
+        self._pool_lock = None
+
+    @property
+    def is_postgres(self):
+        return self.db_url.startswith('postgresql')
+
+    @property
+    def dialect(self):
+        return POSTGRES if self.is_postgres else SQLITE
+
+    @property
+    def available(self):
+        """Установлен ли асинхронный драйвер для текущей БД"""
+        return (asyncpg if self.is_postgres else aiosqlite) is not None
+
+    def _ensure_loop(self):
+        pid = os.getpid()
+        if self._loop is None or self._loop_pid != pid:
+            with self._loop_lock:
+                if self._loop is None or self._loop_pid != pid:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name='async-db', daemon=True)
+                    thread.start()
+                    self._loop = loop
+                    self._loop_pid = pid
+                    self._pool = None
+                    self._pool_lock = None
+        return self._loop
+
+    async def _submit(self, coro):
+        """Выполнение корутины на loop пула и ожидание ее из текущего loop"""
+        loop = self._ensure_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    # --- выполняется на loop пула ---
+
+    async def _get_pool(self):
+        if self._pool is None:
+            if self._pool_lock is None:
+                self._pool_lock = asyncio.Lock()
+            async with self._pool_lock:
+                if self._pool is None:
+                    if not self.available:
+                        raise RuntimeError("Асинхронный драйвер БД не установлен (asyncpg/aiosqlite)")
+                    if self.is_postgres:
+                        self._pool = await asyncpg.create_pool(
+                            self.db_url,
+                            min_size=1,
+                            max_size=self.pool_size,
+                            max_inactive_connection_lifetime=self.pool_max_idle
+                        )
+                    else:
+                        self._pool = _SqlitePool(self.db_url.replace('sqlite:///', ''), self.pool_size)
+        return self._pool
+
+    async def _acquire(self):
+        pool = await self._get_pool()
+        return await pool.acquire(timeout=self.pool_timeout)
+
+    async def _release(self, conn):
+        await self._pool.release(conn)
+
+    async def _run(self, conn, translated, params, fetch):
+        if self.is_postgres:
+            args = tuple(params or ())
+            if fetch:
+                return await conn.fetch(translated.dollar, *args)
+            await conn.execute(translated.dollar, *args)
+            return None
+
+        cursor = await conn.execute(translated.raw, tuple(params or ()))
+        try:
+            return await cursor.fetchall() if fetch else None
+        finally:
+            await cursor.close()
+
+    async def _insert(self, conn, translated, params):
+        if self.is_postgres:
+            return await conn.fetchval(translated.dollar.rstrip().rstrip(';') + ' RETURNING id', *tuple(params or ()))
+        cursor = await conn.execute(translated.raw, tuple(params or ()))
+        try:
+            return cursor.lastrowid
+        finally:
+            await cursor.close()
+
+    async def _run_many(self, conn, translated, rows):
+        if self.is_postgres:
+            await conn.executemany(translated.dollar, rows)
+        else:
+            await conn.executemany(translated.raw, rows)
+
+    async def _with_connection(self, work):
+        conn = await self._acquire()
+        try:
+            return await work(conn)
+        finally:
+            await self._release(conn)
+
+    # --- публичный интерфейс (вызывается из любого loop) ---
+
+    async def execute_query(self, query, params=None, fetch=None):
+        """Выполнение SQL запроса в autocommit (семантика как у Database.execute_query)"""
+        translated = translate(query, self.dialect)
+        if fetch is None:
+            fetch = translated.is_select
+        with query_stats.timed(query):
+            return await self._submit(self._with_connection(
+                lambda conn: self._run(conn, translated, params, fetch)
+            ))
+
+    async def execute_insert(self, query, params=None):
+        """INSERT одной строки с возвратом id новой записи"""
+        translated = translate(query, self.dialect)
+        with query_stats.timed(query):
+            return await self._submit(self._with_connection(
+                lambda conn: self._insert(conn, translated, params)
+            ))
+
+    def transaction(self):
+        """async with adb.transaction() as tx: запросы через tx - одним commit"""
+        return AsyncTransaction(self)
+
+    async def iter_query(self, query, params=None, batch_size=500):
+        """Потоковое чтение SELECT: курсор asyncpg в транзакции или fetchmany aiosqlite"""
+        translated = translate(query, self.dialect)
+        conn = await self._submit(self._acquire())
+        state = None
+        try:
+            state = await self._submit(self._open_cursor(conn, translated, params))
+            while True:
+                rows = await self._submit(self._fetch_batch(state, batch_size))
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            if state is not None:
+                await self._submit(self._close_cursor(state))
+            await self._submit(self._release(conn))
+
+    async def _open_cursor(self, conn, translated, params):
+        if self.is_postgres:
+            tr = conn.transaction(readonly=True)
+            await tr.start()
+            cursor = await conn.cursor(translated.dollar, *tuple(params or ()))
+            return (tr, cursor)
+        return (None, await conn.execute(translated.raw, tuple(params or ())))
+
+    async def _fetch_batch(self, state, batch_size):
+        tr, cursor = state
+        if self.is_postgres:
+            return await cursor.fetch(batch_size)
+        return await cursor.fetchmany(batch_size)
+
+    async def _close_cursor(self, state):
+        tr, cursor = state
+        if tr is not None:
+            await tr.rollback()
+        else:
+            await cursor.close()
+
+    async def close(self):
+        """Закрытие пула"""
+        if self._pool is not None:
+            await self._submit(self._pool.close())
+            self._pool = None
+
+
+class AsyncTransaction:
+    """Транзакция на одном соединении; вложенная transaction() - SAVEPOINT"""
+
+    def __init__(self, adb, conn=None, depth=0):
+        self._adb = adb
+        self._conn = conn
+        self._depth = depth
+
+    async def _statement(self, sql):
+        if self._adb.is_postgres:
+            await self._conn.execute(sql)
+        else:
+            await (await self._conn.execute(sql)).close()
+
+    async def __aenter__(self):
+        if self._depth == 0:
+            self._conn = await self._adb._submit(self._adb._acquire())
+            begin = "BEGIN"
+        else:
+            begin = f"SAVEPOINT sp_{self._depth}"
+        try:
+            await self._adb._submit(self._statement(begin))
+        except BaseException:
+            if self._depth == 0:
+                await self._adb._submit(self._adb._release(self._conn))
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        savepoint = f"sp_{self._depth}"
+        try:
+            if exc_type is None:
+                await self._adb._submit(self._statement("COMMIT" if self._depth == 0 else f"RELEASE SAVEPOINT {savepoint}"))
+            elif self._depth == 0:
+                await self._adb._submit(self._statement("ROLLBACK"))
+            else:
+                await self._adb._submit(self._statement(f"ROLLBACK TO SAVEPOINT {savepoint}"))
+                await self._adb._submit(self._statement(f"RELEASE SAVEPOINT {savepoint}"))
+        finally:
+            if self._depth == 0:
+                await self._adb._submit(self._adb._release(self._conn))
+        return False
+
+    def transaction(self):
+        return AsyncTransaction(self._adb, self._conn, self._depth + 1)
+
+    async def execute_query(self, query, params=None, fetch=None):
+        translated = translate(query, self._adb.dialect)
+        if fetch is None:
+            fetch = translated.is_select
+        with query_stats.timed(query):
+            return await self._adb._submit(self._adb._run(self._conn, translated, params, fetch))
+
+    async def execute_insert(self, query, params=None):
+        translated = translate(query, self._adb.dialect)
+        with query_stats.timed(query):
+            return await self._adb._submit(self._adb._insert(self._conn, translated, params))
+
+    async def executemany(self, query, rows):
+        translated = translate(query, self._adb.dialect)
+        with query_stats.timed(query):
+            return await self._adb._submit(self._adb._run_many(self._conn, translated, rows))
+
+
+# Глобальный экземпляр асинхронной базы данных
+async_db_instance = AsyncDatabase()
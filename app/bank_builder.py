@@ -0,0 +1,148 @@
+import os
+import json
+import random
+import logging
+import threading
+
+from generators import BankWriter, QuestionGenerator
+from generators.fingerprint import question_fingerprint
+from session_storage import load_json
+
+logger = logging.getLogger(__name__)
+
+# Вопросы из БД (добавленные в админке): активные и с отпечатком - у дубликатов его нет
+_DB_QUESTIONS = '''
+    SELECT question_text, question_type, options, correct_answer, category, level, weight, fingerprint
+    FROM questions
+    WHERE COALESCE(is_active, TRUE) AND fingerprint IS NOT NULL
+    ORDER BY id
+'''
+
+
+def bank_path(path=None):
+    return path or os.environ.get("QUESTION_BANK_PATH", "question_bank.bin")
+
+
+def read_build_meta(path=None):
+    """Параметры последней сборки банка (count, seed); {} - банк еще не собирался"""
+    try:
+        with open(bank_path(path) + '.meta', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_build_meta(path, meta):
+    tmp_path = path + '.meta.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path + '.meta')
+
+
+def _db_question(row):
+    return {
+        'question': row['question_text'],
+        'type': row['question_type'] or 'single_choice',
+        'options': load_json(row['options']) or [],
+        'correct': load_json(row['correct_answer']) or [],
+        'category': row['category'] or '',
+        'level': row['level'] or 'L1',
+        'weight': row['weight'] or 1,
+    }
+
+
+def build_question_bank(db=None, count=10000, path=None, workers=1, seed=None, resume=True):
+    """Сборка банка: поток генератора и вопросы из БД; возвращает число вопросов.
+
+    Сгенерированные вопросы, уже сохраненные в БД, берутся из БД (один раз).
+    Прерванная сборка с тем же count продолжается с последнего чекпойнта
+    (path.checkpoint) с тем же seed. Параметры сборки сохраняются в
+    path.meta: по ним банк пересобирается после добавления вопросов в БД.
+    """
+    path = bank_path(path)
+    generator = QuestionGenerator(bank=False)
+    capacity = generator.enumerator.check(count)
+    if not capacity['achievable']:
+        logger.warning(f"Запрошено {count}, уникальных вопросов только {capacity['available']} - "
+                       f"банк будет собран из всех доступных")
+    in_db = set()
+    if db is not None:
+        in_db = {row['fingerprint'] for row in db.iter_query(_DB_QUESTIONS, replica=False)}
+
+    # Кластеры перефразировок назначаются при записи (состояние - в чекпойнте)
+    writer = BankWriter(path, resume=resume, clusters=generator.near_duplicates)
+    if writer.position and (writer.meta.get('count') != count
+                            or seed is not None and writer.meta.get('seed') != seed):
+        logger.warning("Чекпойнт от сборки с другими параметрами, сборка заново")
+        writer.close()
+        writer = BankWriter(path, clusters=generator.reset_near_duplicates())
+    if not writer.position:
+        writer.meta = {'count': count, 'seed': seed if seed is not None else random.randrange(2 ** 63)}
+
+    # Позиция в потоке генератора (повторы отсеиваются, она может опережать число записанных)
+    start = writer.meta.get('stream_position', writer.position)
+    for position, question in generator.iter_questions(count, writer.meta['seed'], workers, start=start,
+                                                       positions=True):
+        writer.meta['stream_position'] = position + 1
+        if question_fingerprint(question['question'], question['correct']) not in in_db:
+            writer.add(question)
+
+    if db is not None:
+        # Номер строки БД - чекпойнт второй части сборки
+        done = writer.meta.get('db_position', 0)
+        for position, row in enumerate(db.iter_query(_DB_QUESTIONS, replica=False)):
+            if position < done:
+                continue
+            writer.meta['db_position'] = position + 1
+            try:
+                writer.add(_db_question(row))
+            except ValueError as e:
+                logger.warning(f"Вопрос из БД не помещается в банк: {e}")
+
+    compiled = writer.finish()
+    _write_build_meta(path, {'count': count, 'seed': writer.meta['seed']})
+    logger.info(f"Банк вопросов {path}: {compiled} вопросов (из БД: {len(in_db)}), "
+                f"кластеров перефразировок: {generator.near_duplicates.clusters}")
+    return compiled
+
+
+def refresh_question_bank(db, path=None):
+    """Пересборка банка с параметрами последней сборки (count, seed), чтобы в него попали
+    вопросы, добавленные в БД; воркеры подхватывают новый файл без перезапуска"""
+    meta = read_build_meta(path)
+    seed = meta.get('seed')
+    if seed is None and os.environ.get("QUESTION_BANK_SEED"):
+        seed = int(os.environ["QUESTION_BANK_SEED"])
+    return build_question_bank(db, meta.get('count', 10000), path, seed=seed, resume=False)
+
+
+_refresh_lock = threading.Lock()
+_refresh_state = {'running': False, 'pending': False}
+
+
+def _refresh_loop(db, path):
+    while True:
+        try:
+            refresh_question_bank(db, path)
+        except Exception as e:
+            logger.error(f"Ошибка пересборки банка вопросов: {e}")
+        finally:
+            # Фоновый поток: соединение возвращается в пул
+            db.release_connection()
+        with _refresh_lock:
+            if not _refresh_state['pending']:
+                _refresh_state['running'] = False
+                return
+            _refresh_state['pending'] = False
+
+
+def schedule_refresh(db, path=None):
+    """Пересборка банка в фоновом потоке. Запросы во время сборки объединяются
+    в одну следующую пересборку; True - поток запущен этим вызовом"""
+    with _refresh_lock:
+        if _refresh_state['running']:
+            _refresh_state['pending'] = True
+            return False
+        _refresh_state['running'] = True
+    threading.Thread(target=_refresh_loop, args=(db, path), name='question-bank-refresh', daemon=True).start()
+    return True
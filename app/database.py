@@ -1,150 +1,528 @@
 import os
+import re
+import time
 import sqlite3
+import threading
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_batch, execute_values
 import logging
 
+from db_pool import ConnectionPool, PoolTimeout
+from sqlite_writer import SqliteWriter
+from sql_dialect import translate, POSTGRES, SQLITE
+from migrations import run_migrations, ensure_partitions
+from query_stats import query_stats
+
 logger = logging.getLogger(__name__)
 
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+def _check_identifier(name):
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Недопустимое имя таблицы или колонки: {name!r}")
+    return name
+
 class Database:
     def __init__(self):
         self.db_url = os.environ.get("DATABASE_URL")
-        self.conn = None
-        
-    def get_connection(self):
-        """Получение соединения с базой данных"""
+        if not self.db_url:
+            self.db_url = "sqlite:///quiz_dev.db"
+        self.pool_size = int(os.environ.get("DB_POOL_SIZE", "10"))
+        self.pool_timeout = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+        self.pool_max_idle = float(os.environ.get("DB_POOL_MAX_IDLE", "300"))
+        self.pool_max_lifetime = float(os.environ.get("DB_POOL_MAX_LIFETIME", "3600"))
+        self.bulk_batch_size = int(os.environ.get("DB_BULK_BATCH_SIZE", "1000"))
+        # Реплика только для чтения (отчеты, выгрузки)
+        self.replica_url = os.environ.get("DATABASE_REPLICA_URL") or None
+        self.replica_max_lag = float(os.environ.get("DB_REPLICA_MAX_LAG", "10"))
+        self.replica_lag_check_interval = float(os.environ.get("DB_REPLICA_LAG_CHECK_INTERVAL", "5"))
+        self.replica_retry_after = float(os.environ.get("DB_REPLICA_RETRY_AFTER", "30"))
+        if self.replica_url and not self.is_postgres:
+            logger.warning("DATABASE_REPLICA_URL поддерживается только для PostgreSQL, реплика не используется")
+        self._replica_pool = None
+        self._replica_lag = None
+        self._replica_checked_at = 0.0
+        self._replica_down_until = 0.0
+        # Профиль SQLite: production - WAL, synchronous=NORMAL, busy timeout и поток записи
+        self.sqlite_mode = os.environ.get("DB_SQLITE_MODE", "default").lower()
+        self.sqlite_busy_timeout = int(os.environ.get("DB_SQLITE_BUSY_TIMEOUT", "5000"))
+        self.sqlite_writer_batch = int(os.environ.get("DB_SQLITE_WRITER_BATCH", "64"))
+        self.sqlite_writer_linger = float(os.environ.get("DB_SQLITE_WRITER_LINGER_MS", "2")) / 1000
+        self._writer = None
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def is_postgres(self):
+        return self.db_url.startswith('postgresql')
+
+    @property
+    def dialect(self):
+        return POSTGRES if self.is_postgres else SQLITE
+
+    @property
+    def sqlite_production(self):
+        return not self.is_postgres and self.sqlite_mode == 'production'
+
+    def _connect(self, url=None):
+        """Открытие нового физического соединения с базой данных"""
+        url = url or self.db_url
         try:
-            if self.db_url and self.db_url.startswith('postgresql'):
+            if url.startswith('postgresql'):
                 # PostgreSQL
-                self.conn = psycopg2.connect(self.db_url, cursor_factory=RealDictCursor)
-            else:
-                # SQLite (по умолчанию)
-                if not self.db_url:
-                    self.db_url = "sqlite:///quiz_dev.db"
-                db_path = self.db_url.replace('sqlite:///', '')
-                self.conn = sqlite3.connect(db_path, check_same_thread=False)
-                self.conn.row_factory = sqlite3.Row
-                
-            return self.conn
+                return psycopg2.connect(url, cursor_factory=RealDictCursor)
+
+            # SQLite (по умолчанию)
+            db_path = url.replace('sqlite:///', '')
+            if not self.sqlite_production:
+                conn = sqlite3.connect(db_path, check_same_thread=False)
+                conn.row_factory = sqlite3.Row
+                return conn
+
+            conn = sqlite3.connect(db_path, timeout=self.sqlite_busy_timeout / 1000, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={self.sqlite_busy_timeout}")
+            return conn
         except Exception as e:
             logger.error(f"Ошибка подключения к БД: {e}")
             raise
 
-    def execute_query(self, query, params=None):
-        """Выполнение SQL запроса"""
+    def dedicated_connection(self):
+        """Отдельное соединение вне пула (например, для LISTEN); закрывает вызывающий"""
+        return self._connect()
+
+    @staticmethod
+    def _ping(conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+        conn.rollback()
+
+    def _make_pool(self, url):
+        return ConnectionPool(
+            lambda: self._connect(url),
+            max_size=self.pool_size,
+            timeout=self.pool_timeout,
+            max_idle=self.pool_max_idle,
+            max_lifetime=self.pool_max_lifetime,
+            ping=self._ping
+        )
+
+    @property
+    def pool(self):
+        """Пул соединений текущего процесса (пересоздается после fork)"""
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._pool_lock:
+                if self._pool is None or self._pool_pid != pid:
+                    self._pool = self._make_pool(self.db_url)
+                    if self.replica_url and self.is_postgres:
+                        self._replica_pool = self._make_pool(self.replica_url)
+                    if self.sqlite_production:
+                        self._writer = SqliteWriter(self, self.sqlite_writer_batch, self.sqlite_writer_linger)
+                    self._pool_pid = pid
+                    self._local = threading.local()
+        return self._pool
+
+    @property
+    def replica_pool(self):
+        """Пул соединений с репликой (None, если реплика не настроена)"""
+        self.pool  # пулы создаются вместе для текущего процесса
+        return self._replica_pool
+
+    def _replica_available(self):
+        """Реплика настроена, доступна и отстает не больше replica_max_lag секунд"""
+        if self.replica_pool is None:
+            return False
+        now = time.monotonic()
+        if now < self._replica_down_until:
+            return False
+        if now - self._replica_checked_at >= self.replica_lag_check_interval:
+            self._replica_checked_at = now
+            try:
+                rows = self._run_on_pool(self._replica_pool, translate('''
+                    SELECT CASE
+                        WHEN NOT pg_is_in_recovery() THEN 0
+                        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                    END AS lag
+                ''', self.dialect), None)
+                self._replica_lag = float(rows[0]['lag'])
+            except (psycopg2.Error, PoolTimeout) as e:
+                self._mark_replica_down(e)
+                return False
+            if self._replica_lag > self.replica_max_lag:
+                logger.warning(f"Реплика отстает на {self._replica_lag:.1f} с, чтение с основной БД")
+        return self._replica_lag is not None and self._replica_lag <= self.replica_max_lag
+
+    def _mark_replica_down(self, error):
+        logger.warning(f"Реплика недоступна ({error}), чтение с основной БД {self.replica_retry_after} с")
+        self._replica_down_until = time.monotonic() + self.replica_retry_after
+        self._replica_checked_at = 0.0
+
+    @staticmethod
+    def _run_on_pool(pool, translated, params):
+        """Один SELECT на отдельном соединении пула"""
+        entry = pool.acquire()
+        discard = False
+        try:
+            cursor = entry.conn.cursor()
+            try:
+                if params:
+                    cursor.execute(translated.text, params)
+                else:
+                    cursor.execute(translated.raw)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+            entry.conn.rollback()
+            return rows
+        except psycopg2.Error as e:
+            discard = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            raise
+        finally:
+            pool.release(entry, discard=discard)
+
+    def get_connection(self):
+        """Получение соединения текущего потока (выдается из пула до release_connection)"""
+        pool = self.pool
+        entry = getattr(self._local, 'entry', None)
+        if entry is None:
+            entry = pool.acquire()
+            self._local.entry = entry
+        return entry.conn
+
+    def release_connection(self, discard=False):
+        """Возврат соединения текущего потока в пул (вызывается в teardown запроса)"""
+        entry = getattr(self._local, 'entry', None)
+        if entry is None:
+            return
+        self._local.entry = None
+        self._local.tx_depth = 0
+
+        if not discard:
+            try:
+                # Завершаем незакрытую транзакцию, чтобы не держать ее в пуле
+                entry.conn.rollback()
+            except Exception:
+                discard = True
+        self._pool.release(entry, discard=discard)
+
+    def pool_stats(self):
+        """Статистика пулов соединений (основная БД и реплика)"""
+        stats = {'primary': self.pool.stats()}
+        if self.replica_pool is not None:
+            stats['replica'] = self.replica_pool.stats()
+            stats['replica']['lag'] = self._replica_lag
+            stats['replica']['available'] = time.monotonic() >= self._replica_down_until
+        if self._writer is not None:
+            stats['sqlite_writer'] = self._writer.stats()
+        return stats
+
+    def execute_query(self, query, params=None, prepare=False, fetch=None, replica=False):
+        """Выполнение SQL запроса.
+
+        prepare=True - серверный prepared statement на PostgreSQL;
+        replica=True - SELECT вне транзакции читается с реплики, если она
+        доступна и не отстает (иначе с основной БД).
+        Время выполнения учитывается в query_stats.
+        """
+        with query_stats.timed(query):
+            if self._routes_writes() and not translate(query, self.dialect).is_select:
+                return self._writer.submit(self._execute_query, query, params, prepare, fetch, replica)
+            return self._execute_query(query, params, prepare, fetch, replica)
+
+    def _routes_writes(self):
+        """Запись уходит в поток записи SQLite (кроме уже открытых транзакций)"""
+        if not self.sqlite_production:
+            return False
+        self.pool  # поток записи создается вместе с пулом процесса
+        return not self.in_transaction and not self._writer.is_writer_thread
+
+    def write(self, fn, *args, **kwargs):
+        """Выполнение единицы записи fn(*args, **kwargs): в потоке записи SQLite
+        в режиме production, иначе в текущем потоке"""
+        if self._routes_writes():
+            return self._writer.submit(fn, *args, **kwargs)
+        return fn(*args, **kwargs)
+
+    def _execute_query(self, query, params, prepare, fetch, replica):
+        translated = translate(query, self.dialect)
+        if fetch is None:
+            fetch = translated.is_select
+
+        if replica and translated.is_select and not self.in_transaction and self._replica_available():
+            try:
+                return self._run_on_pool(self._replica_pool, translated, params)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout) as e:
+                self._mark_replica_down(e)
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
-            if params:
-                cursor.execute(query, params)
+            if prepare and self.is_postgres:
+                self._execute_prepared(cursor, translated, params)
+            elif params:
+                cursor.execute(translated.text, params)
             else:
-                cursor.execute(query)
+                cursor.execute(translated.raw)
                 
-            if query.strip().upper().startswith('SELECT'):
-                result = cursor.fetchall()
-            else:
+            result = cursor.fetchall() if fetch else None
+            if not translated.is_select and not self.in_transaction:
                 conn.commit()
-                result = None
                 
             return result
         except Exception as e:
-            conn.rollback()
             logger.error(f"Ошибка выполнения запроса: {e}")
+            if self.in_transaction:
+                # Откат выполнит transaction() (целиком или до savepoint)
+                raise
+            try:
+                conn.rollback()
+            except Exception:
+                # Соединение разорвано - не возвращаем его в пул
+                cursor = None
+                self.release_connection(discard=True)
             raise
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    def execute_insert(self, query, params=None, prepare=False):
+        """INSERT одной строки с возвратом id новой записи"""
+        if self.is_postgres:
+            rows = self.execute_query(query.rstrip().rstrip(';') + ' RETURNING id', params,
+                                      prepare=prepare, fetch=True)
+            return rows[0]['id']
+
+        if self._routes_writes():
+            return self._writer.submit(self.execute_insert, query, params)
+        with self.transaction():
+            self.execute_query(query, params)
+            return self.execute_query("SELECT last_insert_rowid() AS id")[0]['id']
+
+    @property
+    def in_transaction(self):
+        """Открыта ли в текущем потоке транзакция через transaction()"""
+        return getattr(self._local, 'tx_depth', 0) > 0
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Единица работы: все запросы внутри блока фиксируются одним commit.
+
+        Вложенный transaction() открывает SAVEPOINT: исключение внутри него
+        откатывает только вложенный блок. immediate=True на SQLite берет
+        блокировку записи сразу (BEGIN IMMEDIATE).
+        """
+        conn = self.get_connection()
+        depth = getattr(self._local, 'tx_depth', 0)
+        savepoint = f"sp_{depth}"
+
+        if depth == 0:
+            if not self.is_postgres and not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        else:
+            self._run(conn, f"SAVEPOINT {savepoint}")
+        self._local.tx_depth = depth + 1
+
+        try:
+            yield self
+        except BaseException:
+            self._local.tx_depth = depth
+            try:
+                if depth == 0:
+                    conn.rollback()
+                else:
+                    self._run(conn, f"ROLLBACK TO SAVEPOINT {savepoint}")
+                    self._run(conn, f"RELEASE SAVEPOINT {savepoint}")
+            except Exception as e:
+                logger.error(f"Ошибка отката транзакции: {e}")
+                if depth == 0:
+                    self.release_connection(discard=True)
+            raise
+        else:
+            self._local.tx_depth = depth
+            if depth == 0:
+                conn.commit()
+            else:
+                self._run(conn, f"RELEASE SAVEPOINT {savepoint}")
+
+    @staticmethod
+    def _run(conn, statement):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(statement)
         finally:
             cursor.close()
 
+    def iter_query(self, query, params=None, batch_size=500, replica=True):
+        """Потоковое чтение результата SELECT пакетами по batch_size строк.
+
+        На PostgreSQL используется именованный (серверный) курсор, на SQLite -
+        fetchmany. Для итерации берется отдельное соединение из пула, чтобы
+        commit в основном соединении потока не закрыл курсор. По умолчанию
+        выгрузки читаются с реплики (replica=False - с основной БД).
+        """
+        translated = translate(query, self.dialect)
+        pool = self.pool
+        entry = None
+        if replica and self._replica_available():
+            try:
+                entry = self._replica_pool.acquire()
+                pool = self._replica_pool
+            except (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout) as e:
+                self._mark_replica_down(e)
+        if entry is None:
+            entry = pool.acquire()
+        conn = entry.conn
+        discard = False
+        if self.is_postgres:
+            cursor = conn.cursor(name=f"iter_{translated.statement_name}_{id(entry):x}",
+                                 cursor_factory=RealDictCursor)
+            cursor.itersize = batch_size
+        else:
+            cursor = conn.cursor()
+
+        try:
+            with query_stats.timed(query):
+                if params:
+                    cursor.execute(translated.text, params)
+                else:
+                    cursor.execute(translated.raw)
+
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        except Exception as e:
+            logger.error(f"Ошибка потокового чтения: {e}")
+            raise
+        finally:
+            try:
+                cursor.close()
+                conn.rollback()
+            except Exception:
+                discard = True
+            pool.release(entry, discard=discard)
+
+    def _execute_prepared(self, cursor, translated, params):
+        """PREPARE один раз на соединение, далее только EXECUTE"""
+        entry = self._local.entry
+        if translated.statement_name not in entry.prepared:
+            cursor.execute(translated.prepare_text)
+            entry.prepared.add(translated.statement_name)
+        if translated.param_count:
+            cursor.execute(translated.execute_text, params)
+        else:
+            cursor.execute(translated.execute_text)
+
+    def execute_many(self, query, params_seq, batch_size=None):
+        """Один запрос (UPDATE/DELETE/INSERT) для множества наборов параметров.
+
+        На PostgreSQL используется execute_batch (один round trip на пакет
+        из batch_size выражений), на SQLite - executemany. Вне transaction()
+        все пакеты фиксируются одним commit. Возвращает число наборов.
+        """
+        if self._routes_writes():
+            return self._writer.submit(self.execute_many, query, params_seq, batch_size)
+
+        params_seq = list(params_seq)
+        if not params_seq:
+            return 0
+        translated = translate(query, self.dialect)
+        with self.transaction():
+            cursor = self.get_connection().cursor()
+            try:
+                with query_stats.timed(query):
+                    if self.is_postgres:
+                        execute_batch(cursor, translated.text, params_seq,
+                                      page_size=batch_size or self.bulk_batch_size)
+                    else:
+                        cursor.executemany(translated.text, params_seq)
+            finally:
+                cursor.close()
+        return len(params_seq)
+
+    def bulk_insert(self, table, rows, columns=None, batch_size=None, ignore_conflicts=False):
+        """Пакетная вставка строк (dict) одной транзакцией.
+
+        На PostgreSQL используется execute_values, на SQLite - executemany.
+        Каждый пакет выполняется во вложенной transaction() (SAVEPOINT): ошибка
+        откатывает только этот пакет и попадает в отчет, остальные пакеты
+        фиксируются одним commit. ignore_conflicts - строки, нарушающие
+        уникальность, пропускаются (ON CONFLICT DO NOTHING) и считаются в skipped.
+        """
+        if self._routes_writes():
+            return self._writer.submit(self.bulk_insert, table, rows, columns, batch_size, ignore_conflicts)
+
+        rows = list(rows)
+        result = {'inserted': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+        if not rows:
+            return result
+
+        table = _check_identifier(table)
+        columns = [_check_identifier(c) for c in (columns or list(rows[0].keys()))]
+        batch_size = batch_size or self.bulk_batch_size
+        column_list = ', '.join(columns)
+
+        if self.is_postgres:
+            sql = f"INSERT INTO {table} ({column_list}) VALUES %s"
+            if ignore_conflicts:
+                sql += " ON CONFLICT DO NOTHING"
+        else:
+            verb = "INSERT OR IGNORE" if ignore_conflicts else "INSERT"
+            sql = f"{verb} INTO {table} ({column_list}) VALUES ({', '.join(['?'] * len(columns))})"
+
+        try:
+            with self.transaction():
+                for batch_no, offset in enumerate(range(0, len(rows), batch_size)):
+                    batch = [tuple(row.get(c) for c in columns) for row in rows[offset:offset + batch_size]]
+                    try:
+                        with self.transaction():
+                            cursor = self.get_connection().cursor()
+                            try:
+                                with query_stats.timed(sql):
+                                    if self.is_postgres:
+                                        execute_values(cursor, sql, batch, page_size=len(batch))
+                                    else:
+                                        cursor.executemany(sql, batch)
+                                inserted = cursor.rowcount if cursor.rowcount >= 0 else len(batch)
+                                result['inserted'] += inserted
+                                result['skipped'] += len(batch) - inserted
+                            finally:
+                                cursor.close()
+                    except (psycopg2.Error, sqlite3.Error) as e:
+                        logger.error(f"Ошибка вставки пакета {batch_no} в {table}: {e}")
+                        result['failed'] += len(batch)
+                        result['errors'].append({
+                            'batch': batch_no,
+                            'offset': offset,
+                            'size': len(batch),
+                            'error': str(e)
+                        })
+            return result
+        except Exception as e:
+            logger.error(f"Ошибка пакетной вставки в {table}: {e}")
+            raise
+
     def init_database(self):
-        """Инициализация базы данных и создание таблиц"""
+        """Инициализация базы данных: применение миграций схемы"""
         try:
-            # Таблица пользователей
-            self.execute_query('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    username VARCHAR(100) UNIQUE NOT NULL,
-                    password_hash VARCHAR(255) NOT NULL,
-                    full_access BOOLEAN DEFAULT FALSE,
-                    manage_questions BOOLEAN DEFAULT FALSE,
-                    manage_settings BOOLEAN DEFAULT FALSE,
-                    manage_users BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Таблица админов
-            self.execute_query('''
-                CREATE TABLE IF NOT EXISTS admins (
-                    id SERIAL PRIMARY KEY,
-                    username VARCHAR(100) UNIQUE NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Таблица настроек
-            self.execute_query('''
-                CREATE TABLE IF NOT EXISTS settings (
-                    id SERIAL PRIMARY KEY,
-                    key VARCHAR(100) UNIQUE NOT NULL,
-                    value TEXT,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Таблица вопросов
-            self.execute_query('''
-                CREATE TABLE IF NOT EXISTS questions (
-                    id SERIAL PRIMARY KEY,
-                    question_text TEXT NOT NULL,
-                    question_type VARCHAR(50) DEFAULT 'single_choice',
-                    options JSON,
-                    correct_answer JSON,
-                    category VARCHAR(100) DEFAULT 'general',
-                    level VARCHAR(10) DEFAULT 'L1',
-                    weight INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Таблица сессий тестирования
-            self.execute_query('''
-                CREATE TABLE IF NOT EXISTS test_sessions (
-                    id SERIAL PRIMARY KEY,
-                    user_identifier VARCHAR(255),
-                    user_display_name VARCHAR(255),
-                    questions_data JSON,
-                    answers_data JSON,
-                    score INTEGER DEFAULT 0,
-                    percent DECIMAL(5,2) DEFAULT 0,
-                    level VARCHAR(10),
-                    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Добавляем администратора по умолчанию
-            self.execute_query('''
-                INSERT OR IGNORE INTO admins (username) VALUES ('admin')
-            ''')
-            
-            # Добавляем базовые настройки
-            default_settings = [
-                ('domain_auth_enabled', 'false'),
-                ('smtp_enabled', 'false'),
-                ('smtp_host', ''),
-                ('smtp_port', '587'),
-                ('smtp_username', ''),
-                ('smtp_password', ''),
-                ('notification_email', ''),
-                ('test_duration', '60'),
-                ('questions_per_test', '50')
-            ]
-            
-            for key, value in default_settings:
-                self.execute_query('''
-                    INSERT OR IGNORE INTO settings (key, value) 
-                    VALUES (?, ?)
-                ''', (key, value))
-            
+            run_migrations(self)
+            ensure_partitions(self)
             logger.info("База данных успешно инициализирована")
             return True
             
@@ -153,9 +531,17 @@ class Database:
             return False
 
     def close(self):
-        """Закрытие соединения с БД"""
-        if self.conn:
-            self.conn.close()
+        """Закрытие пула соединений с БД"""
+        self.release_connection()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        if self._replica_pool is not None:
+            self._replica_pool.close()
+            self._replica_pool = None
+        if self._writer is not None:
+            self._writer.stop()
+            self._writer = None
 
 # Глобальный экземпляр базы данных
 db_instance = Database()
\ No newline at end of file
@@ -0,0 +1,201 @@
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class PooledConnection:
+    """Соединение, выданное пулом, с отметками времени для переработки"""
+
+    __slots__ = ('conn', 'created_at', 'last_used', 'prepared')
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+        # Имена серверных prepared statements, созданных на этом соединении
+        self.prepared = set()
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений с проверкой живости и переработкой"""
+
+    def __init__(self, connect, max_size=10, timeout=30.0, max_idle=300.0,
+                 max_lifetime=3600.0, ping_interval=5.0, ping=None):
+        self._connect = connect
+        self._ping = ping
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._failed_pings = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _expired(self, entry, now):
+        if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+            return True
+        if self.max_idle and now - entry.last_used > self.max_idle:
+            return True
+        return False
+
+    def _close_entry(self, entry):
+        try:
+            entry.conn.close()
+        except Exception as e:
+            logger.warning(f"Ошибка закрытия соединения пула: {e}")
+
+    def acquire(self):
+        """Выдача соединения: из простаивающих, новое или ожидание освобождения"""
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            entry = None
+            stale = []
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Пул соединений закрыт")
+
+                started = time.monotonic()
+                self._waiting += 1
+                try:
+                    while True:
+                        now = time.monotonic()
+                        while self._idle:
+                            candidate = self._idle.pop()
+                            if self._expired(candidate, now):
+                                self._size -= 1
+                                self._recycled += 1
+                                stale.append(candidate)
+                                continue
+                            entry = candidate
+                            break
+                        if entry is not None or self._size < self.max_size:
+                            break
+
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self._timeouts += 1
+                            raise PoolTimeout(
+                                f"Нет свободных соединений за {self.timeout} с "
+                                f"(занято {self._in_use} из {self.max_size})"
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                    waited = time.monotonic() - started
+                    self._wait_total += waited
+                    self._wait_max = max(self._wait_max, waited)
+
+                if entry is None:
+                    self._size += 1
+                self._in_use += 1
+                self._checkouts += 1
+
+            for old in stale:
+                self._close_entry(old)
+
+            if entry is None:
+                try:
+                    entry = PooledConnection(self._connect())
+                except Exception:
+                    self._forget()
+                    raise
+                with self._cond:
+                    self._created += 1
+                return entry
+
+            if self._healthy(entry):
+                return entry
+
+            self._close_entry(entry)
+            self._forget()
+
+    def _healthy(self, entry):
+        """Проверка соединения, простоявшего дольше ping_interval"""
+        if self._ping is None or time.monotonic() - entry.last_used < self.ping_interval:
+            return True
+        try:
+            self._ping(entry.conn)
+            return True
+        except Exception as e:
+            logger.warning(f"Соединение из пула не прошло проверку: {e}")
+            with self._cond:
+                self._failed_pings += 1
+            return False
+
+    def _forget(self):
+        """Уменьшение счетчиков для соединения, которое не вернется в пул"""
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._cond.notify()
+
+    def release(self, entry, discard=False):
+        """Возврат соединения в пул; сломанные и устаревшие соединения закрываются"""
+        now = time.monotonic()
+        if not discard and self.max_lifetime and now - entry.created_at > self.max_lifetime:
+            discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._size -= 1
+                self._recycled += 1
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+            self._cond.notify()
+
+        if discard or self._closed:
+            self._close_entry(entry)
+
+    def close(self):
+        """Закрытие всех простаивающих соединений"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_entry(entry)
+
+    def stats(self):
+        """Снимок счетчиков пула для подбора размера под воркеры и реплики"""
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'recycled': self._recycled,
+                'failed_pings': self._failed_pings,
+                'wait_time_total': round(self._wait_total, 6),
+                'wait_time_max': round(self._wait_max, 6),
+                'wait_time_avg': round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+            }
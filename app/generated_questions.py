@@ -0,0 +1,60 @@
+import json
+import logging
+
+import stats_rollups
+from generators.fingerprint import question_fingerprint
+from generators.question_bank import question_category
+
+logger = logging.getLogger(__name__)
+
+# Сгенерированных вопросов в памяти до записи в БД
+GENERATE_CHUNK = 1000
+
+
+def question_row(question):
+    """Строка таблицы questions для сгенерированного вопроса"""
+    return {
+        'question_text': question.get('question', ''),
+        'question_type': question.get('type', 'single_choice'),
+        'options': json.dumps(question.get('options', [])),
+        'correct_answer': json.dumps(question.get('correct', [])),
+        'category': question_category(question) or 'generated',
+        'level': question.get('level', 'L1'),
+        'fingerprint': question_fingerprint(question.get('question', ''), question.get('correct', []))
+    }
+
+
+def _store_batch(db, rows, batch_size):
+    """Пакет вопросов и счетчик stats_totals.questions - одной транзакцией"""
+    with db.transaction():
+        batch = db.bulk_insert('questions', rows, batch_size=batch_size, ignore_conflicts=True)
+        stats_rollups.record_questions(db, batch['inserted'])
+    return batch
+
+
+def _insert_generated(db, rows, batch_size, result):
+    """Пачка сгенерированных вопросов в БД; дубликаты (тот же отпечаток) отклоняет уникальный индекс"""
+    batch = db.write(_store_batch, db, rows, batch_size)
+    for key in ('inserted', 'skipped', 'failed'):
+        result[key] += batch[key]
+    result['errors'].extend(batch['errors'])
+
+
+def save_generated_questions(db, questions, batch_size=None):
+    """Сохранение потока сгенерированных вопросов пачками: память не растет с числом вопросов.
+
+    Повторная вставка того же вопроса (например, повторный запрос с тем же
+    seed) пропускается: {inserted, skipped, failed, errors}.
+    """
+    result = {'inserted': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+    rows = []
+    for question in questions:
+        rows.append(question_row(question))
+        if len(rows) >= GENERATE_CHUNK:
+            _insert_generated(db, rows, batch_size, result)
+            rows = []
+    if rows:
+        _insert_generated(db, rows, batch_size, result)
+    for error in result['errors']:
+        logger.error(f"Ошибка сохранения пакета вопросов {error['batch']}: {error['error']}")
+    return result
@@ -1,3 +1,15 @@
 from .question_generator import QuestionGenerator
+from .question_bank import BankWriter, QuestionBank, compile_bank, open_bank, question_category
+from .question_pool import ReloadableBank
+from .enumerator import QuestionEnumerator
+from .fingerprint import question_fingerprint
+from .near_duplicates import NearDuplicateIndex, spread_over_clusters
+from .knowledge_base import KnowledgeBase, KnowledgeBaseError, load_knowledge_base
+from .template_engine import TemplateEngine
+from .dedup import RotatingBloomFilter
+from .blueprint import BlueprintError, BlueprintSampler, blueprint_sampler, parse_blueprint
 
-__all__ = ['QuestionGenerator']
\ No newline at end of file
+__all__ = ['QuestionGenerator', 'QuestionEnumerator', 'QuestionBank', 'BankWriter', 'compile_bank', 'open_bank', 'question_category', 'ReloadableBank',
+           'question_fingerprint', 'NearDuplicateIndex', 'spread_over_clusters', 'BlueprintError', 'BlueprintSampler', 'blueprint_sampler',
+           'parse_blueprint', 'KnowledgeBase', 'KnowledgeBaseError', 'load_knowledge_base',
+           'TemplateEngine', 'RotatingBloomFilter']
\ No newline at end of file
@@ -0,0 +1,229 @@
+# app/generators/blueprint.py
+import json
+import random
+import logging
+import weakref
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .question_bank import NO_CLUSTER
+
+logger = logging.getLogger(__name__)
+
+# Поля вопроса, по которым задаются страты
+FIELDS = ('category', 'level', 'type')
+
+# Без настройки test_blueprint: каждый 5-й вопрос - multiple_choice
+DEFAULT_BLUEPRINT = {'strata': [{'type': 'multiple_choice', 'share': 0.2}, {'share': 0.8}]}
+
+
+class BlueprintError(ValueError):
+    pass
+
+
+def parse_blueprint(value=None) -> List[Dict]:
+    """Страты бланка теста из настройки test_blueprint (JSON-строка или dict).
+
+    {"strata": [{"type": "multiple_choice", "count": 10},
+                {"level": "L2", "share": 0.5},
+                {"category": "resmtp", "count": 2},
+                {"share": 0.5}]}
+
+    Вопрос относится к первой подходящей страте; у страты либо count
+    (фиксированное число вопросов), либо share (доля остатка после count).
+    """
+    if value in (None, ''):
+        value = DEFAULT_BLUEPRINT
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError as e:
+            raise BlueprintError(f"test_blueprint: некорректный JSON: {e}")
+    strata = value.get('strata') if isinstance(value, dict) else None
+    if not isinstance(strata, list) or not strata:
+        raise BlueprintError("test_blueprint: нужен непустой список strata")
+
+    result = []
+    for number, stratum in enumerate(strata):
+        if not isinstance(stratum, dict):
+            raise BlueprintError(f"test_blueprint: страта {number} - не объект")
+        unknown = set(stratum) - set(FIELDS) - {'count', 'share'}
+        if unknown:
+            raise BlueprintError(f"test_blueprint: страта {number}: неизвестные поля {sorted(unknown)}")
+        if ('count' in stratum) == ('share' in stratum):
+            raise BlueprintError(f"test_blueprint: страта {number}: нужен count или share")
+        count, share = stratum.get('count'), stratum.get('share')
+        if count is not None and (not isinstance(count, int) or count < 0):
+            raise BlueprintError(f"test_blueprint: страта {number}: count - целое >= 0")
+        if share is not None and (not isinstance(share, (int, float)) or share < 0):
+            raise BlueprintError(f"test_blueprint: страта {number}: share - число >= 0")
+        result.append({
+            'filters': {field: str(stratum[field]) for field in FIELDS if field in stratum},
+            'count': count,
+            'share': share
+        })
+    if all(stratum['share'] is None for stratum in result) and not any(s['count'] for s in result):
+        raise BlueprintError("test_blueprint: все квоты нулевые")
+    return result
+
+
+def allocate(strata: List[Dict], total: int) -> List[int]:
+    """Квоты страт на total вопросов: count как есть, остаток по share (наибольшие остатки)"""
+    quotas = [stratum['count'] or 0 for stratum in strata]
+    fixed = sum(quotas)
+    if fixed > total:
+        raise BlueprintError(f"test_blueprint: сумма count {fixed} больше {total} вопросов")
+    shares = [(i, stratum['share']) for i, stratum in enumerate(strata) if stratum['share'] is not None]
+    share_sum = sum(share for _, share in shares)
+    if not share_sum:
+        if fixed != total:
+            raise BlueprintError(f"test_blueprint: сумма count {fixed} вместо {total} без страт с share")
+        return quotas
+    rest = total - fixed
+    exact = [(i, rest * share / share_sum) for i, share in shares]
+    for i, value in exact:
+        quotas[i] = int(value)
+    remainder = rest - sum(int(value) for _, value in exact)
+    for i, _ in sorted(exact, key=lambda item: item[1] - int(item[1]), reverse=True)[:remainder]:
+        quotas[i] += 1
+    return quotas
+
+
+class AliasTable:
+    """Выбор позиции с вероятностью, пропорциональной весу, за O(1) (метод Уокера/Воуза)"""
+
+    __slots__ = ('size', 'probability', 'alias')
+
+    def __init__(self, weights: List[float]):
+        self.size = len(weights)
+        total = float(sum(weights))
+        if not total:
+            weights, total = [1.0] * self.size, float(self.size)
+        scaled = [w * self.size / total for w in weights]
+        self.probability = [1.0] * self.size
+        self.alias = list(range(self.size))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def sample(self, rng) -> int:
+        position = int(rng.random() * self.size)
+        return position if rng.random() < self.probability[position] else self.alias[position]
+
+
+class BlueprintSampler:
+    """Бланк, скомпилированный для банка: номера вопросов по стратам и таблицы выбора.
+
+    Компиляция - один проход по атрибутам банка; сборка теста - O(k):
+    выбор по весу вопроса в каждой страте с отказом от уже выбранных
+    вопросов и кластеров перефразировок. Когда разных кластеров в страте
+    меньше квоты, остаток добирается перефразировками наименее занятых
+    кластеров; в тесте всегда total вопросов. Если вопросов страты меньше
+    ее квоты, бланк невыполним - BlueprintError.
+    """
+
+    def __init__(self, bank, blueprint=None, total: int = 50):
+        strata = parse_blueprint(blueprint)
+        # Слабая ссылка: сэмплер в кэше не удерживает прежнюю версию банка
+        self._bank = weakref.ref(bank)
+        self.total = total
+        self.quotas = allocate(strata, total)
+        self._buckets: List[List[int]] = [[] for _ in strata]
+        self._clusters: List[List[int]] = [[] for _ in strata]
+        weights: List[List[int]] = [[] for _ in strata]
+
+        for index, attributes in bank.attributes():
+            for number, stratum in enumerate(strata):
+                if all(attributes[field] == value for field, value in stratum['filters'].items()):
+                    self._buckets[number].append(index)
+                    # Вопрос без кластера - отдельный кластер
+                    cluster = attributes['cluster']
+                    self._clusters[number].append(cluster if cluster != NO_CLUSTER else ('index', index))
+                    weights[number].append(max(attributes['weight'], 0))
+                    break
+        self._tables = [AliasTable(w) if w else None for w in weights]
+
+        self.capacity = [len(bucket) for bucket in self._buckets]
+        # Разных кластеров в страте: до этого числа вопросы - разные факты
+        self.distinct = [len(set(clusters)) for clusters in self._clusters]
+        short = [(stratum['filters'], quota, capacity)
+                 for stratum, quota, capacity in zip(strata, self.quotas, self.capacity) if quota > capacity]
+        if short:
+            raise BlueprintError("Бланк теста невыполним для банка: " + "; ".join(
+                f"страта {filters or 'остальные'} - квота {quota}, вопросов {capacity}"
+                for filters, quota, capacity in short))
+        if any(q > d for q, d in zip(self.quotas, self.distinct)):
+            logger.info(f"Квоты {self.quotas} больше числа разных фактов {self.distinct}: "
+                        f"часть вопросов - перефразировки")
+
+    def _pick(self, number: int, quota: int, rng, used: set, clusters: Counter) -> List[int]:
+        bucket, bucket_clusters, table = self._buckets[number], self._clusters[number], self._tables[number]
+        picked = []
+        if not quota or table is None:
+            return picked
+
+        def take(position):
+            used.add(bucket[position])
+            clusters[bucket_clusters[position]] += 1
+            picked.append(bucket[position])
+
+        attempts = 4 * quota + 16
+        while len(picked) < quota and attempts:
+            attempts -= 1
+            position = table.sample(rng)
+            if bucket[position] in used or bucket_clusters[position] in clusters:
+                continue
+            take(position)
+        # Страта почти исчерпана: проходы по ней со случайного места, на проходе
+        # limit - вопросы кластеров, занятых меньше limit раз (сначала новые факты)
+        start = rng.randrange(len(bucket))
+        limit = 1
+        while len(picked) < quota:
+            for offset in range(len(bucket)):
+                position = (start + offset) % len(bucket)
+                if bucket[position] in used or clusters[bucket_clusters[position]] >= limit:
+                    continue
+                take(position)
+                if len(picked) >= quota:
+                    break
+            limit += 1
+        return picked
+
+    def sample_indices(self, rng: Optional[random.Random] = None) -> List[int]:
+        rng = rng or random
+        used, clusters = set(), Counter()
+        indices = []
+        for number, quota in enumerate(self.quotas):
+            indices += self._pick(number, quota, rng, used, clusters)
+        rng.shuffle(indices)
+        return indices
+
+    @property
+    def bank(self):
+        return self._bank()
+
+    def sample(self, rng: Optional[random.Random] = None) -> List[Dict]:
+        """Ровно total вопросов теста по квотам бланка"""
+        return [self.bank[index] for index in self.sample_indices(rng)]
+
+
+# Сэмплеры по банку: запись исчезает вместе с версией банка
+_samplers = weakref.WeakKeyDictionary()
+
+
+def blueprint_sampler(bank, blueprint=None, total: int = 50) -> BlueprintSampler:
+    """Скомпилированный бланк из кэша (перекомпиляция при смене банка, бланка или total)"""
+    if not isinstance(blueprint, (str, type(None))):
+        blueprint = json.dumps(blueprint, sort_keys=True)
+    samplers = _samplers.setdefault(bank, {})
+    sampler = samplers.get((blueprint, total))
+    if sampler is None:
+        if len(samplers) >= 16:
+            samplers.clear()
+        sampler = samplers[(blueprint, total)] = BlueprintSampler(bank, blueprint, total)
+    return sampler
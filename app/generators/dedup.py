@@ -0,0 +1,97 @@
+# app/generators/dedup.py
+import os
+import math
+import hashlib
+from typing import Dict, Optional
+
+
+class _BloomFilter:
+    __slots__ = ('bits', 'size', 'hashes', 'count')
+
+    def __init__(self, size: int, hashes: int):
+        self.bits = bytearray((size + 7) // 8)
+        self.size = size
+        self.hashes = hashes
+        self.count = 0
+
+    def positions(self, h1: int, h2: int):
+        size = self.size
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % size
+
+    def add(self, h1: int, h2: int):
+        bits = self.bits
+        for position in self.positions(h1, h2):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def contains(self, h1: int, h2: int) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.positions(h1, h2))
+
+
+class RotatingBloomFilter:
+    """Множество выданных отпечатков с фиксированной памятью.
+
+    Два фильтра Блума по max_bytes / 2: новые отпечатки пишутся в текущий,
+    проверка - по обоим. Когда в текущем capacity элементов (при этом его
+    доля ложных срабатываний равна error_rate), он становится предыдущим,
+    а самый старый сбрасывается. Итог:
+      - память постоянна (max_bytes), сколько бы вопросов ни было выдано;
+      - ложное "уже выдан" - не чаще ~2 * error_rate (вопрос пропускается);
+      - помнятся последние от capacity до 2 * capacity отпечатков.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, error_rate: Optional[float] = None):
+        self.max_bytes = max_bytes or int(os.environ.get("GENERATED_HASHES_MAX_BYTES", str(1 << 20)))
+        self.error_rate = error_rate or float(os.environ.get("GENERATED_HASHES_ERROR_RATE", "0.001"))
+        size = max(8, self.max_bytes // 2 * 8)
+        # n = -m (ln 2)^2 / ln p, k = m / n * ln 2
+        self.capacity = max(1, int(size * math.log(2) ** 2 / -math.log(self.error_rate)))
+        self.hashes = max(1, round(size / self.capacity * math.log(2)))
+        self._size = size
+        self._current = _BloomFilter(size, self.hashes)
+        self._previous = None
+        self.rotations = 0
+
+    @staticmethod
+    def _split(item: str):
+        # Отпечатки вопросов - 128 бит hex; прочие строки хешируются
+        try:
+            value = int(item, 16) if len(item) == 32 else None
+        except ValueError:
+            value = None
+        if value is None:
+            value = int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest(), 'little')
+        return value & ((1 << 64) - 1), (value >> 64) | 1
+
+    def add(self, item: str):
+        h1, h2 = self._split(item)
+        if self._current.contains(h1, h2):
+            return
+        if self._current.count >= self.capacity:
+            self._previous = self._current
+            self._current = _BloomFilter(self._size, self.hashes)
+            self.rotations += 1
+        self._current.add(h1, h2)
+
+    def __contains__(self, item: str) -> bool:
+        h1, h2 = self._split(item)
+        return self._current.contains(h1, h2) or (self._previous is not None and self._previous.contains(h1, h2))
+
+    def __len__(self) -> int:
+        return self._current.count + (self._previous.count if self._previous is not None else 0)
+
+    def clear(self):
+        self._current = _BloomFilter(self._size, self.hashes)
+        self._previous = None
+
+    def stats(self) -> Dict:
+        return {
+            'items': len(self),
+            'capacity': self.capacity,
+            'hashes': self.hashes,
+            'max_bytes': self.max_bytes,
+            'error_rate': self.error_rate,
+            'rotations': self.rotations,
+        }
@@ -0,0 +1,202 @@
+# app/generators/enumerator.py
+import random
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Tuple
+
+
+class _Family:
+    """Семейство вопросов: пространство в смешанной системе счисления radices"""
+    __slots__ = ('kind', 'topic', 'template', 'source', 'radices', 'size')
+
+    def __init__(self, kind: str, topic: str, template: str, source: str, radices: List[int]):
+        self.kind = kind
+        self.topic = topic
+        self.template = template
+        self.source = source
+        self.radices = radices
+        self.size = 1
+        for radix in radices:
+            self.size *= radix
+
+    def digits(self, local: int) -> List[int]:
+        result = []
+        for radix in reversed(self.radices):
+            local, digit = divmod(local, radix)
+            result.append(digit)
+        return result[::-1]
+
+
+class QuestionEnumerator:
+    """Полное комбинаторное пространство вопросов генератора.
+
+    Каждый уникальный вопрос (шаблон x факт x фонетические варианты) имеет
+    номер в [0, size): сначала single_choice, затем multiple_choice. Выборка
+    без возвращения - это выборка номеров (stream_indices), поэтому повторы и переборы с
+    отказами исключены, а достижимость размера пула известна заранее.
+    Варианты-дистракторы и порядок ответов на уникальность не влияют.
+    """
+
+    def __init__(self, generator):
+        self._generator = generator
+        self._families: List[_Family] = []
+        self._starts: List[int] = []
+        self.topic_ranges: Dict[Tuple[str, str], Tuple[int, int]] = {}
+
+        templates = generator.templates
+        for component, data in generator.components_data.items():
+            lo = self.size
+            for function in data['functions']:
+                slots = generator.variation_slots(function)
+                self._add(_Family('single_choice', component, 'component_function', function,
+                                  [len(templates['component_function'])]
+                                  + [len(generator.variations[w]) for w in slots]))
+            self._add(_Family('single_choice', component, 'function_component', None,
+                              [len(templates['function_component']), len(data['functions'])]))
+            self.topic_ranges[('single_choice', component)] = (lo, self.size)
+        self.single_size = self.size
+
+        for problem in generator.troubleshooting_map:
+            lo = self.size
+            self._add(_Family('multiple_choice', problem, 'troubleshooting', None,
+                              [len(templates['troubleshooting'])]))
+            self.topic_ranges[('multiple_choice', problem)] = (lo, self.size)
+        self.multiple_size = self.size - self.single_size
+
+    def _add(self, family: _Family):
+        self._starts.append(self.size)
+        self._families.append(family)
+
+    @property
+    def size(self) -> int:
+        if not self._families:
+            return 0
+        return self._starts[-1] + self._families[-1].size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def check(self, count: int) -> Dict:
+        """Достижим ли пул из count уникальных вопросов"""
+        return {
+            'requested': count,
+            'available': self.size,
+            'achievable': count <= self.size,
+            'single_choice': self.single_size,
+            'multiple_choice': self.multiple_size
+        }
+
+    def question(self, index: int, rng=None) -> Dict:
+        """Вопрос с номером index; rng выбирает только дистракторы, порядок и уровень"""
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        rng = rng or random
+        position = bisect_right(self._starts, index) - 1
+        family = self._families[position]
+        digits = family.digits(index - self._starts[position])
+        generator = self._generator
+        knowledge = generator.knowledge
+        engine = generator.engine
+        templates = engine.templates[family.template]
+
+        if family.kind == 'multiple_choice':
+            correct = list(knowledge.troubleshooting[family.topic])
+            options = correct + knowledge.distractors(knowledge.problem_pools[family.topic], 3, rng)
+            rng.shuffle(options)
+            return {
+                'type': 'multiple_choice',
+                'question': templates[digits[0]].fill(family.topic),
+                'options': options,
+                'correct': correct,
+                'problem_type': family.topic,
+                'level': 'L2',
+                'weight': 3
+            }
+
+        component = family.topic
+        if family.template == 'component_function':
+            question_text = engine.render_index(family.template, family.source, digits)
+            correct = [component]
+            pool = knowledge.component_pools[family.source]
+        else:
+            question_text = templates[digits[0]].fill(component)
+            correct = [knowledge.components[component]['functions'][digits[1]]]
+            pool = knowledge.function_pools[component]
+
+        options = correct + knowledge.distractors(pool, 3, rng)
+        rng.shuffle(options)
+        return {
+            'type': 'single_choice',
+            'question': question_text,
+            'options': options,
+            'correct': correct,
+            'component': component,
+            'level': rng.choice(['L1', 'L2']),
+            'weight': 1
+        }
+
+    def shuffled_indices(self, kind: str, topic: str, rng=None) -> List[int]:
+        """Номера вопросов темы в случайном порядке"""
+        lo, hi = self.topic_ranges.get((kind, topic), (0, 0))
+        return (rng or random).sample(range(lo, hi), hi - lo)
+
+    def split(self, count: int) -> Tuple[int, int]:
+        """(single_choice, multiple_choice) для пула из count: каждый 5-й - multiple_choice, пока они есть"""
+        multiple = min(count // 5, self.multiple_size)
+        single = min(count - multiple, self.single_size)
+        multiple = min(count - single, self.multiple_size)
+        return single, multiple
+
+    def stream_indices(self, count: int, seed, start: int = 0, stop: int = None) -> Iterator[int]:
+        """Номера вопросов пула из count на позициях [start, stop) для seed.
+
+        Позиция вычисляется независимо от остальных (псевдослучайная перестановка
+        пространства), поэтому память O(1) и поток можно продолжить с любой позиции.
+        multiple_choice равномерно перемешаны с single_choice.
+        """
+        single, multiple = self.split(count)
+        total = single + multiple
+        stop = total if stop is None else min(stop, total)
+        keys = random.Random(seed)
+        single_order = _Permutation(self.single_size, keys.getrandbits(64))
+        multiple_order = _Permutation(self.multiple_size, keys.getrandbits(64))
+        for position in range(start, stop):
+            before = position * multiple // total
+            if (position + 1) * multiple // total > before:
+                yield self.single_size + multiple_order[before]
+            else:
+                yield single_order[position - before]
+
+
+_MASK64 = (1 << 64) - 1
+
+
+class _Permutation:
+    """Псевдослучайная перестановка [0, size): сеть Фейстеля с cycle-walking"""
+    __slots__ = ('size', 'half', 'mask', 'keys')
+
+    ROUNDS = 4
+
+    def __init__(self, size: int, key: int):
+        self.size = size
+        self.half = max(1, ((size - 1).bit_length() + 1) // 2)
+        self.mask = (1 << self.half) - 1
+        self.keys = [(key + 0x9E3779B97F4A7C15 * (r + 1)) & _MASK64 for r in range(self.ROUNDS)]
+
+    def _round(self, value: int, key: int) -> int:
+        # splitmix64
+        value = (value ^ key) & _MASK64
+        value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+        value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+        return (value ^ (value >> 31)) & self.mask
+
+    def __getitem__(self, index: int) -> int:
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        # Домен 2^(2*half) < 4*size: в среднем меньше 4 проходов
+        while True:
+            left, right = index >> self.half, index & self.mask
+            for key in self.keys:
+                left, right = right, left ^ self._round(right, key)
+            index = (left << self.half) | right
+            if index < self.size:
+                return index
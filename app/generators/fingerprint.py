@@ -0,0 +1,19 @@
+# app/generators/fingerprint.py
+import json
+import hashlib
+from typing import Iterable
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация для сравнения: casefold, ё -> е, пробелы схлопнуты"""
+    return ' '.join((text or '').casefold().replace('ё', 'е').split())
+
+
+def question_fingerprint(question_text: str, correct_answers: Iterable[str]) -> str:
+    """Детерминированный отпечаток вопроса: нормализованный текст и отсортированные
+    правильные ответы (одинаков во всех процессах и после перезапуска)"""
+    payload = json.dumps([
+        normalize_text(question_text),
+        sorted(normalize_text(answer) for answer in correct_answers)
+    ], ensure_ascii=False)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
@@ -0,0 +1,131 @@
+# app/generators/knowledge_base.py
+import os
+import json
+import random
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quiz_data.json')
+
+# Допустимые поля компонента: обязательное functions и необязательные списки
+COMPONENT_FIELDS = {'functions': True, 'config_files': False, 'interactions': False}
+
+
+class KnowledgeBaseError(ValueError):
+    pass
+
+
+def _check_strings(value, where: str, required: bool):
+    if not isinstance(value, list) or (required and not value):
+        raise KnowledgeBaseError(f"{where}: ожидается {'непустой ' if required else ''}список строк")
+    for i, item in enumerate(value):
+        if not isinstance(item, str) or not item.strip():
+            raise KnowledgeBaseError(f"{where}[{i}]: ожидается непустая строка")
+
+
+def validate(data, source: str = 'quiz_data.json'):
+    """Проверка схемы базы знаний; KnowledgeBaseError с путем до ошибки.
+
+    {"components": {"<компонент>": {"functions": [...], "config_files": [...], "interactions": [...]}},
+     "troubleshooting": {"<проблема>": ["<компонент>", ...]},
+     "extra_components": ["<дистрактор>", ...]}
+    """
+    if not isinstance(data, dict):
+        raise KnowledgeBaseError(f"{source}: ожидается объект")
+    unknown = set(data) - {'components', 'troubleshooting', 'extra_components'}
+    if unknown:
+        raise KnowledgeBaseError(f"{source}: неизвестные разделы {sorted(unknown)}")
+
+    components = data.get('components')
+    if not isinstance(components, dict) or not components:
+        raise KnowledgeBaseError(f"{source}: components: ожидается непустой объект")
+    for name, component in components.items():
+        where = f"{source}: components.{name}"
+        if not name.strip():
+            raise KnowledgeBaseError(f"{source}: components: пустое имя компонента")
+        if not isinstance(component, dict):
+            raise KnowledgeBaseError(f"{where}: ожидается объект")
+        unknown = set(component) - set(COMPONENT_FIELDS)
+        if unknown:
+            raise KnowledgeBaseError(f"{where}: неизвестные поля {sorted(unknown)}")
+        for field, required in COMPONENT_FIELDS.items():
+            if required or field in component:
+                _check_strings(component.get(field), f"{where}.{field}", required)
+
+    troubleshooting = data.get('troubleshooting', {})
+    if not isinstance(troubleshooting, dict):
+        raise KnowledgeBaseError(f"{source}: troubleshooting: ожидается объект")
+    for problem, correct in troubleshooting.items():
+        _check_strings(correct, f"{source}: troubleshooting.{problem}", True)
+
+    _check_strings(data.get('extra_components', []), f"{source}: extra_components", False)
+
+
+class KnowledgeBase:
+    """База знаний генератора, скомпилированная в индексы.
+
+    Прямые и обратные отображения компонент <-> функция и готовые пулы
+    дистракторов: выбор неверных вариантов - O(k) без перебора компонентов.
+    """
+
+    def __init__(self, data: Dict, source: str = 'quiz_data.json'):
+        validate(data, source)
+        self.source = source
+        self.components: Dict[str, Dict] = data['components']
+        self.troubleshooting: Dict[str, List[str]] = data.get('troubleshooting', {})
+        self.extra_components: List[str] = data.get('extra_components', [])
+        self.component_names: Tuple[str, ...] = tuple(self.components)
+
+        # функция -> компоненты, которые ее выполняют
+        self.function_owners: Dict[str, Tuple[str, ...]] = {}
+        for name, component in self.components.items():
+            for function in component['functions']:
+                self.function_owners[function] = self.function_owners.get(function, ()) + (name,)
+
+        # "Какой компонент выполняет F?" - компоненты без функции F
+        self.component_pools: Dict[str, Tuple[str, ...]] = {
+            function: tuple(c for c in self.component_names if c not in owners)
+            for function, owners in self.function_owners.items()
+        }
+        # "Что делает компонент C?" - функции других компонентов
+        self.function_pools: Dict[str, Tuple[str, ...]] = {
+            name: tuple(f for f, owners in self.function_owners.items() if name not in owners)
+            for name in self.component_names
+        }
+        # "Какие компоненты проверять при P?" - компоненты и доп. варианты не из ответа
+        candidates = self.component_names + tuple(c for c in self.extra_components if c not in self.components)
+        self.problem_pools: Dict[str, Tuple[str, ...]] = {
+            problem: tuple(c for c in candidates if c not in correct)
+            for problem, correct in self.troubleshooting.items()
+        }
+
+        shared = [f for f, owners in self.function_owners.items() if len(owners) > 1]
+        if shared:
+            logger.warning(f"{source}: функции у нескольких компонентов: {shared}")
+
+    @staticmethod
+    def distractors(pool: Tuple[str, ...], count: int = 3, rng=None) -> List[str]:
+        return (rng or random).sample(pool, min(count, len(pool)))
+
+    def stats(self) -> Dict:
+        return {
+            'source': self.source,
+            'components': len(self.components),
+            'functions': len(self.function_owners),
+            'problems': len(self.troubleshooting),
+        }
+
+
+def load_knowledge_base(path: Optional[str] = None) -> KnowledgeBase:
+    """База знаний из QUIZ_DATA_PATH (по умолчанию quiz_data.json рядом с генератором)"""
+    path = path or os.environ.get("QUIZ_DATA_PATH") or DEFAULT_PATH
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except ValueError as e:
+        raise KnowledgeBaseError(f"{path}: некорректный JSON: {e}")
+    knowledge = KnowledgeBase(data, path)
+    logger.info(f"База знаний {path}: {knowledge.stats()}")
+    return knowledge
@@ -0,0 +1,156 @@
+# app/generators/near_duplicates.py
+import re
+import random
+import hashlib
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from .fingerprint import normalize_text
+
+# 64 хеш-функции MinHash, 16 полос по 4 строки: кандидаты со сходством от ~0.5
+NUM_PERM = 64
+BANDS = 16
+# Оценка сходства по Жаккару, с которой кандидат считается перефразировкой
+THRESHOLD = 0.5
+# Перефразировки дают одинаковые наборы шинглов: сигнатуры кэшируются
+SIGNATURE_CACHE = 10000
+
+_PRIME = (1 << 61) - 1
+_PUNCTUATION = re.compile(r'[^\w\s-]')
+
+
+class NearDuplicateIndex:
+    """Кластеры перефразировок: MinHash по шинглам слов + LSH по полосам.
+
+    Перед шинглингом фонетические варианты заменяются исходным словом, а слова
+    шаблонов отбрасываются, поэтому вопросы об одном факте (включая обратный
+    вопрос "что делает X" / "какой компонент делает Y") получают общие
+    шинглы. Кандидаты из совпавших ведер проверяются по сигнатуре первого
+    вопроса кластера; вопрос попадает в первый кластер со сходством не ниже
+    threshold. Кластеры назначаются потоком за O(1) на вопрос.
+    """
+
+    def __init__(self, stopwords: Iterable[str] = (), synonyms: Optional[Dict[str, str]] = None,
+                 num_perm: int = NUM_PERM, bands: int = BANDS, threshold: float = THRESHOLD, seed: int = 1):
+        self.stopwords = {word for text in stopwords for word in self._words(text)}
+        synonyms = {normalize_text(v): normalize_text(c) for v, c in (synonyms or {}).items() if v != c}
+        self._canonical = synonyms
+        self._synonym_pattern = None
+        if synonyms:
+            variants = sorted(synonyms, key=len, reverse=True)
+            self._synonym_pattern = re.compile(
+                r'(?<!\S)(' + '|'.join(re.escape(v) for v in variants) + r')(?!\S)'
+            )
+        rng = random.Random(seed)
+        self._permutations = [(rng.randrange(1, _PRIME), rng.randrange(_PRIME)) for _ in range(num_perm)]
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._buckets: Dict[str, int] = {}
+        self._representatives: List[List[int]] = []
+        self._signatures: Dict[frozenset, List[int]] = {}
+
+    @staticmethod
+    def _words(text: str) -> List[str]:
+        return _PUNCTUATION.sub(' ', normalize_text(text)).split()
+
+    def tokens(self, text: str) -> List[str]:
+        text = ' '.join(self._words(text))
+        if self._synonym_pattern:
+            text = self._synonym_pattern.sub(lambda m: self._canonical[m.group(1)], text)
+        return [word for word in text.split() if word not in self.stopwords]
+
+    def shingles(self, question: Dict) -> Set[str]:
+        """Слова и пары слов текста и правильных ответов"""
+        result = set()
+        for part in [question.get('question', '')] + list(question.get('correct', [])):
+            words = self.tokens(part)
+            result.update(words)
+            result.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        return result or {normalize_text(question.get('question', ''))}
+
+    def signature(self, shingles: Set[str]) -> List[int]:
+        key = frozenset(shingles)
+        signature = self._signatures.get(key)
+        if signature is None:
+            hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little')
+                      for s in key]
+            signature = [min((a * h + b) % _PRIME for h in hashes) for a, b in self._permutations]
+            if len(self._signatures) >= SIGNATURE_CACHE:
+                self._signatures.clear()
+            self._signatures[key] = signature
+        return signature
+
+    def band_keys(self, signature: List[int]) -> List[str]:
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(repr(rows).encode('ascii'), digest_size=8).hexdigest()
+            keys.append(f"{band}:{digest}")
+        return keys
+
+    @staticmethod
+    def similarity(first: List[int], second: List[int]) -> float:
+        """Оценка сходства по Жаккару: доля совпавших минимумов"""
+        return sum(a == b for a, b in zip(first, second)) / len(first)
+
+    @property
+    def clusters(self) -> int:
+        return len(self._representatives)
+
+    def assign(self, question: Dict) -> int:
+        """Номер кластера вопроса (новый, если подходящего кандидата нет)"""
+        signature = self.signature(self.shingles(question))
+        keys = self.band_keys(signature)
+        cluster = None
+        for candidate in dict.fromkeys(self._buckets[key] for key in keys if key in self._buckets):
+            if self.similarity(signature, self._representatives[candidate]) >= self.threshold:
+                cluster = candidate
+                break
+        if cluster is None:
+            cluster = len(self._representatives)
+            self._representatives.append(signature)
+        for key in keys:
+            self._buckets.setdefault(key, cluster)
+        return cluster
+
+    def state(self) -> Dict:
+        return {'buckets': self._buckets, 'representatives': self._representatives}
+
+    def load(self, state: Dict):
+        self._buckets = dict(state['buckets'])
+        self._representatives = [list(signature) for signature in state['representatives']]
+
+
+def spread_over_clusters(questions: Iterable[Dict], count: int,
+                         key: Optional[Callable[[Dict], Optional[int]]] = None) -> List[Dict]:
+    """До count вопросов с наибольшим разбросом по кластерам перефразировок.
+
+    Сначала по одному вопросу на кластер в порядке questions; если кластеров
+    меньше count, остаток добирается перефразировками по кругу кластеров
+    (вторые вопросы каждого кластера, затем третьи...). Кластер - key(question),
+    по умолчанию поле 'cluster'; вопрос без кластера - отдельный кластер.
+    """
+    key = key or (lambda question: question.get('cluster'))
+    result = []
+    extras: Dict[int, List[Dict]] = {}
+    for question in questions:
+        if len(result) >= count:
+            break
+        cluster = key(question)
+        if cluster is None:
+            result.append(question)
+        elif cluster not in extras:
+            extras[cluster] = []
+            result.append(question)
+        elif len(extras[cluster]) < count:
+            extras[cluster].append(question)
+
+    queues = [deque(extra) for extra in extras.values() if extra]
+    while len(result) < count and queues:
+        for queue in queues:
+            result.append(queue.popleft())
+            if len(result) >= count:
+                break
+        queues = [queue for queue in queues if queue]
+    return result
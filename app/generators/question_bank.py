@@ -0,0 +1,282 @@
+# app/generators/question_bank.py
+import os
+import json
+import mmap
+import random
+import shutil
+import struct
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .near_duplicates import spread_over_clusters
+
+logger = logging.getLogger(__name__)
+
+# Формат файла банка вопросов (little-endian):
+#   заголовок  HEADER
+#   индекс строк  n_strings x STRING_ENTRY (смещение и длина в области строк)
+#   записи вопросов  n_questions x RECORD (фиксированная ширина)
+#   область строк  UTF-8 без разделителей, каждая строка хранится один раз
+MAGIC = b'QBNK'
+FORMAT_VERSION = 2
+MAX_OPTIONS = 8
+
+HEADER = struct.Struct('<4sHHIIQQQ')  # magic, version, reserved, n_questions, n_strings, index/records/strings offsets
+STRING_ENTRY = struct.Struct('<II')   # offset, length
+RECORD = struct.Struct(f'<IIIBBBB{MAX_OPTIONS}II')  # text, topic, level, weight, type, n_options, correct_mask, options, cluster
+# Версия 1 - без кластера перефразировок
+RECORDS = {1: struct.Struct(f'<IIIBBBB{MAX_OPTIONS}I'), 2: RECORD}
+NO_CLUSTER = 0xFFFFFFFF
+
+QUESTION_TYPES = ('single_choice', 'multiple_choice')
+
+
+# Как часто BankWriter сохраняет чекпойнт (вопросов)
+CHECKPOINT_EVERY = 10000
+
+
+def question_category(question: Dict) -> str:
+    """Тема вопроса: category вопроса из БД, компонент (single_choice) или тип проблемы (multiple_choice)"""
+    return question.get('category') or question.get('component') or question.get('problem_type') or ''
+
+
+class BankWriter:
+    """Потоковая запись банка: память не зависит от числа вопросов.
+
+    Индекс строк, записи и строки пишутся в три временных файла рядом с path,
+    finish() склеивает их в файл банка и атомарно заменяет прежний. Тексты
+    вопросов не дедуплицируются (они уникальны), в памяти только словарь
+    коротких повторяющихся строк (темы, уровни, варианты). Каждые
+    CHECKPOINT_EVERY вопросов состояние сохраняется в path.checkpoint:
+    BankWriter(path, resume=True) после сбоя продолжает с position.
+    clusters (NearDuplicateIndex) назначает вопросам кластеры перефразировок,
+    его состояние сохраняется в том же чекпойнте.
+    """
+
+    PARTS = ('index', 'records', 'strings')
+
+    def __init__(self, path: str, resume: bool = False, meta: Optional[Dict] = None, clusters=None):
+        self.path = path
+        self.clusters = clusters
+        self.checkpoint_path = path + '.checkpoint'
+        self._paths = {part: f"{path}.tmp.{part}" for part in self.PARTS}
+        state = None
+        if resume and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                state = json.load(f)
+        if state:
+            self.meta = state['meta']
+            self.position = state['position']
+            self._string_count = state['strings']
+            self._shared = state['shared']
+            if clusters is not None and state.get('clusters'):
+                clusters.load(state['clusters'])
+            self._files = {}
+            for part in self.PARTS:
+                f = open(self._paths[part], 'r+b')
+                f.truncate(state['sizes'][part])
+                f.seek(0, os.SEEK_END)
+                self._files[part] = f
+            logger.info(f"Банк вопросов {path}: продолжение с позиции {self.position}")
+        else:
+            self.meta = meta or {}
+            self.position = 0
+            self._string_count = 0
+            self._shared = {}
+            self._files = {part: open(self._paths[part], 'wb') for part in self.PARTS}
+        self._strings_size = self._files['strings'].tell()
+
+    def _append_string(self, value: str) -> int:
+        data = (value or '').encode('utf-8')
+        self._files['index'].write(STRING_ENTRY.pack(self._strings_size, len(data)))
+        self._files['strings'].write(data)
+        self._strings_size += len(data)
+        self._string_count += 1
+        return self._string_count - 1
+
+    def _shared_string(self, value: str) -> int:
+        value = value or ''
+        string_id = self._shared.get(value)
+        if string_id is None:
+            string_id = self._shared[value] = self._append_string(value)
+        return string_id
+
+    def add(self, question: Dict):
+        options = list(question.get('options', []))
+        if len(options) > MAX_OPTIONS:
+            raise ValueError(f"Больше {MAX_OPTIONS} вариантов ответа: {question.get('question', '')}")
+        correct = set(question.get('correct', []))
+        mask = 0
+        for i, option in enumerate(options):
+            if option in correct:
+                mask |= 1 << i
+        option_ids = [self._shared_string(option) for option in options] + [0] * (MAX_OPTIONS - len(options))
+        cluster = question.get('cluster')
+        if cluster is None and self.clusters is not None:
+            cluster = self.clusters.assign(question)
+        self._files['records'].write(RECORD.pack(
+            self._append_string(question.get('question', '')),
+            self._shared_string(question_category(question)),
+            self._shared_string(question.get('level', 'L1')),
+            int(question.get('weight', 1)),
+            QUESTION_TYPES.index(question.get('type', 'single_choice')),
+            len(options),
+            mask,
+            *option_ids,
+            NO_CLUSTER if cluster is None else cluster
+        ))
+        self.position += 1
+        if self.position % CHECKPOINT_EVERY == 0:
+            self.checkpoint()
+
+    def checkpoint(self):
+        sizes = {}
+        for part, f in self._files.items():
+            f.flush()
+            os.fsync(f.fileno())
+            sizes[part] = f.tell()
+        state = {'meta': self.meta, 'position': self.position, 'strings': self._string_count,
+                 'shared': self._shared, 'sizes': sizes,
+                 'clusters': self.clusters.state() if self.clusters is not None else None}
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+    def finish(self) -> int:
+        """Сборка файла банка; возвращает число вопросов"""
+        self.close()
+        index_offset = HEADER.size
+        records_offset = index_offset + STRING_ENTRY.size * self._string_count
+        strings_offset = records_offset + RECORD.size * self.position
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as out:
+            out.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, self.position, self._string_count,
+                                  index_offset, records_offset, strings_offset))
+            for part in self.PARTS:
+                with open(self._paths[part], 'rb') as f:
+                    shutil.copyfileobj(f, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, self.path)
+        for part_path in list(self._paths.values()) + [self.checkpoint_path]:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        logger.info(f"Банк вопросов {self.path}: {self.position} вопросов, {self._string_count} строк")
+        return self.position
+
+
+def compile_bank(questions: Iterable[Dict], path: str, clusters=None) -> int:
+    """Компиляция вопросов в бинарный файл банка; возвращает число вопросов.
+
+    Файл пишется во временный и атомарно заменяет прежний: процессы, уже
+    отобразившие старый файл в память, продолжают читать его до переоткрытия.
+    """
+    writer = BankWriter(path, clusters=clusters)
+    for question in questions:
+        writer.add(question)
+    return writer.finish()
+
+
+class QuestionBank:
+    """Банк вопросов, отображенный в память только для чтения.
+
+    Страницы файла общие для всех процессов, открывших его; вопросы
+    декодируются по требованию.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self._count, self._string_count,
+         self._index_offset, self._records_offset, self._strings_offset) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version not in RECORDS:
+            self._mm.close()
+            raise ValueError(f"{path}: не файл банка вопросов версии {FORMAT_VERSION}")
+        self._record = RECORDS[version]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _string(self, string_id: int) -> str:
+        offset, length = STRING_ENTRY.unpack_from(self._mm, self._index_offset + STRING_ENTRY.size * string_id)
+        start = self._strings_offset + offset
+        return self._mm[start:start + length].decode('utf-8')
+
+    def __getitem__(self, index: int) -> Dict:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        text, topic, level, weight, type_id, n_options, mask, *option_ids = self._record.unpack_from(
+            self._mm, self._records_offset + self._record.size * index
+        )
+        cluster = option_ids.pop() if len(option_ids) > MAX_OPTIONS else NO_CLUSTER
+        options = [self._string(option_ids[i]) for i in range(n_options)]
+        question = {
+            'bank_index': index,
+            'type': QUESTION_TYPES[type_id],
+            'question': self._string(text),
+            'options': options,
+            'correct': [option for i, option in enumerate(options) if mask & (1 << i)],
+            'level': self._string(level),
+            'weight': weight
+        }
+        topic_key = 'problem_type' if question['type'] == 'multiple_choice' else 'component'
+        question[topic_key] = self._string(topic)
+        if cluster != NO_CLUSTER:
+            question['cluster'] = cluster
+        return question
+
+    def attributes(self) -> Iterator[Tuple[int, Dict]]:
+        """(номер, {type, level, category, weight, cluster}) всех вопросов без декодирования текстов"""
+        strings = {}
+        cluster = NO_CLUSTER
+        for index in range(self._count):
+            _, topic, level, weight, type_id, _, _, *option_ids = self._record.unpack_from(
+                self._mm, self._records_offset + self._record.size * index
+            )
+            if len(option_ids) > MAX_OPTIONS:
+                cluster = option_ids[-1]
+            for string_id in (topic, level):
+                if string_id not in strings:
+                    strings[string_id] = self._string(string_id)
+            yield index, {
+                'type': QUESTION_TYPES[type_id],
+                'level': strings[level],
+                'category': strings[topic],
+                'weight': weight,
+                'cluster': cluster
+            }
+
+    def sample(self, count: int, rng: Optional[random.Random] = None) -> List[Dict]:
+        """count случайных вопросов без повторов"""
+        rng = rng or random
+        return [self[i] for i in rng.sample(range(self._count), min(count, self._count))]
+
+    def sample_clusters(self, count: int, rng: Optional[random.Random] = None) -> List[Dict]:
+        """count случайных вопросов: по одному на кластер перефразировок, пока кластеры не кончатся"""
+        rng = rng or random
+        order = (self[i] for i in rng.sample(range(self._count), self._count))
+        return spread_over_clusters(order, count)
+
+    def close(self):
+        self._mm.close()
+
+
+def open_bank(path: Optional[str] = None) -> Optional[QuestionBank]:
+    """Банк из QUESTION_BANK_PATH (None, если файла нет или он поврежден)"""
+    path = path or os.environ.get("QUESTION_BANK_PATH", "question_bank.bin")
+    if not os.path.exists(path):
+        return None
+    try:
+        return QuestionBank(path)
+    except (OSError, ValueError, struct.error) as e:
+        logger.error(f"Не удалось открыть банк вопросов {path}: {e}")
+        return None
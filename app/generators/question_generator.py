@@ -2,73 +2,59 @@
 import random
 import json
 import logging
-from typing import List, Dict, Tuple
+import multiprocessing
+from collections import deque
+from typing import Iterator, List, Dict, Tuple
 from datetime import datetime
 
+from .question_pool import ReloadableBank
+from .enumerator import QuestionEnumerator
+from .fingerprint import question_fingerprint
+from .near_duplicates import NearDuplicateIndex, spread_over_clusters
+from .blueprint import blueprint_sampler
+from .knowledge_base import KnowledgeBase, load_knowledge_base
+from .template_engine import TemplateEngine
+from .dedup import RotatingBloomFilter
+
 logger = logging.getLogger(__name__)
 
+# Размер шарда параллельной генерации (не зависит от числа процессов)
+SHARD_SIZE = 1000
+
+# Генератор в процессе пула (см. generate_question_pool(workers=N))
+_worker_generator = None
+
+
+def _init_worker(generator):
+    global _worker_generator
+    _worker_generator = generator
+
+
+def _generate_shard(task):
+    return _worker_generator._decode_shard(*task)
+
+
 class QuestionGenerator:
-    def __init__(self):
-        self.components_data = self._load_components_data()
+    def __init__(self, bank=None, knowledge: KnowledgeBase = None):
+        # База знаний из quiz_data.json (QUIZ_DATA_PATH)
+        self.knowledge = knowledge or load_knowledge_base()
+        self.components_data = self.knowledge.components
         self.templates = self._load_templates()
-        self.generated_hashes = set()
+        self.variations = self._load_variations()
+        self.troubleshooting_map = self.knowledge.troubleshooting
+        self.extra_components = self.knowledge.extra_components
+        # Шаблоны и вариации, разобранные один раз
+        self.engine = TemplateEngine(self.templates, self.variations)
+        self.enumerator = QuestionEnumerator(self)
+        self.near_duplicates = self._near_duplicate_index()
+        # Выданные отпечатки: память ограничена (GENERATED_HASHES_MAX_BYTES), см. RotatingBloomFilter
+        self.generated_hashes = RotatingBloomFilter()
         self._question_pool = []
+        self._question_pool_size = 0
+        # Скомпилированный банк (manage.py build_question_bank), общий для процессов через mmap;
+        # пересобранный файл подменяется без перезапуска (ReloadableBank)
+        self.bank = bank if bank is not None else ReloadableBank()
         
-    def _load_components_data(self) -> Dict:
-        """Загрузка данных о компонентах из предоставленных материалов"""
-        return {
-            # Компоненты и их функции
-            'resmtp': {
-                'functions': [
-                    "обрабатывает входящие SMTP-сообщения и выполняет первичную проверку",
-                    "проверяет белые и черные списки IP и хостов отправителей",
-                    "балансирует входящие письма на хосты mx-in",
-                    "проверяет максимальный размер письма"
-                ],
-                'config_files': ['resmtp.conf'],
-                'interactions': ['mx-in', 'dovecot-rpc', 'dns-black-list', 'dns-white-list']
-            },
-            'mx-in': {
-                'functions': ["очередь входящих писем"],
-                'config_files': ['main.cf'],
-                'interactions': ['director', 'resmtp']
-            },
-            'mx-out': {
-                'functions': ["очередь исходящих писем"],
-                'config_files': ['main.cf'],
-                'interactions': ['compose', 'carlos', 'fallback']
-            },
-            'director': {
-                'functions': ["балансировка IMAP-подключений"],
-                'interactions': ['dovecot', 'mx-in']
-            },
-            'dovecot-rms': {
-                'functions': ["хранение тел писем в Cassandra"],
-                'config_files': ['dovecot.conf'],
-                'interactions': ['director', 'cassandra', 'postgresql', 'mail-search']
-            },
-            'compose': {
-                'functions': ["создание исходящих писем"],
-                'interactions': ['mx-out', 'mail-id']
-            },
-            'mail-id': {
-                'functions': ["авторизация пользователей"],
-                'interactions': ['director', 'memcached', 'adsync']
-            },
-            'caldav': {
-                'functions': ["работа с календарями"],
-                'interactions': ['beanstalkd', 'caldav-mail']
-            },
-            'beanstalkd': {
-                'functions': ["очередь событий"],
-                'interactions': ['caldav', 'mail-events']
-            },
-            'caldav-mail': {
-                'functions': ["уведомления о событиях календаря"],
-                'interactions': ['caldav', 'mx-out']
-            }
-        }
-    
     def _load_templates(self) -> Dict:
         """Шаблоны вопросов с фонетическими вариациями"""
         return {
@@ -112,9 +98,9 @@ class QuestionGenerator:
             ]
         }
     
-    def _phonetic_variations(self, text: str) -> str:
-        """Создание фонетических вариаций текста"""
-        variations = {
+    def _load_variations(self) -> Dict:
+        """Фонетические вариации: слово -> варианты замены (первое - исходное слово)"""
+        return {
             'компонент': ['компонент', 'сервис', 'модуль', 'элемент системы', 'блок'],
             'обрабатывает': ['обрабатывает', 'выполняет обработку', 'осуществляет обработку', 'занимается обработкой'],
             'проверяет': ['проверяет', 'выполняет проверку', 'осуществляет проверку', 'проводит проверку'],
@@ -123,120 +109,87 @@ class QuestionGenerator:
             'хранение': ['хранение', 'сохранение', 'хранение данных', 'сохранение информации'],
             'авторизация': ['авторизация', 'аутентификация', 'проверка доступа', 'идентификация']
         }
+    
+    def _near_duplicate_index(self) -> NearDuplicateIndex:
+        """Индекс перефразировок: слова шаблонов не значимы, варианты сводятся к исходному слову"""
+        stopwords = self.engine.literals()
+        synonyms = {variant: word for word, variants in self.variations.items() for variant in variants}
+        return NearDuplicateIndex(stopwords, synonyms)
+    
+    def reset_near_duplicates(self) -> NearDuplicateIndex:
+        """Новый пустой индекс перефразировок (сборка банка заново); возвращает его"""
+        self.near_duplicates = self._near_duplicate_index()
+        return self.near_duplicates
+    
+    def variation_slots(self, text: str) -> List[str]:
+        """Слова text, для которых есть фонетические вариации (в порядке таблицы вариаций)"""
+        return self.engine.compile_text(text).slots
+    
+    def _phonetic_variations(self, text: str, choices: List[int] = None) -> str:
+        """Создание фонетических вариаций текста.
         
-        result = text
-        for original, variants in variations.items():
-            if original in result:
-                result = result.replace(original, random.choice(variants), 1)
-        
-        return result
+        choices - номера вариантов для слов из variation_slots(text);
+        без них варианты выбираются случайно.
+        """
+        compiled = self.engine.compile_text(text)
+        if choices is None:
+            choices = [random.randrange(radix) for radix in compiled.radices]
+        return compiled.render(choices)
     
     def _generate_question_hash(self, question_text: str, correct_answers: List) -> str:
-        """Генерация хеша для проверки уникальности"""
-        return hash(frozenset([question_text.strip().lower()] + sorted(correct_answers)))
+        """Отпечаток для проверки уникальности (совпадает с questions.fingerprint)"""
+        return question_fingerprint(question_text, correct_answers)
+    
+    def _pick_unused(self, kind: str, topic: str, used_hashes: set) -> Dict:
+        """Случайный еще не выданный вопрос из пространства (kind, topic) без рекурсии"""
+        for index in self.enumerator.shuffled_indices(kind, topic):
+            question = self.enumerator.question(index)
+            question_hash = self._generate_question_hash(question['question'], question['correct'])
+            if question_hash in used_hashes or question_hash in self.generated_hashes:
+                continue
+            used_hashes.add(question_hash)
+            self.generated_hashes.add(question_hash)
+            return question
+        
+        logger.warning(f"Исчерпаны уникальные вопросы для {topic}")
+        return None
     
     def generate_single_choice(self, component: str = None, used_hashes: set = None) -> Dict:
-        """Генерация вопроса с одним правильным ответом"""
+        """Генерация вопроса с одним правильным ответом (None - вопросы компонента исчерпаны)"""
         if component is None:
-            components = list(self.components_data.keys())
-            component = random.choice(components)
+            component = random.choice(self.knowledge.component_names)
         
         if used_hashes is None:
             used_hashes = set()
-            
-        component_data = self.components_data[component]
-        
-        # Выбираем случайный шаблон
-        template_type = random.choice(['component_function', 'function_component'])
-        
-        if template_type == 'component_function':
-            function = random.choice(component_data['functions'])
-            function = self._phonetic_variations(function)
-            template = random.choice(self.templates[template_type])
-            question_text = template.format(function=function)
-            correct_answers = [component]
-        
-        elif template_type == 'function_component':
-            template = random.choice(self.templates[template_type])
-            question_text = template.format(component=component)
-            correct_answers = [random.choice(component_data['functions'])]
         
-        # Генерируем неправильные варианты
-        other_components = [c for c in self.components_data.keys() if c != component]
-        wrong_answers = random.sample(other_components, min(3, len(other_components)))
-        options = correct_answers + wrong_answers
-        random.shuffle(options)
-        
-        question_hash = self._generate_question_hash(question_text, correct_answers)
-        
-        # Проверяем уникальность
-        if question_hash in used_hashes or question_hash in self.generated_hashes:
-            return self.generate_single_choice(component, used_hashes)
-        
-        used_hashes.add(question_hash)
-        self.generated_hashes.add(question_hash)
-        
-        return {
-            'type': 'single_choice',
-            'question': question_text,
-            'options': options,
-            'correct': correct_answers,
-            'component': component,
-            'level': random.choice(['L1', 'L2']),
-            'weight': 1
-        }
+        return self._pick_unused('single_choice', component, used_hashes)
     
     def generate_multiple_choice(self, problem_type: str = None, used_hashes: set = None) -> Dict:
-        """Генерация вопроса с несколькими правильными ответами"""
+        """Генерация вопроса с несколькими правильными ответами (None - вопросы исчерпаны)"""
         if used_hashes is None:
             used_hashes = set()
-            
-        troubleshooting_map = {
-            'ошибка авторизации': ['mail-id', 'memcached', 'adsync'],
-            'письма теряются': ['journaling', 'nats', 'mail-events'],
-            'календарь не синхронизируется': ['caldav', 'beanstalkd', 'network'],
-            'не отправляются письма': ['mx-out', 'compose', 'фильтры'],
-            'пользователь не получает письма': ['resmtp', 'mx-in', 'квоту в directory']
-        }
         
-        if problem_type is None or problem_type not in troubleshooting_map:
-            problem_type = random.choice(list(troubleshooting_map.keys()))
+        if problem_type is None or problem_type not in self.troubleshooting_map:
+            problem_type = random.choice(list(self.troubleshooting_map.keys()))
         
-        correct_components = troubleshooting_map[problem_type]
-        template = random.choice(self.templates['troubleshooting'])
-        question_text = template.format(problem=problem_type)
-        
-        # Генерируем все возможные варианты
-        all_components = list(self.components_data.keys()) + ['network', 'фильтры', 'квоту в directory']
-        wrong_components = [c for c in all_components if c not in correct_components]
-        wrong_answers = random.sample(wrong_components, min(3, len(wrong_components)))
-        
-        options = correct_components + wrong_answers
-        random.shuffle(options)
-        
-        question_hash = self._generate_question_hash(question_text, correct_components)
-        
-        if question_hash in used_hashes or question_hash in self.generated_hashes:
-            return self.generate_multiple_choice(problem_type, used_hashes)
-        
-        used_hashes.add(question_hash)
-        self.generated_hashes.add(question_hash)
-        
-        return {
-            'type': 'multiple_choice',
-            'question': question_text,
-            'options': options,
-            'correct': correct_components,
-            'problem_type': problem_type,
-            'level': 'L2',
-            'weight': 3
-        }
+        return self._pick_unused('multiple_choice', problem_type, used_hashes)
     
     def ensure_diversity(self, questions: List[Dict], pool_size: int = 50) -> List[Dict]:
-        """Обеспечивает разнообразие вопросов в пуле"""
+        """Обеспечивает разнообразие вопросов в пуле.
+        
+        Перефразировки уже выбранного факта откладываются и добираются по кругу
+        кластеров, только если разных фактов меньше pool_size.
+        """
         component_count = {}
         question_hashes = set()
+        clusters = set()
         diverse_questions = []
+        deferred = []
+        
+        def accept(question, question_hash, component):
+            component_count[component] = component_count.get(component, 0) + 1
+            question_hashes.add(question_hash)
+            diverse_questions.append(question)
         
         for question in questions:
             component = question.get('component') or question.get('problem_type', 'unknown')
@@ -250,56 +203,171 @@ class QuestionGenerator:
             if question_hash in question_hashes:
                 continue
             
-            component_count[component] = component_count.get(component, 0) + 1
-            question_hashes.add(question_hash)
-            diverse_questions.append(question)
+            # Перефразировки одного факта (кластер из банка или индекса) - в конец очереди
+            cluster = question.get('cluster')
+            if cluster is None:
+                cluster = self.near_duplicates.assign(question)
+            if cluster in clusters:
+                deferred.append((question, question_hash, component, cluster))
+                continue
             
+            clusters.add(cluster)
+            accept(question, question_hash, component)
             if len(diverse_questions) >= pool_size:
                 break
         
+        if len(diverse_questions) < pool_size:
+            for question, question_hash, component, _ in spread_over_clusters(deferred, len(deferred),
+                                                                               key=lambda item: item[3]):
+                if component_count.get(component, 0) >= 2 or question_hash in question_hashes:
+                    continue
+                accept(question, question_hash, component)
+                if len(diverse_questions) >= pool_size:
+                    break
+        
+        if len(diverse_questions) < pool_size:
+            logger.warning(f"Разнообразных вопросов {len(diverse_questions)} из {pool_size}")
         return diverse_questions
     
-    def generate_question_pool(self, size: int = 100) -> List[Dict]:
-        """Генерация большого пула вопросов"""
-        questions = []
-        components = list(self.components_data.keys())
-        problem_types = ['ошибка авторизации', 'письма теряются', 'календарь не синхронизируется', 
-                        'не отправляются письма', 'пользователь не получает письма']
+    def __getstate__(self):
+        # mmap банка не передается в процессы пула
+        state = self.__dict__.copy()
+        state['bank'] = None
+        return state
+    
+    def _decode_shard(self, shard: int, count: int, seed) -> List[Dict]:
+        """Вопросы шарда; seed шарда зависит только от общего seed и номера шарда"""
+        rng = random.Random(f"{seed}:{shard}")
+        start = shard * SHARD_SIZE
+        return [self.enumerator.question(index, rng)
+                for index in self.enumerator.stream_indices(count, seed, start, start + SHARD_SIZE)]
+    
+    def _iter_shards(self, count: int, seed, workers: int = 1, first_shard: int = 0) -> Iterator[List[Dict]]:
+        """Шарды по порядку; в работе не больше 2 * workers шардов, память не растет с count"""
+        total = sum(self.enumerator.split(count))
+        shards = range(first_shard, (total + SHARD_SIZE - 1) // SHARD_SIZE)
+        if workers <= 1 or len(shards) <= 1:
+            for shard in shards:
+                yield self._decode_shard(shard, count, seed)
+            return
         
-        used_hashes = set()
+        with multiprocessing.Pool(min(workers, len(shards)), initializer=_init_worker, initargs=(self,)) as pool:
+            pending = deque()
+            for shard in shards:
+                pending.append(pool.apply_async(_generate_shard, ((shard, count, seed),)))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+    
+    def _unissued(self, stream: Iterator[Tuple[int, Dict]]) -> Iterator[Tuple[int, Dict]]:
+        """Отсев вопросов, уже выданных генератором; выданные вызовом отмечаются в конце.
         
-        for i in range(size):
-            try:
-                if i % 5 == 0:  # Каждый 5-й вопрос - multiple choice
-                    problem_type = random.choice(problem_types)
-                    question = self.generate_multiple_choice(problem_type, used_hashes)
-                else:
-                    component = random.choice(components)
-                    question = self.generate_single_choice(component, used_hashes)
-                
-                if question:
-                    questions.append(question)
-                
-                if i % 100 == 0 and i > 0:
-                    logger.info(f"Сгенерировано {i} вопросов")
-                    
-            except Exception as e:
-                logger.error(f"Ошибка при генерации вопроса {i}: {e}")
-                continue
+        Внутри вызова повторы отсекаются точно (множество отпечатков вызова),
+        generated_hashes проверяется только как история прошлых вызовов: его
+        ложные "уже выдан" (~GENERATED_HASHES_ERROR_RATE) не задевают вопросы
+        этого вызова, а у нового генератора (история пуста) невозможны.
+        Пропущенные как выданные вопросы учитываются в логе.
+        """
+        history = len(self.generated_hashes) > 0
+        issued = set()
+        skipped = 0
+        try:
+            for position, question in stream:
+                fingerprint = self._generate_question_hash(question['question'], question['correct'])
+                if fingerprint in issued:
+                    continue
+                if history and fingerprint in self.generated_hashes:
+                    skipped += 1
+                    continue
+                issued.add(fingerprint)
+                yield position, question
+        finally:
+            for fingerprint in issued:
+                self.generated_hashes.add(fingerprint)
+            if skipped:
+                logger.info(f"Пропущено как уже выданные: {skipped} вопросов")
+    
+    @staticmethod
+    def _positions(shards: Iterator[List[Dict]], start: int = 0) -> Iterator[Tuple[int, Dict]]:
+        """(позиция в потоке, вопрос) для шардов, начиная с позиции start"""
+        position = start - start % SHARD_SIZE
+        for batch in shards:
+            for question in batch:
+                if position >= start:
+                    yield position, question
+                position += 1
+    
+    def iter_questions(self, n: int, seed=None, workers: int = 1, start: int = 0,
+                       positions: bool = False) -> Iterator:
+        """Ленивый поток пула из n вопросов для seed, начиная с позиции start.
         
+        Номера вопросов уникальны по построению (перестановка пространства);
+        вопросы, уже выданные этим генератором, отсеиваются тем же шагом
+        (_unissued), что и в generate_question_pool. Поток совпадает с пулом
+        того же seed только при одинаковом состоянии generated_hashes (например,
+        у нового генератора): уже выданные вопросы в поток не попадают.
+        positions=True - пары (позиция, вопрос): позицию следующего вопроса
+        потребитель сохраняет как чекпойнт и после сбоя передает в start.
+        """
+        if seed is None:
+            seed = random.randrange(2 ** 63)
+        shards = self._iter_shards(n, seed, workers, start // SHARD_SIZE)
+        for position, question in self._unissued(self._positions(shards, start)):
+            yield (position, question) if positions else question
+    
+    def _merge_shards(self, shards) -> List[Dict]:
+        """Слияние шардов по порядку без вопросов, уже выданных генератором"""
+        questions = [question for _, question in self._unissued(self._positions(shards))]
+        logger.info(f"Сгенерировано {len(questions)} вопросов")
+        return questions
+    
+    def generate_question_pool(self, size: int = 100, seed=None, workers: int = 1) -> List[Dict]:
+        """Генерация пула уникальных вопросов выборкой без возвращения.
+        
+        Номера вопросов определяются seed и позицией, поток делится на шарды по
+        SHARD_SIZE, которые декодируются в пуле из workers процессов. Результат
+        для одного seed не зависит от workers. Если size больше числа уникальных
+        вопросов, возвращаются все доступные. Для больших пулов - iter_questions.
+        """
+        capacity = self.enumerator.check(size)
+        if not capacity['achievable']:
+            logger.warning(f"Запрошено {size} вопросов, уникальных доступно {capacity['available']} "
+                           f"(single_choice: {capacity['single_choice']}, multiple_choice: {capacity['multiple_choice']})")
+        
+        if seed is None:
+            seed = random.randrange(2 ** 63)
+        questions = self._merge_shards(self._iter_shards(size, seed, workers))
+        
+        if len(questions) < min(size, capacity['available']):
+            logger.warning(f"Пул меньше запрошенного: {len(questions)} из {size} "
+                           f"(остальные уже выданы этим генератором)")
         logger.info(f"Всего сгенерировано {len(questions)} вопросов")
         return questions
     
-    def get_test_questions(self, count: int = 50) -> List[Dict]:
-        """Получение разнообразного набора вопросов для теста"""
-        if not self._question_pool:
-            self._question_pool = self.generate_question_pool(100)
+    def get_test_questions(self, count: int = 50, blueprint=None) -> List[Dict]:
+        """Получение разнообразного набора из count вопросов для теста.
+        
+        С банком вопросы выбираются по квотам бланка (настройка test_blueprint).
+        Без банка тест добирается до count вопросами пула сверх правил
+        разнообразия; если уникальных вопросов меньше count - ValueError.
+        """
+        bank = self.bank.snapshot()[1] if isinstance(self.bank, ReloadableBank) else self.bank
+        if bank:
+            return blueprint_sampler(bank, blueprint, count).sample()
+        
+        wanted = max(100, count * 3)
+        if self._question_pool_size < wanted:
+            self._question_pool = self.generate_question_pool(wanted)
+            self._question_pool_size = wanted
         
-        if not self._question_pool:
-            logger.error("Не удалось сгенерировать вопросы для теста")
-            return []
+        if len(self._question_pool) < count:
+            raise ValueError(f"Для теста нужно {count} вопросов, уникальных доступно {len(self._question_pool)}")
         
         # Выбираем случайные вопросы и обеспечиваем разнообразие
-        candidate_count = min(count * 3, len(self._question_pool))
-        candidate_questions = random.sample(self._question_pool, candidate_count)
-        return self.ensure_diversity(candidate_questions, count)
\ No newline at end of file
+        candidate_questions = random.sample(self._question_pool, len(self._question_pool))
+        questions = self.ensure_diversity(candidate_questions, count)
+        if len(questions) < count:
+            chosen = {id(question) for question in questions}
+            questions += [q for q in candidate_questions if id(q) not in chosen][:count - len(questions)]
+        return questions
\ No newline at end of file
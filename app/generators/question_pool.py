@@ -0,0 +1,115 @@
+# app/generators/question_pool.py
+import os
+import time
+import struct
+import logging
+import threading
+from typing import Callable, Optional, Tuple
+
+from .question_bank import QuestionBank
+
+logger = logging.getLogger(__name__)
+
+
+class ReloadableBank:
+    """Банк вопросов с горячей заменой без перезапуска процесса.
+
+    Версия банка - mtime, размер и inode файла (compile_bank атомарно
+    заменяет файл, поэтому у новой сборки другой inode). Файл открывается
+    при первом snapshot(), а не в конструкторе: при импорте приложения
+    миграции еще не применены, а воркеры еще не созданы fork. Первая
+    загрузка без prepare (ее делает поток запроса). Дальше не чаще раза в
+    check_interval секунд snapshot() делает один os.stat; при смене версии
+    новый банк открывается и прогревается (prepare) в фоновом потоке и
+    подменяется одним присваиванием. Взятый snapshot остается рабочим:
+    старый mmap закрывается сборщиком мусора, когда на него нет ссылок.
+    """
+
+    def __init__(self, path: Optional[str] = None, check_interval: Optional[float] = None,
+                 prepare: Optional[Callable[[QuestionBank], None]] = None):
+        self.path = path or os.environ.get("QUESTION_BANK_PATH", "question_bank.bin")
+        self.check_interval = (check_interval if check_interval is not None
+                               else float(os.environ.get("QUESTION_BANK_CHECK_INTERVAL", "5")))
+        self.prepare = prepare
+        self._lock = threading.Lock()
+        self._snapshot: Tuple[Optional[str], Optional[QuestionBank]] = (None, None)
+        self._loading = None
+        self._checked_at = None
+        self.reloads = 0
+
+    def _file_version(self) -> Optional[str]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}-{stat.st_ino:x}"
+
+    def _load(self, version: str, prepare: bool = True):
+        try:
+            bank = QuestionBank(self.path)
+        except (OSError, ValueError, struct.error) as e:
+            logger.error(f"Не удалось загрузить банк вопросов {self.path} ({version}): {e}")
+        else:
+            if prepare and self.prepare is not None:
+                try:
+                    self.prepare(bank)
+                except Exception as e:
+                    # Прогрев не обязателен: банк подменяется, сэмплер соберется при первом тесте
+                    logger.warning(f"Ошибка прогрева банка вопросов {version}: {e}")
+            previous = self._snapshot[0]
+            self._snapshot = (version, bank)
+            if previous is not None:
+                self.reloads += 1
+                logger.info(f"Банк вопросов {self.path}: версия {previous} -> {version}, {len(bank)} вопросов")
+        finally:
+            self._loading = None
+
+    def _open(self):
+        """Первая загрузка банка в вызывающем потоке"""
+        with self._lock:
+            if self._checked_at is not None:
+                return
+            version = self._file_version()
+            if version is not None:
+                self._load(version, prepare=False)
+            self._checked_at = time.monotonic()
+
+    def check(self):
+        """Проверка версии файла; загрузка новой версии в фоне"""
+        if self._checked_at is None:
+            self._open()
+            return
+        self._checked_at = time.monotonic()
+        version = self._file_version()
+        if version is None or version == self._snapshot[0]:
+            return
+        with self._lock:
+            if self._loading == version:
+                return
+            self._loading = version
+        threading.Thread(target=self._load, args=(version,), name='question-bank-reload', daemon=True).start()
+
+    def snapshot(self) -> Tuple[Optional[str], Optional[QuestionBank]]:
+        """(версия, банк) для одного теста; (None, None), если банка нет"""
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+            self.check()
+        return self._snapshot
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._snapshot[0]
+
+    @property
+    def bank(self) -> Optional[QuestionBank]:
+        return self.snapshot()[1]
+
+    def stats(self):
+        version, bank = self._snapshot
+        return {
+            'path': self.path,
+            'version': version,
+            'questions': len(bank) if bank is not None else 0,
+            'reloads': self.reloads,
+            'loading': self._loading,
+            'check_interval': self.check_interval,
+        }
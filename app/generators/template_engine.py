@@ -0,0 +1,130 @@
+# app/generators/template_engine.py
+import re
+import itertools
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+_PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+
+class CompiledTemplate:
+    """Шаблон вопроса, разобранный один раз: литералы и имена подстановок"""
+    __slots__ = ('source', 'literals', 'fields')
+
+    def __init__(self, source: str):
+        self.source = source
+        parts = _PLACEHOLDER.split(source)
+        self.literals: Tuple[str, ...] = tuple(parts[0::2])
+        self.fields: Tuple[str, ...] = tuple(parts[1::2])
+
+    def fill(self, value: str) -> str:
+        """Подстановка в шаблон с одним полем"""
+        return self.literals[0] + value + self.literals[1]
+
+    def render(self, **values) -> str:
+        out = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            out.append(values[field])
+            out.append(literal)
+        return ''.join(out)
+
+
+class CompiledText:
+    """Текст с фонетическими вариациями: литералы между словами-слотами.
+
+    slots - слова с вариациями в порядке таблицы вариаций (номера choices),
+    каждое заменяется в месте первого вхождения в исходный текст.
+    """
+    __slots__ = ('source', 'slots', 'radices', 'literals', 'order', 'options')
+
+    def __init__(self, source: str, slots: List[str], positions: Dict[str, int], variations: Dict[str, List[str]]):
+        self.source = source
+        self.slots = slots
+        self.radices = [len(variations[word]) for word in slots]
+        # Слоты по положению в тексте: order[i] - номер слота в choices
+        by_position = sorted(range(len(slots)), key=lambda i: positions[slots[i]])
+        self.order = by_position
+        self.options = [variations[word] for word in slots]
+        literals, cursor = [], 0
+        for i in by_position:
+            start = positions[slots[i]]
+            literals.append(source[cursor:start])
+            cursor = start + len(slots[i])
+        literals.append(source[cursor:])
+        self.literals = literals
+
+    @property
+    def count(self) -> int:
+        """Число поверхностных вариантов текста"""
+        total = 1
+        for radix in self.radices:
+            total *= radix
+        return total
+
+    def render(self, choices: Sequence[int]) -> str:
+        out = [self.literals[0]]
+        for literal, slot in zip(self.literals[1:], self.order):
+            out.append(self.options[slot][choices[slot]])
+            out.append(literal)
+        return ''.join(out)
+
+    def variants(self) -> Iterator[str]:
+        """Все поверхностные варианты в порядке номеров (смешанная система счисления)"""
+        for choices in itertools.product(*(range(radix) for radix in self.radices)):
+            yield self.render(choices)
+
+
+class TemplateEngine:
+    """Шаблоны и таблица вариаций, скомпилированные один раз.
+
+    Слова с вариациями ищутся одним регулярным выражением-альтернацией
+    (длинные слова первыми), разбор текста кэшируется; рендер - склейка
+    готовых сегментов по кортежу номеров без str.format и str.replace.
+    """
+
+    def __init__(self, templates: Dict[str, List[str]], variations: Dict[str, List[str]]):
+        self.templates = {name: [CompiledTemplate(t) for t in items] for name, items in templates.items()}
+        self.variations = variations
+        self._rank = {word: i for i, word in enumerate(variations)}
+        self._pattern = None
+        if variations:
+            words = sorted(variations, key=len, reverse=True)
+            self._pattern = re.compile('|'.join(re.escape(w) for w in words))
+        self._texts: Dict[str, CompiledText] = {}
+
+    def compile_text(self, text: str) -> CompiledText:
+        compiled = self._texts.get(text)
+        if compiled is None:
+            positions = {}
+            if self._pattern is not None:
+                for match in self._pattern.finditer(text):
+                    positions.setdefault(match.group(0), match.start())
+            slots = sorted(positions, key=self._rank.__getitem__)
+            compiled = self._texts[text] = CompiledText(text, slots, positions, self.variations)
+        return compiled
+
+    def render(self, template: str, number: int, **values) -> str:
+        return self.templates[template][number].render(**values)
+
+    def render_index(self, template: str, text: str, digits: Sequence[int]) -> str:
+        """Вопрос по кортежу номеров: digits[0] - шаблон, остальные - варианты слов text"""
+        return self.templates[template][digits[0]].fill(self.compile_text(text).render(digits[1:]))
+
+    def render_batch(self, template: str, text: str, batch: Sequence[Sequence[int]]) -> List[str]:
+        items = self.templates[template]
+        compiled = self.compile_text(text)
+        return [items[digits[0]].fill(compiled.render(digits[1:])) for digits in batch]
+
+    def count(self, template: str, text: str = None) -> int:
+        """Число поверхностных вариантов: шаблоны x варианты подставляемого текста"""
+        return len(self.templates[template]) * (self.compile_text(text).count if text else 1)
+
+    def variants(self, template: str, field: str, text: str) -> Iterator[str]:
+        """Все поверхностные варианты вопроса: каждый шаблон с каждым вариантом text"""
+        compiled = self.compile_text(text)
+        for item in self.templates[template]:
+            for variant in compiled.variants():
+                yield item.render(**{field: variant})
+
+    def literals(self) -> List[str]:
+        """Текст шаблонов без подстановок"""
+        return [literal for items in self.templates.values() for item in items for literal in item.literals]
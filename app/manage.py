@@ -19,6 +19,9 @@ try:
     # Импортируем app и database
     from app import app
     from database import db_instance
+    from migrations import run_migrations as apply_migrations
+    from session_storage import backfill_blob_sessions
+    from session_archive import archive_sessions as archive_old_sessions, rebuild_stats as rebuild_all_stats
     
     # Импортируем db из app или создаем
     try:
@@ -39,6 +42,7 @@ def wait_for_postgres(max_retries=30, delay=5):
         try:
             # Простая проверка подключения к БД
             db_instance.get_connection()
+            db_instance.release_connection()
             logger.info("✅ PostgreSQL доступен")
             return True
         except Exception as e:
@@ -73,9 +77,108 @@ def init_database():
 def run_migrations():
     """Запуск миграций"""
     logger.info("🔄 Запуск миграций...")
-    # Здесь можно добавить логику миграций
-    logger.info("✅ Миграции завершены")
-    return True
+    
+    if not wait_for_postgres():
+        return False
+    
+    try:
+        applied = apply_migrations(db_instance)
+        logger.info(f"✅ Миграции завершены (применено: {len(applied)})")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Ошибка применения миграций: {e}")
+        return False
+
+def backfill_sessions():
+    """Перенос старых сессий из JSON-колонок в session_answers"""
+    logger.info("🔄 Перенос сессий в нормализованное хранилище...")
+    
+    if not wait_for_postgres():
+        return False
+    
+    try:
+        apply_migrations(db_instance)
+        converted = backfill_blob_sessions(db_instance)
+        logger.info(f"✅ Перенесено сессий: {converted}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Ошибка переноса сессий: {e}")
+        return False
+
+def rebuild_stats():
+    """Пересчет агрегатов статистики с нуля"""
+    logger.info("🔄 Пересчет агрегатов статистики...")
+    
+    if not wait_for_postgres():
+        return False
+    
+    try:
+        apply_migrations(db_instance)
+        rebuild_all_stats(db_instance)
+        logger.info("✅ Агрегаты статистики пересчитаны")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Ошибка пересчета агрегатов: {e}")
+        return False
+
+def archive_sessions():
+    """Архивация старых сессий в сжатые файлы JSONL"""
+    logger.info("🔄 Архивация старых сессий...")
+    
+    if not wait_for_postgres():
+        return False
+    
+    try:
+        apply_migrations(db_instance)
+        archived = archive_old_sessions(db_instance)
+        for month, deleted in archived.items():
+            logger.info(f"Месяц {month}: удалено из рабочей таблицы {deleted} сессий")
+        logger.info(f"✅ Заархивировано месяцев: {len(archived)}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Ошибка архивации сессий: {e}")
+        return False
+
+def build_question_bank(count=10000, path=None, workers=None, seed=None):
+    """Компиляция банка вопросов в бинарный файл для mmap.
+    
+    Вопросы генератора пишутся потоком, за ними - вопросы, добавленные в БД;
+    прерванная сборка с тем же count продолжается с последнего чекпойнта
+    (path.checkpoint) с тем же seed.
+    """
+    from bank_builder import bank_path, build_question_bank as build_bank
+    
+    path = bank_path(path)
+    workers = workers or int(os.environ.get("QUESTION_BANK_WORKERS", "0")) or os.cpu_count() or 1
+    if seed is None and os.environ.get("QUESTION_BANK_SEED"):
+        seed = int(os.environ["QUESTION_BANK_SEED"])
+    logger.info(f"🔄 Генерация банка из {count} вопросов ({workers} процессов)...")
+    
+    if not wait_for_postgres():
+        return False
+    
+    try:
+        started = time.time()
+        apply_migrations(db_instance)
+        compiled = build_bank(db_instance, count, path, workers, seed)
+        logger.info(f"✅ Банк вопросов {path}: {compiled} вопросов, "
+                    f"{os.path.getsize(path)} байт за {time.time() - started:.1f} с")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Ошибка сборки банка вопросов: {e}")
+        return False
+
+def check_quiz_data(path=None):
+    """Проверка схемы базы знаний генератора"""
+    from generators import KnowledgeBaseError, load_knowledge_base
+    
+    try:
+        knowledge = load_knowledge_base(path)
+        logger.info(f"✅ База знаний корректна: {knowledge.stats()}")
+        return True
+    except (OSError, KnowledgeBaseError) as e:
+        logger.error(f"❌ Ошибка базы знаний: {e}")
+        return False
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -95,6 +198,39 @@ if __name__ == "__main__":
             else:
                 sys.exit(1)
             
+        elif command == "backfill_sessions":
+            if backfill_sessions():
+                sys.exit(0)
+            else:
+                sys.exit(1)
+            
+        elif command == "rebuild_stats":
+            if rebuild_stats():
+                sys.exit(0)
+            else:
+                sys.exit(1)
+            
+        elif command == "archive_sessions":
+            if archive_sessions():
+                sys.exit(0)
+            else:
+                sys.exit(1)
+            
+        elif command == "build_question_bank":
+            count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+            path = sys.argv[3] if len(sys.argv) > 3 else None
+            workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+            if build_question_bank(count, path, workers):
+                sys.exit(0)
+            else:
+                sys.exit(1)
+            
+        elif command == "check_quiz_data":
+            if check_quiz_data(sys.argv[2] if len(sys.argv) > 2 else None):
+                sys.exit(0)
+            else:
+                sys.exit(1)
+            
         elif command == "runserver":
             logger.info("🚀 Запуск сервера...")
             # Проверяем доступность БД перед запуском
@@ -108,6 +244,11 @@ if __name__ == "__main__":
             print("Доступные команды:")
             print("  init_db       - Инициализация базы данных")
             print("  run_migrations - Запуск миграций")
+            print("  backfill_sessions - Перенос старых сессий в session_answers")
+            print("  rebuild_stats - Пересчет агрегатов статистики")
+            print("  archive_sessions - Архивация старых сессий в сжатые файлы")
+            print("  build_question_bank [N] [путь] [процессы] - Сборка банка вопросов для mmap")
+            print("  check_quiz_data [путь] - Проверка базы знаний генератора")
             print("  runserver     - Запуск сервера")
             sys.exit(1)
     else:
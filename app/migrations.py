@@ -0,0 +1,478 @@
+import os
+import json
+import logging
+from datetime import date, datetime
+
+from session_storage import content_hash, load_json
+from stats_rollups import rebuild_rollups
+from generators.fingerprint import question_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory lock PostgreSQL: только один под применяет миграции
+MIGRATION_LOCK_KEY = 0x5155495A
+
+
+class Migration:
+    """Версия схемы: набор SQL-выражений и/или функций step(db)"""
+
+    def __init__(self, version, name, steps):
+        self.version = version
+        self.name = name
+        self.steps = steps
+
+    def apply(self, db):
+        for step in self.steps:
+            if callable(step):
+                step(db)
+            else:
+                db.execute_query(step)
+
+
+def table_exists(db, table):
+    if db.is_postgres:
+        rows = db.execute_query("SELECT to_regclass(?) AS name", (table,))
+        return bool(rows and rows[0]['name'])
+    rows = db.execute_query("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return bool(rows)
+
+
+def column_exists(db, table, column):
+    if db.is_postgres:
+        rows = db.execute_query('''
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = ? AND column_name = ?
+        ''', (table, column))
+        return bool(rows)
+    return any(row['name'] == column for row in db.execute_query(f"SELECT name FROM pragma_table_info('{table}')"))
+
+
+def add_column(table, column, definition):
+    """Шаг миграции: ADD COLUMN, если колонки еще нет (SQLite не знает IF NOT EXISTS)"""
+    def step(db):
+        if not column_exists(db, table, column):
+            db.execute_query(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return step
+
+
+def _seed_defaults(db):
+    # Администратор по умолчанию
+    db.execute_query('''
+        INSERT OR IGNORE INTO admins (username) VALUES ('admin')
+    ''')
+
+    # Базовые настройки
+    default_settings = [
+        ('domain_auth_enabled', 'false'),
+        ('smtp_enabled', 'false'),
+        ('smtp_host', ''),
+        ('smtp_port', '587'),
+        ('smtp_username', ''),
+        ('smtp_password', ''),
+        ('notification_email', ''),
+        ('test_duration', '60'),
+        ('questions_per_test', '50')
+    ]
+
+    for key, value in default_settings:
+        db.execute_query('''
+            INSERT OR IGNORE INTO settings (key, value)
+            VALUES (?, ?)
+        ''', (key, value))
+
+
+def _snapshot_question_versions(db):
+    """Первые версии всех существующих вопросов (вопрос с другими вариантами - следующая версия)"""
+    latest = {}
+    last_id = 0
+    while True:
+        rows = db.execute_query('''
+            SELECT id, question_text, question_type, options, correct_answer, category FROM questions
+            WHERE id > ? ORDER BY id LIMIT 1000
+        ''', (last_id,))
+        if not rows:
+            break
+        versions = []
+        for row in rows:
+            question = {
+                'question': row['question_text'],
+                'type': row['question_type'],
+                'options': load_json(row['options']) or [],
+                'correct': load_json(row['correct_answer']) or []
+            }
+            key = question_fingerprint(question['question'], question['correct'])
+            latest[key] = latest.get(key, 0) + 1
+            versions.append({
+                'content_hash': content_hash(question),
+                'question_key': key,
+                'version': latest[key],
+                'question_text': question['question'],
+                'question_type': question['type'],
+                'options': json.dumps(question['options']),
+                'correct_answer': json.dumps(question['correct']),
+                'category': row['category']
+            })
+        # Вопросы с одинаковым содержимым - одна версия
+        result = db.bulk_insert('question_versions', versions, ignore_conflicts=True)
+        if result['failed']:
+            raise RuntimeError(f"Ошибка снимка версий вопросов: {result['errors']}")
+        last_id = rows[-1]['id']
+
+
+def month_start(value):
+    """Первое число месяца для date/datetime"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"test_sessions_p{month.year:04d}{month.month:02d}"
+
+
+def is_partitioned(db):
+    if not db.is_postgres:
+        return False
+    rows = db.execute_query("SELECT relkind FROM pg_class WHERE relname = 'test_sessions' AND relkind = 'p'")
+    return bool(rows)
+
+
+def ensure_partitions(db, start=None, months_ahead=None):
+    """Месячные партиции test_sessions от start (по умолчанию - текущий месяц) вперед.
+
+    Строки вне партиций попадают в test_sessions_default; партицию месяца,
+    строки которого уже лежат в default, создать нельзя - поэтому партиции
+    создаются заранее (DB_PARTITION_MONTHS_AHEAD).
+    """
+    if not is_partitioned(db):
+        return []
+    if months_ahead is None:
+        months_ahead = int(os.environ.get("DB_PARTITION_MONTHS_AHEAD", "3"))
+
+    current = month_start(datetime.now())
+    month = month_start(start) if start else current
+    created = []
+    while month <= add_months(current, months_ahead):
+        name = partition_name(month)
+        if not table_exists(db, name):
+            try:
+                with db.transaction():
+                    db.execute_query(
+                        f"CREATE TABLE {name} PARTITION OF test_sessions FOR VALUES FROM (?) TO (?)",
+                        (month.isoformat(), add_months(month, 1).isoformat())
+                    )
+                created.append(name)
+            except Exception as e:
+                logger.warning(f"Не удалось создать партицию {name}: {e}")
+        month = add_months(month, 1)
+    if created:
+        logger.info(f"Созданы партиции: {', '.join(created)}")
+    return created
+
+
+def _partition_test_sessions(db):
+    """PostgreSQL: test_sessions -> таблица с месячными партициями по completed_at"""
+    if not db.is_postgres or is_partitioned(db):
+        return
+
+    db.execute_query("ALTER TABLE test_sessions RENAME TO test_sessions_legacy")
+    db.execute_query("ALTER TABLE test_sessions_legacy RENAME CONSTRAINT test_sessions_pkey TO test_sessions_legacy_pkey")
+    db.execute_query("DROP INDEX IF EXISTS ix_test_sessions_completed_at")
+    db.execute_query("DROP INDEX IF EXISTS ix_test_sessions_user_identifier")
+    # Ключ партиционирования обязан входить в первичный ключ
+    db.execute_query('''
+        CREATE TABLE test_sessions (
+            id INTEGER NOT NULL DEFAULT nextval('test_sessions_id_seq'),
+            user_identifier VARCHAR(255),
+            user_display_name VARCHAR(255),
+            questions_data JSON,
+            answers_data JSON,
+            score INTEGER DEFAULT 0,
+            percent DECIMAL(5,2) DEFAULT 0,
+            level VARCHAR(10),
+            completed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, completed_at)
+        ) PARTITION BY RANGE (completed_at)
+    ''')
+    db.execute_query("CREATE TABLE test_sessions_default PARTITION OF test_sessions DEFAULT")
+
+    rows = db.execute_query("SELECT MIN(completed_at) AS oldest FROM test_sessions_legacy")
+    ensure_partitions(db, start=rows[0]['oldest'] if rows else None)
+
+    db.execute_query('''
+        INSERT INTO test_sessions
+        (id, user_identifier, user_display_name, questions_data, answers_data, score, percent, level, completed_at)
+        SELECT id, user_identifier, user_display_name, questions_data, answers_data, score, percent, level,
+               COALESCE(completed_at, CURRENT_TIMESTAMP)
+        FROM test_sessions_legacy
+    ''')
+    # Последовательность id переходит к новой таблице, иначе DROP удалит и ее
+    db.execute_query("ALTER SEQUENCE test_sessions_id_seq OWNED BY test_sessions.id")
+    db.execute_query("DROP TABLE test_sessions_legacy")
+    db.execute_query("CREATE INDEX IF NOT EXISTS ix_test_sessions_completed_at ON test_sessions (completed_at)")
+    db.execute_query("CREATE INDEX IF NOT EXISTS ix_test_sessions_user_identifier ON test_sessions (user_identifier)")
+    db.execute_query("CREATE INDEX IF NOT EXISTS ix_test_sessions_id ON test_sessions (id)")
+
+
+def _fill_question_fingerprints(db):
+    """Отпечатки существующих вопросов; у дубликатов (кроме первого) остается NULL"""
+    seen = set()
+    duplicates = 0
+    last_id = 0
+    while True:
+        rows = db.execute_query('''
+            SELECT id, question_text, correct_answer FROM questions
+            WHERE id > ? AND fingerprint IS NULL ORDER BY id LIMIT 1000
+        ''', (last_id,))
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            fingerprint = question_fingerprint(row['question_text'], load_json(row['correct_answer']) or [])
+            if fingerprint in seen:
+                duplicates += 1
+                continue
+            seen.add(fingerprint)
+            updates.append((fingerprint, row['id']))
+        # Страница целиком - одним пакетом, а не UPDATE на строку
+        db.execute_many("UPDATE questions SET fingerprint = ? WHERE id = ?", updates)
+        last_id = rows[-1]['id']
+    if duplicates:
+        logger.warning(f"Вопросов-дубликатов без отпечатка: {duplicates}")
+
+
+MIGRATIONS = [
+    Migration(1, 'base_schema', [
+        # Таблица пользователей
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(100) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            full_access BOOLEAN DEFAULT FALSE,
+            manage_questions BOOLEAN DEFAULT FALSE,
+            manage_settings BOOLEAN DEFAULT FALSE,
+            manage_users BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Таблица админов
+        '''
+        CREATE TABLE IF NOT EXISTS admins (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(100) UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Таблица настроек
+        '''
+        CREATE TABLE IF NOT EXISTS settings (
+            id SERIAL PRIMARY KEY,
+            key VARCHAR(100) UNIQUE NOT NULL,
+            value TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Таблица вопросов
+        '''
+        CREATE TABLE IF NOT EXISTS questions (
+            id SERIAL PRIMARY KEY,
+            question_text TEXT NOT NULL,
+            question_type VARCHAR(50) DEFAULT 'single_choice',
+            options JSON,
+            correct_answer JSON,
+            category VARCHAR(100) DEFAULT 'general',
+            level VARCHAR(10) DEFAULT 'L1',
+            weight INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Таблица сессий тестирования
+        '''
+        CREATE TABLE IF NOT EXISTS test_sessions (
+            id SERIAL PRIMARY KEY,
+            user_identifier VARCHAR(255),
+            user_display_name VARCHAR(255),
+            questions_data JSON,
+            answers_data JSON,
+            score INTEGER DEFAULT 0,
+            percent DECIMAL(5,2) DEFAULT 0,
+            level VARCHAR(10),
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        _seed_defaults,
+    ]),
+    Migration(2, 'questions_is_active', [
+        add_column('questions', 'is_active', 'BOOLEAN DEFAULT TRUE'),
+    ]),
+    Migration(3, 'hot_path_indexes', [
+        "CREATE INDEX IF NOT EXISTS ix_test_sessions_completed_at ON test_sessions (completed_at)",
+        "CREATE INDEX IF NOT EXISTS ix_test_sessions_user_identifier ON test_sessions (user_identifier)",
+        "CREATE INDEX IF NOT EXISTS ix_questions_category_level_active ON questions (category, level, is_active)",
+    ]),
+    Migration(4, 'normalized_session_answers', [
+        # Неизменяемые снимки вопросов по хешу содержимого. question_key - отпечаток вопроса
+        # (question_fingerprint): одинаков для вопроса банка при любой сборке и для вопроса
+        # из БД (questions.fingerprint); новое содержимое вопроса - следующая version
+        '''
+        CREATE TABLE IF NOT EXISTS question_versions (
+            content_hash VARCHAR(32) PRIMARY KEY,
+            question_key VARCHAR(32) NOT NULL,
+            version INTEGER NOT NULL,
+            question_text TEXT NOT NULL,
+            question_type VARCHAR(50) NOT NULL,
+            options JSON,
+            correct_answer JSON,
+            category VARCHAR(100),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_question_versions_key ON question_versions (question_key, version)",
+        # Ответы сессии вместо JSON-копий вопросов в test_sessions
+        '''
+        CREATE TABLE IF NOT EXISTS session_answers (
+            session_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            content_hash VARCHAR(32) NOT NULL,
+            selected_option_ids JSON,
+            is_correct BOOLEAN NOT NULL DEFAULT FALSE,
+            PRIMARY KEY (session_id, position)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS ix_session_answers_content_hash ON session_answers (content_hash)",
+        _snapshot_question_versions,
+    ]),
+    Migration(5, 'stats_rollups', [
+        # Агрегаты для дашборда: обновляются при сохранении сессии. Строки делятся на шарды
+        # по id сессии (STATS_ROLLUP_SHARDS), чтобы параллельные сохранения не ждали
+        # блокировку одной строки; чтение суммирует шарды. У stats_totals шард - id
+        '''
+        CREATE TABLE IF NOT EXISTS stats_totals (
+            id INTEGER PRIMARY KEY,
+            questions BIGINT NOT NULL DEFAULT 0,
+            sessions BIGINT NOT NULL DEFAULT 0,
+            score_sum BIGINT NOT NULL DEFAULT 0,
+            percent_sum NUMERIC(16,2) NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stats_by_level (
+            level VARCHAR(10) NOT NULL,
+            shard INTEGER NOT NULL DEFAULT 0,
+            sessions BIGINT NOT NULL DEFAULT 0,
+            score_sum BIGINT NOT NULL DEFAULT 0,
+            percent_sum NUMERIC(16,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (level, shard)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stats_by_day (
+            day DATE NOT NULL,
+            shard INTEGER NOT NULL DEFAULT 0,
+            sessions BIGINT NOT NULL DEFAULT 0,
+            score_sum BIGINT NOT NULL DEFAULT 0,
+            percent_sum NUMERIC(16,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, shard)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stats_by_category (
+            category VARCHAR(100) NOT NULL,
+            shard INTEGER NOT NULL DEFAULT 0,
+            answers BIGINT NOT NULL DEFAULT 0,
+            correct_answers BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (category, shard)
+        )
+        ''',
+        rebuild_rollups,
+    ]),
+    Migration(6, 'partitioned_test_sessions', [
+        # Архивы старых сессий: файл JSONL, диапазон id и агрегаты для статистики
+        '''
+        CREATE TABLE IF NOT EXISTS session_archives (
+            month DATE PRIMARY KEY,
+            path TEXT NOT NULL,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            min_id INTEGER,
+            max_id INTEGER,
+            aggregates JSON,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS ix_session_archives_ids ON session_archives (min_id, max_id)",
+        _partition_test_sessions,
+    ]),
+    Migration(7, 'settings_revision', [
+        # Счетчик изменений settings для сброса кэша настроек в процессах
+        '''
+        CREATE TABLE IF NOT EXISTS settings_revision (
+            id INTEGER PRIMARY KEY,
+            revision BIGINT NOT NULL DEFAULT 0
+        )
+        ''',
+        "INSERT OR IGNORE INTO settings_revision (id, revision) VALUES (1, 1)",
+    ]),
+    Migration(8, 'questions_fingerprint', [
+        # Отпечаток содержимого: дубликаты отклоняет уникальный индекс
+        add_column('questions', 'fingerprint', 'VARCHAR(32)'),
+        _fill_question_fingerprints,
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_questions_fingerprint ON questions (fingerprint)",
+    ]),
+]
+
+LATEST_VERSION = max(m.version for m in MIGRATIONS)
+
+
+def current_version(db):
+    """Текущая версия схемы (0 - таблицы schema_version еще нет)"""
+    if not table_exists(db, 'schema_version'):
+        return 0
+    rows = db.execute_query("SELECT MAX(version) AS version FROM schema_version")
+    return (rows[0]['version'] or 0) if rows else 0
+
+
+def _pending(db):
+    version = current_version(db)
+    return [m for m in MIGRATIONS if m.version > version]
+
+
+def run_migrations(db):
+    """Применение недостающих миграций; возвращает список примененных версий"""
+    # Быстрый путь: схема актуальна - ни блокировок, ни DDL
+    if current_version(db) >= LATEST_VERSION:
+        logger.info(f"Схема БД актуальна (версия {LATEST_VERSION})")
+        return []
+
+    applied = []
+    if db.is_postgres:
+        db.execute_query("SELECT pg_advisory_lock(?)", (MIGRATION_LOCK_KEY,))
+    try:
+        with db.transaction():
+            db.execute_query('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR(200) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+        # Повторная проверка под блокировкой: другой под мог уже все применить
+        for migration in _pending(db):
+            logger.info(f"Применение миграции {migration.version}: {migration.name}")
+            with db.transaction():
+                migration.apply(db)
+                db.execute_query(
+                    "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                    (migration.version, migration.name)
+                )
+            applied.append(migration.version)
+    finally:
+        if db.is_postgres:
+            db.execute_query("SELECT pg_advisory_unlock(?)", (MIGRATION_LOCK_KEY,))
+
+    logger.info(f"Применено миграций: {len(applied)}, версия схемы {current_version(db)}")
+    return applied
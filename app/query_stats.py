@@ -0,0 +1,149 @@
+import os
+import re
+import time
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Верхние границы корзин гистограммы задержек, мс (последняя корзина - "больше")
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """Ключ запроса: литералы -> ?, списки плейсхолдеров -> (?...), пробелы схлопнуты"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(?...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class _StatementStats:
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+
+class RequestScope:
+    """Счетчик запросов к БД в рамках одного HTTP-запроса"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+
+
+class QueryStats:
+    """Гистограммы задержек по нормализованному SQL, лог медленных запросов
+    и бюджет запросов на HTTP-запрос (с поиском N+1)"""
+
+    def __init__(self):
+        self.slow_query_ms = float(os.environ.get("DB_SLOW_QUERY_MS", "200"))
+        self.request_budget = int(os.environ.get("DB_QUERY_BUDGET", "30"))
+        self.repeat_limit = int(os.environ.get("DB_QUERY_REPEAT_LIMIT", "10"))
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._request = contextvars.ContextVar('query_stats_request', default=None)
+
+    def record(self, sql, seconds):
+        """Учет одного выполненного запроса"""
+        key = normalize_sql(sql)
+        ms = seconds * 1000
+
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                entry = self._stats[key] = _StatementStats()
+            entry.count += 1
+            entry.total += ms
+            entry.max = max(entry.max, ms)
+            entry.buckets[bisect_left(BUCKETS_MS, ms)] += 1
+
+        scope = self._request.get()
+        if scope is not None:
+            scope.count += 1
+            scope.time += seconds
+            scope.statements[key] += 1
+
+        if ms >= self.slow_query_ms:
+            where = f" [{scope.name}]" if scope is not None else ""
+            logger.warning(f"Медленный запрос{where} {ms:.1f} ms: {key}")
+
+    def timed(self, sql):
+        """Контекстный менеджер замера: with query_stats.timed(sql): ..."""
+        return _Timer(self, sql)
+
+    def begin_request(self, name):
+        self._request.set(RequestScope(name))
+
+    def end_request(self):
+        """Завершение HTTP-запроса: предупреждения о превышении бюджета и N+1"""
+        scope = self._request.get()
+        if scope is None:
+            return None
+        self._request.set(None)
+
+        if scope.count > self.request_budget:
+            logger.warning(
+                f"Запрос {scope.name}: {scope.count} обращений к БД "
+                f"(бюджет {self.request_budget}), {scope.time * 1000:.1f} ms"
+            )
+        for key, count in scope.statements.items():
+            if count > self.repeat_limit:
+                logger.warning(f"Запрос {scope.name}: возможен N+1 - {count} раз выполнен {key}")
+        return scope
+
+    def snapshot(self, limit=50):
+        """Топ запросов по суммарному времени с гистограммами"""
+        with self._lock:
+            items = [(key, e.count, e.total, e.max, list(e.buckets)) for key, e in self._stats.items()]
+        items.sort(key=lambda item: item[2], reverse=True)
+
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return [{
+            'sql': key,
+            'count': count,
+            'total_ms': round(total, 3),
+            'avg_ms': round(total / count, 3),
+            'max_ms': round(max_ms, 3),
+            'histogram': {label: n for label, n in zip(labels, buckets) if n}
+        } for key, count, total, max_ms, buckets in items[:limit]]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class _Timer:
+    __slots__ = ('_stats', '_sql', '_started')
+
+    def __init__(self, stats, sql):
+        self._stats = stats
+        self._sql = sql
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stats.record(self._sql, time.perf_counter() - self._started)
+        return False
+
+
+# Глобальный сборщик статистики запросов процесса
+query_stats = QueryStats()
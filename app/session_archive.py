@@ -0,0 +1,179 @@
+import io
+import os
+import gzip
+import json
+import time
+import logging
+from datetime import datetime
+
+from migrations import month_start, add_months, partition_name, is_partitioned, ensure_partitions, table_exists
+from session_storage import iter_sessions, load_session, load_json
+from stats_rollups import period_aggregates, rebuild_rollups
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+def _extension():
+    compression = os.environ.get("SESSION_ARCHIVE_COMPRESSION", "zstd" if zstandard else "gzip")
+    if compression == "zstd" and zstandard is None:
+        logger.warning("zstandard не установлен, архив сжимается gzip")
+        compression = "gzip"
+    return '.zst' if compression == "zstd" else '.gz'
+
+
+def _open_writer(path, extension):
+    if extension == '.zst':
+        return io.TextIOWrapper(zstandard.ZstdCompressor(level=10).stream_writer(open(path, 'wb')), encoding='utf-8')
+    return gzip.open(path, 'wt', encoding='utf-8')
+
+
+def _open_reader(path):
+    if path.endswith('.zst'):
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb')), encoding='utf-8')
+    return gzip.open(path, 'rt', encoding='utf-8')
+
+
+def _write_archive(db, month, start, end, archive_dir):
+    """Сессии месяца с ответами -> сжатый JSONL (через временный файл и rename)"""
+    os.makedirs(archive_dir, exist_ok=True)
+    extension = _extension()
+    path = os.path.abspath(os.path.join(archive_dir, f"test_sessions_{month:%Y_%m}.jsonl{extension}"))
+    tmp_path = path + '.tmp'
+
+    count, min_id, max_id = 0, None, None
+    with _open_writer(tmp_path, extension) as f:
+        for session in iter_sessions(db, start=start, end=end, replica=False):
+            f.write(json.dumps(session, ensure_ascii=False, default=str) + '\n')
+            count += 1
+            min_id = session['id'] if min_id is None else min_id
+            max_id = session['id']
+
+    with open(tmp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path, count, min_id, max_id
+
+
+def _delete_batches(db, start, end, min_id, max_id, batch_size, pause):
+    """Удаление заархивированных сессий короткими транзакциями по batch_size строк"""
+    deleted = 0
+    while True:
+        with db.transaction():
+            rows = db.execute_query('''
+                SELECT id FROM test_sessions
+                WHERE completed_at >= ? AND completed_at < ? AND id BETWEEN ? AND ?
+                ORDER BY id LIMIT ?
+            ''', (start, end, min_id, max_id, batch_size))
+            if rows:
+                ids = tuple(row['id'] for row in rows)
+                marks = ', '.join(['?'] * len(ids))
+                db.execute_query(f"DELETE FROM session_answers WHERE session_id IN ({marks})", ids)
+                db.execute_query(
+                    f"DELETE FROM test_sessions WHERE completed_at >= ? AND completed_at < ? AND id IN ({marks})",
+                    (start, end) + ids
+                )
+        if not rows:
+            return deleted
+        deleted += len(rows)
+        if pause:
+            time.sleep(pause)
+
+
+def _drop_empty_partition(db, month):
+    name = partition_name(month)
+    if not is_partitioned(db) or not table_exists(db, name):
+        return
+    if not db.execute_query(f"SELECT 1 FROM {name} LIMIT 1"):
+        db.execute_query(f"DROP TABLE {name}")
+        logger.info(f"Удалена пустая партиция {name}")
+
+
+def archive_month(db, month, archive_dir, batch_size=500, pause=0.05):
+    """Архивация сессий месяца: файл + запись в session_archives, затем удаление.
+
+    Повторный запуск после сбоя не перезаписывает архив, а дочищает строки
+    из уже заархивированного диапазона id.
+    """
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    rows = db.execute_query("SELECT path, min_id, max_id FROM session_archives WHERE month = ?", (start,))
+    if rows:
+        path, min_id, max_id = rows[0]['path'], rows[0]['min_id'], rows[0]['max_id']
+    else:
+        path, count, min_id, max_id = _write_archive(db, month, start, end, archive_dir)
+        if not count:
+            return 0
+        db.execute_query('''
+            INSERT INTO session_archives (month, path, sessions, min_id, max_id, aggregates)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (start, path, count, min_id, max_id, json.dumps(period_aggregates(db, start, end))))
+        logger.info(f"Архив {path}: {count} сессий (id {min_id}..{max_id})")
+
+    deleted = _delete_batches(db, start, end, min_id, max_id, batch_size, pause)
+    _drop_empty_partition(db, month)
+    return deleted
+
+
+def archive_sessions(db, older_than_months=None, archive_dir=None, batch_size=None, pause=None):
+    """Перенос сессий старше older_than_months месяцев в сжатые архивы по месяцам"""
+    if older_than_months is None:
+        older_than_months = int(os.environ.get("SESSION_ARCHIVE_AFTER_MONTHS", "12"))
+    if archive_dir is None:
+        archive_dir = os.environ.get("SESSION_ARCHIVE_DIR", "archive")
+    if batch_size is None:
+        batch_size = int(os.environ.get("SESSION_ARCHIVE_BATCH", "500"))
+    if pause is None:
+        pause = float(os.environ.get("SESSION_ARCHIVE_PAUSE_MS", "50")) / 1000
+
+    ensure_partitions(db)
+    cutoff = add_months(month_start(datetime.now()), -older_than_months).isoformat()
+    since = None
+    archived = {}
+    while True:
+        if since is None:
+            rows = db.execute_query("SELECT MIN(completed_at) AS oldest FROM test_sessions WHERE completed_at < ?", (cutoff,))
+        else:
+            rows = db.execute_query('''
+                SELECT MIN(completed_at) AS oldest FROM test_sessions
+                WHERE completed_at >= ? AND completed_at < ?
+            ''', (since, cutoff))
+        oldest = rows[0]['oldest'] if rows else None
+        if oldest is None:
+            break
+        month = month_start(datetime.fromisoformat(str(oldest)))
+        archived[month.isoformat()] = archive_month(db, month, archive_dir, batch_size, pause)
+        since = add_months(month, 1).isoformat()
+    return archived
+
+
+def read_archived_session(db, session_id):
+    """Сессия из архива по id (None, если в архивах ее нет)"""
+    rows = db.execute_query(
+        "SELECT path FROM session_archives WHERE min_id <= ? AND max_id >= ? ORDER BY month",
+        (session_id, session_id)
+    )
+    for row in rows or []:
+        with _open_reader(row['path']) as f:
+            # Строки архива упорядочены по id
+            for line in f:
+                session = json.loads(line)
+                if session['id'] == session_id:
+                    return session
+                if session['id'] > session_id:
+                    break
+    return None
+
+
+def find_session(db, session_id):
+    """Сессия по id: из рабочей таблицы, иначе из архива"""
+    return load_session(db, session_id) or read_archived_session(db, session_id)
+
+
+def rebuild_stats(db):
+    """rebuild_rollups с учетом агрегатов заархивированных сессий"""
+    rows = db.execute_query("SELECT aggregates FROM session_archives ORDER BY month") or []
+    rebuild_rollups(db, [load_json(row['aggregates']) or {} for row in rows])
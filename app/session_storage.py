@@ -0,0 +1,360 @@
+import json
+import hashlib
+import logging
+from decimal import Decimal
+from itertools import groupby
+
+from stats_rollups import record_session, record_session_async, record_answers
+from generators.fingerprint import question_fingerprint
+from generators.question_bank import question_category
+
+logger = logging.getLogger(__name__)
+
+
+def load_json(value):
+    """JSON-колонка: psycopg2 отдает объекты, sqlite3 - строки"""
+    if isinstance(value, (str, bytes)):
+        return json.loads(value)
+    return value
+
+
+def content_hash(question):
+    """Хеш содержимого версии вопроса (текст, тип, варианты, правильные ответы)"""
+    payload = json.dumps([
+        question.get('question', ''),
+        question.get('type', 'single_choice'),
+        question.get('options', []),
+        question.get('correct', [])
+    ], ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+# Версии адресуются хешем содержимого. question_key - отпечаток вопроса (текст и правильные
+# ответы): постоянен для вопроса банка и совпадает с questions.fingerprint вопроса из БД;
+# новое содержимое того же вопроса (например, другие варианты) - следующий номер version
+VERSION_COLUMNS = ['content_hash', 'question_key', 'version', 'question_text', 'question_type',
+                   'options', 'correct_answer', 'category']
+
+_INSERT_VERSION = f'''
+    INSERT OR IGNORE INTO question_versions ({', '.join(VERSION_COLUMNS)})
+    VALUES ({', '.join(['?'] * len(VERSION_COLUMNS))})
+'''
+
+# Попыток записи версий: номер версии занят параллельной сессией с другим содержимым
+VERSION_ATTEMPTS = 3
+
+_INSERT_SESSION = '''
+    INSERT INTO test_sessions
+    (user_identifier, user_display_name, score, percent, level)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+ANSWER_COLUMNS = ['session_id', 'position', 'content_hash', 'selected_option_ids', 'is_correct']
+
+_INSERT_ANSWER = f'''
+    INSERT INTO session_answers ({', '.join(ANSWER_COLUMNS)})
+    VALUES ({', '.join(['?'] * len(ANSWER_COLUMNS))})
+'''
+
+
+def _marks(values):
+    return ', '.join(['?'] * len(values))
+
+
+def _known_versions_query(digests):
+    return f'''
+        SELECT content_hash, question_key, version FROM question_versions
+        WHERE content_hash IN ({_marks(digests)})
+    '''
+
+
+def _latest_versions_query(keys):
+    return f'''
+        SELECT question_key, MAX(version) AS version FROM question_versions
+        WHERE question_key IN ({_marks(keys)}) GROUP BY question_key
+    '''
+
+
+def _known_versions(rows):
+    """{content_hash: (question_key, version)}"""
+    return {row['content_hash']: (row['question_key'], row['version']) for row in rows or []}
+
+
+def _pending_versions(questions, digests, known):
+    """Вопросы, содержимого которых еще нет в question_versions (по первому вхождению)"""
+    pending = {}
+    for question, digest in zip(questions, digests):
+        if digest not in known:
+            pending.setdefault(digest, question)
+    return pending
+
+
+def _version_rows(pending, latest):
+    """Строки новых версий: номер - следующий после последнего известного для ключа"""
+    rows = []
+    for digest, question in pending.items():
+        key = question_fingerprint(question.get('question', ''), question.get('correct', []))
+        latest[key] = (latest.get(key) or 0) + 1
+        rows.append({
+            'content_hash': digest,
+            'question_key': key,
+            'version': latest[key],
+            'question_text': question.get('question', ''),
+            'question_type': question.get('type', 'single_choice'),
+            'options': json.dumps(question.get('options', [])),
+            'correct_answer': json.dumps(question.get('correct', [])),
+            'category': question_category(question)
+        })
+    return rows
+
+
+def _version_keys(pending):
+    return list(dict.fromkeys(question_fingerprint(q.get('question', ''), q.get('correct', []))
+                              for q in pending.values()))
+
+
+def resolve_question_versions(db, questions):
+    """(content_hash, question_key, version) для каждого вопроса теста.
+
+    Версии неизменяемы и адресуются хешем содержимого: новое содержимое
+    записывается одним пакетом, повторы и параллельные сессии с тем же
+    содержимым отсекает первичный ключ. Если номер версии успела занять
+    параллельная сессия с другим содержимым того же вопроса (уникальный
+    индекс question_key, version), запись повторяется со следующим номером.
+    """
+    digests = [content_hash(q) for q in questions]
+    unique = list(dict.fromkeys(digests))
+    known = _known_versions(db.execute_query(_known_versions_query(unique), tuple(unique)) if unique else None)
+
+    for _ in range(VERSION_ATTEMPTS):
+        pending = _pending_versions(questions, digests, known)
+        if not pending:
+            break
+        keys = _version_keys(pending)
+        latest = {row['question_key']: row['version']
+                  for row in db.execute_query(_latest_versions_query(keys), tuple(keys)) or []}
+        rows = _version_rows(pending, latest)
+
+        result = db.bulk_insert('question_versions', rows, columns=VERSION_COLUMNS, ignore_conflicts=True)
+        if result['failed']:
+            raise RuntimeError(f"Не удалось сохранить версии вопросов: {result['errors']}")
+        if result['skipped']:
+            # Часть строк записала параллельная сессия - берем сохраненные версии
+            known.update(_known_versions(db.execute_query(_known_versions_query(list(pending)), tuple(pending))))
+        else:
+            known.update({row['content_hash']: (row['question_key'], row['version']) for row in rows})
+    else:
+        if _pending_versions(questions, digests, known):
+            raise RuntimeError("Не удалось сохранить версии вопросов: номера версий заняты параллельными сессиями")
+
+    return [(digest,) + known[digest] for digest in digests]
+
+
+def _option_ids(question, selected):
+    options = question.get('options', [])
+    return [options.index(value) for value in selected if value in options]
+
+
+def _answer_rows(session_id, questions, answers, versions):
+    return [(
+        session_id,
+        position,
+        digest,
+        json.dumps(_option_ids(question, answer.get('user_answer', []))),
+        bool(answer.get('is_correct', False))
+    ) for position, (question, answer, (digest, _, _))
+        in enumerate(zip(questions, answers, versions))]
+
+
+def _write_answers(db, session_id, questions, answers):
+    versions = resolve_question_versions(db, questions[:len(answers)])
+    rows = [dict(zip(ANSWER_COLUMNS, row)) for row in _answer_rows(session_id, questions, answers, versions)]
+
+    result = db.bulk_insert('session_answers', rows, columns=ANSWER_COLUMNS)
+    if result['failed']:
+        raise RuntimeError(f"Не удалось сохранить ответы сессии {session_id}: {result['errors']}")
+
+
+def save_session(db, user_identifier, display_name, questions, answers, score, percent, level):
+    """Сохранение завершенного теста: строка test_sessions + ответы в session_answers"""
+    return db.write(_save_session, db, user_identifier, display_name, questions, answers, score, percent, level)
+
+
+def _save_session(db, user_identifier, display_name, questions, answers, score, percent, level):
+    with db.transaction():
+        session_id = db.execute_insert(
+            _INSERT_SESSION, (user_identifier, display_name, score, percent, level), prepare=True
+        )
+        _write_answers(db, session_id, questions, answers)
+        record_session(db, session_id)
+    return session_id
+
+
+async def _resolve_question_versions_async(tx, questions):
+    """Асинхронный вариант resolve_question_versions на транзакции AsyncDatabase"""
+    digests = [content_hash(q) for q in questions]
+    unique = list(dict.fromkeys(digests))
+    known = _known_versions(await tx.execute_query(_known_versions_query(unique), tuple(unique)) if unique else None)
+
+    for _ in range(VERSION_ATTEMPTS):
+        pending = _pending_versions(questions, digests, known)
+        if not pending:
+            break
+        keys = _version_keys(pending)
+        latest = {row['question_key']: row['version']
+                  for row in await tx.execute_query(_latest_versions_query(keys), tuple(keys)) or []}
+        rows = _version_rows(pending, latest)
+        await tx.executemany(_INSERT_VERSION, [tuple(row[c] for c in VERSION_COLUMNS) for row in rows])
+        # executemany не сообщает пропущенные строки: версии перечитываются
+        known.update(_known_versions(await tx.execute_query(_known_versions_query(list(pending)), tuple(pending))))
+    else:
+        if _pending_versions(questions, digests, known):
+            raise RuntimeError("Не удалось сохранить версии вопросов: номера версий заняты параллельными сессиями")
+
+    return [(digest,) + known[digest] for digest in digests]
+
+
+async def save_session_async(adb, user_identifier, display_name, questions, answers, score, percent, level):
+    """save_session для AsyncDatabase (async view результатов теста)"""
+    if adb.is_postgres:
+        # asyncpg кодирует NUMERIC только из Decimal
+        percent = Decimal(str(percent))
+    async with adb.transaction() as tx:
+        session_id = await tx.execute_insert(
+            _INSERT_SESSION, (user_identifier, display_name, score, percent, level)
+        )
+        versions = await _resolve_question_versions_async(tx, questions[:len(answers)])
+        rows = _answer_rows(session_id, questions, answers, versions)
+        if rows:
+            await tx.executemany(_INSERT_ANSWER, rows)
+        await record_session_async(tx, session_id)
+    return session_id
+
+
+_ANSWERS_QUERY = '''
+    SELECT sa.session_id, sa.position, sa.selected_option_ids, sa.is_correct,
+           qv.question_key, qv.version, qv.category,
+           qv.question_text, qv.question_type, qv.options, qv.correct_answer
+    FROM session_answers sa
+    JOIN question_versions qv ON qv.content_hash = sa.content_hash
+'''
+
+
+def _answer_item(row):
+    options = load_json(row['options']) or []
+    selected = load_json(row['selected_option_ids']) or []
+    return {
+        'position': row['position'],
+        'question_key': row['question_key'],
+        'question_version': row['version'],
+        'category': row['category'],
+        'question': row['question_text'],
+        'type': row['question_type'],
+        'options': options,
+        'correct': load_json(row['correct_answer']) or [],
+        'selected_option_ids': selected,
+        'user_answer': [options[i] for i in selected if i < len(options)],
+        'is_correct': bool(row['is_correct'])
+    }
+
+
+def _blob_answers(row):
+    """Ответы сессии в старом формате (JSON-копии вопросов в test_sessions)"""
+    questions = load_json(row.get('questions_data')) or []
+    answers = load_json(row.get('answers_data')) or []
+    return [{
+        'position': position,
+        'question_key': None,
+        'question_version': None,
+        'category': question_category(question),
+        'question': question.get('question', ''),
+        'type': question.get('type', 'single_choice'),
+        'options': question.get('options', []),
+        'correct': question.get('correct', []),
+        'selected_option_ids': _option_ids(question, answer.get('user_answer', [])),
+        'user_answer': answer.get('user_answer', []),
+        'is_correct': bool(answer.get('is_correct', False))
+    } for position, (question, answer) in enumerate(zip(questions, answers))]
+
+
+def load_session(db, session_id):
+    """Сессия с ответами по id (None, если не найдена)"""
+    rows = db.execute_query("SELECT * FROM test_sessions WHERE id = ?", (session_id,))
+    if not rows:
+        return None
+    session = dict(rows[0])
+
+    if session.get('questions_data') is not None:
+        session['answers'] = _blob_answers(session)
+    else:
+        answers = db.execute_query(_ANSWERS_QUERY + " WHERE sa.session_id = ? ORDER BY sa.position", (session_id,))
+        session['answers'] = [_answer_item(row) for row in answers]
+    session.pop('questions_data', None)
+    session.pop('answers_data', None)
+    return session
+
+
+def iter_sessions(db, batch_size=500, start=None, end=None, replica=True):
+    """Все сессии с ответами в порядке id: слияние двух потоковых курсоров.
+
+    start/end - необязательный интервал [start, end) по completed_at.
+    """
+    period, params = '', None
+    if start is not None:
+        period, params = " WHERE completed_at >= ? AND completed_at < ?", (start, end)
+    answers_filter = f" WHERE sa.session_id IN (SELECT id FROM test_sessions{period})" if period else ''
+
+    answers = groupby(
+        db.iter_query(_ANSWERS_QUERY + answers_filter + " ORDER BY sa.session_id, sa.position", params,
+                      batch_size=batch_size, replica=replica),
+        key=lambda row: row['session_id']
+    )
+    current = next(answers, None)
+
+    for row in db.iter_query(f"SELECT * FROM test_sessions{period} ORDER BY id", params,
+                             batch_size=batch_size, replica=replica):
+        session = dict(row)
+        while current is not None and current[0] < session['id']:
+            current = next(answers, None)
+
+        if session.get('questions_data') is not None:
+            session['answers'] = _blob_answers(session)
+        elif current is not None and current[0] == session['id']:
+            session['answers'] = [_answer_item(a) for a in current[1]]
+            current = next(answers, None)
+        else:
+            session['answers'] = []
+        session.pop('questions_data', None)
+        session.pop('answers_data', None)
+        yield session
+
+
+def backfill_blob_sessions(db, batch_size=100):
+    """Перенос старых сессий из JSON-колонок в session_answers (идемпотентно, пакетами)"""
+    converted = 0
+    last_id = 0
+    while True:
+        rows = db.execute_query('''
+            SELECT id, questions_data, answers_data FROM test_sessions
+            WHERE id > ? AND questions_data IS NOT NULL
+            ORDER BY id LIMIT ?
+        ''', (last_id, batch_size))
+        if not rows:
+            break
+
+        with db.transaction():
+            for row in rows:
+                questions = load_json(row['questions_data']) or []
+                answers = load_json(row['answers_data']) or []
+                _write_answers(db, row['id'], questions, answers)
+                record_answers(db, row['id'])
+                db.execute_query(
+                    "UPDATE test_sessions SET questions_data = NULL, answers_data = NULL WHERE id = ?",
+                    (row['id'],)
+                )
+
+        converted += len(rows)
+        last_id = rows[-1]['id']
+        logger.info(f"Перенесено сессий: {converted}")
+
+    return converted
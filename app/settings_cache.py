@@ -0,0 +1,167 @@
+import os
+import time
+import select
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Канал PostgreSQL NOTIFY об изменении настроек
+SETTINGS_CHANNEL = 'settings_changed'
+
+_UPSERT_SETTING = '''
+    INSERT INTO settings (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+'''
+
+
+class SettingsCache:
+    """Кэш таблицы settings в процессе.
+
+    Значения живут не дольше ttl секунд. На PostgreSQL кэш сбрасывается
+    сразу по NOTIFY (поток LISTEN на отдельном соединении), на SQLite или
+    при потере LISTEN-соединения - не реже раза в poll_interval секунд по
+    счетчику settings_revision (одна строка по первичному ключу).
+    """
+
+    def __init__(self, db, ttl=None, poll_interval=None):
+        self._db = db
+        self.ttl = ttl if ttl is not None else float(os.environ.get("SETTINGS_CACHE_TTL", "60"))
+        self.poll_interval = (poll_interval if poll_interval is not None
+                              else float(os.environ.get("SETTINGS_POLL_INTERVAL", "1")))
+        self._lock = threading.Lock()
+        self._values = None
+        self._generation = 0
+        self._revision = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._listener_pid = None
+        self._listening = False
+        self._hits = 0
+        self._loads = 0
+        self._notifications = 0
+
+    # --- чтение ---
+
+    def get_all(self):
+        """Все настройки {key: value}"""
+        self._ensure_listener()
+        now = time.monotonic()
+        values = self._values
+        if values is not None and now - self._loaded_at < self.ttl:
+            if self._listening or now - self._checked_at < self.poll_interval:
+                self._hits += 1
+                return values
+            if self._current_revision() == self._revision:
+                self._checked_at = now
+                self._hits += 1
+                return values
+        return self._load()
+
+    def get(self, key, default=None):
+        return self.get_all().get(key, default)
+
+    def get_int(self, key, default=0):
+        try:
+            return int(self.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def _current_revision(self):
+        rows = self._db.execute_query("SELECT revision FROM settings_revision WHERE id = 1", prepare=True)
+        return rows[0]['revision'] if rows else None
+
+    def _load(self):
+        requested = time.monotonic()
+        with self._lock:
+            if self._values is not None and self._loaded_at >= requested:
+                # Другой поток уже перечитал настройки
+                return self._values
+            generation = self._generation
+            # Сначала счетчик, затем значения: изменение между ними вызовет еще одно чтение
+            revision = self._current_revision()
+            rows = self._db.execute_query("SELECT key, value FROM settings", prepare=True) or []
+            values = {row['key']: row['value'] for row in rows}
+            self._loads += 1
+            # NOTIFY во время чтения: значения могли устареть, не кэшируем
+            if generation == self._generation:
+                self._values = values
+                self._revision = revision
+                self._loaded_at = self._checked_at = time.monotonic()
+            return values
+
+    def invalidate(self):
+        self._generation += 1
+        self._values = None
+
+    # --- запись ---
+
+    def set_many(self, values):
+        """Сохранение настроек: счетчик ревизии и NOTIFY в той же транзакции"""
+        with self._db.transaction():
+            for key, value in values.items():
+                self._db.execute_query(_UPSERT_SETTING, (key, value))
+            self._db.execute_query("UPDATE settings_revision SET revision = revision + 1 WHERE id = 1")
+            if self._db.is_postgres:
+                self._db.execute_query("SELECT pg_notify(?, '')", (SETTINGS_CHANNEL,))
+        self.invalidate()
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    # --- LISTEN/NOTIFY ---
+
+    def _ensure_listener(self):
+        if not self._db.is_postgres or self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            # После fork поток родителя не существует: новый поток и сброс кэша
+            self._listener_pid = os.getpid()
+            self._listening = False
+            self.invalidate()
+            threading.Thread(target=self._listen, name='settings-listener', daemon=True).start()
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = self._db.dedicated_connection()
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {SETTINGS_CHANNEL}")
+                # Изменения, пропущенные без соединения
+                self.invalidate()
+                self._listening = True
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        # Проверка живости соединения
+                        cursor.execute("SELECT 1")
+                    else:
+                        conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self._notifications += 1
+                        self.invalidate()
+            except Exception as e:
+                logger.warning(f"LISTEN {SETTINGS_CHANNEL} недоступен, опрос settings_revision: {e}")
+            finally:
+                self._listening = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            time.sleep(5)
+
+    def stats(self):
+        return {
+            'listening': self._listening,
+            'revision': self._revision,
+            'hits': self._hits,
+            'loads': self._loads,
+            'notifications': self._notifications,
+            'ttl': self.ttl,
+            'poll_interval': self.poll_interval,
+        }
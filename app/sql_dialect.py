@@ -0,0 +1,134 @@
+import re
+import hashlib
+from functools import lru_cache
+
+SQLITE = 'sqlite'
+POSTGRES = 'postgresql'
+
+_INSERT_OR_IGNORE = re.compile(r'^(\s*)INSERT\s+OR\s+IGNORE\s+INTO\b', re.IGNORECASE)
+_SERIAL_PK = re.compile(r'\bSERIAL\s+PRIMARY\s+KEY\b', re.IGNORECASE)
+_WORD = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+# Изменяющие данные операторы: WITH с ними - запись (в том числе внутри CTE)
+_WRITE_WORDS = frozenset(('INSERT', 'UPDATE', 'DELETE', 'MERGE'))
+
+
+class TranslatedQuery:
+    """SQL, переведенный под диалект один раз для данного текста запроса"""
+
+    __slots__ = ('text', 'raw', 'dollar', 'param_count', 'is_select',
+                 'statement_name', 'prepare_text', 'execute_text')
+
+    def __init__(self, text, raw, dollar, param_count, is_select, statement_name):
+        # text - для cursor.execute с параметрами, raw - без параметров,
+        # dollar - с $1..$n для PREPARE на PostgreSQL
+        self.text = text
+        self.raw = raw
+        self.dollar = dollar
+        self.param_count = param_count
+        self.is_select = is_select
+        self.statement_name = statement_name
+        self.prepare_text = f"PREPARE {statement_name} AS {dollar}"
+        if param_count:
+            self.execute_text = f"EXECUTE {statement_name} ({', '.join(['%s'] * param_count)})"
+        else:
+            self.execute_text = f"EXECUTE {statement_name}"
+
+
+def _split(sql):
+    """Разбиение SQL на куски кода и литералов: [(is_code, text), ...]"""
+    parts = []
+    i = start = 0
+    n = len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch in ("'", '"'):
+            if i > start:
+                parts.append((True, sql[start:i]))
+            j = i + 1
+            while j < n:
+                if sql[j] == ch:
+                    if j + 1 < n and sql[j + 1] == ch:
+                        j += 2
+                        continue
+                    break
+                j += 1
+            parts.append((False, sql[i:j + 1]))
+            i = start = j + 1
+        elif ch == '-' and sql.startswith('--', i):
+            if i > start:
+                parts.append((True, sql[start:i]))
+            j = sql.find('\n', i)
+            j = n if j == -1 else j
+            parts.append((False, sql[i:j]))
+            i = start = j
+        else:
+            i += 1
+    if start < n:
+        parts.append((True, sql[start:]))
+    return parts
+
+
+def _is_select(sql):
+    """Только чтение: SELECT или WITH ... SELECT без INSERT/UPDATE/DELETE (литералы и комментарии не учитываются)"""
+    words = [word.upper() for word in _WORD.findall(' '.join(chunk for is_code, chunk in _split(sql) if is_code))]
+    if not words:
+        return False
+    if words[0] == 'SELECT':
+        return True
+    return words[0] == 'WITH' and not _WRITE_WORDS.intersection(words)
+
+
+def _rewrite_upsert(sql, dialect):
+    if dialect != POSTGRES or not _INSERT_OR_IGNORE.match(sql):
+        return sql
+    sql = _INSERT_OR_IGNORE.sub(r'\1INSERT INTO', sql, count=1).rstrip().rstrip(';').rstrip()
+    return sql + '\nON CONFLICT DO NOTHING'
+
+
+@lru_cache(maxsize=1024)
+def translate(sql, dialect):
+    """Перевод плейсхолдеров '?', INSERT OR IGNORE и SERIAL под диалект (с кешем)"""
+    sql = _rewrite_upsert(sql, dialect)
+
+    text, raw, dollar = [], [], []
+    count = 0
+    for is_code, chunk in _split(sql):
+        if not is_code:
+            text.append(chunk.replace('%', '%%') if dialect == POSTGRES else chunk)
+            raw.append(chunk)
+            dollar.append(chunk)
+            continue
+
+        if dialect == SQLITE:
+            chunk = _SERIAL_PK.sub('INTEGER PRIMARY KEY AUTOINCREMENT', chunk)
+            text.append(chunk)
+            raw.append(chunk)
+            dollar.append(chunk)
+            continue
+
+        pieces = chunk.split('?')
+        raw.append(chunk)
+        text_chunk = []
+        dollar_chunk = []
+        for k, piece in enumerate(pieces):
+            if k:
+                count += 1
+                text_chunk.append('%s')
+                dollar_chunk.append(f'${count}')
+            text_chunk.append(piece.replace('%', '%%'))
+            dollar_chunk.append(piece)
+        text.append(''.join(text_chunk))
+        dollar.append(''.join(dollar_chunk))
+
+    if dialect == SQLITE:
+        count = sum(chunk.count('?') for is_code, chunk in _split(sql) if is_code)
+
+    name = 'q_' + hashlib.blake2b(sql.encode('utf-8'), digest_size=8).hexdigest()
+    return TranslatedQuery(
+        text=''.join(text),
+        raw=''.join(raw),
+        dollar=''.join(dollar),
+        param_count=count,
+        is_select=_is_select(sql),
+        statement_name=name
+    )
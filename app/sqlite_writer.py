@@ -0,0 +1,111 @@
+import time
+import queue
+import logging
+import threading
+import contextvars
+
+logger = logging.getLogger(__name__)
+
+
+class _WriteJob:
+    __slots__ = ('fn', 'args', 'kwargs', 'context', 'done', 'result', 'error')
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        # Контекст автора: запросы задания учитываются в его query_stats
+        self.context = contextvars.copy_context()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SqliteWriter:
+    """Единственный поток записи в SQLite с групповым commit.
+
+    Задания (функции, работающие через Database) выполняются в потоке записи,
+    поэтому используют его соединение. Накопленные за linger секунд задания
+    (не больше max_batch) выполняются одной транзакцией BEGIN IMMEDIATE,
+    каждое в своем SAVEPOINT: ошибка задания возвращается только его автору.
+    Задание выполняется в контексте (contextvars) автора, поэтому его запросы
+    попадают в счетчик HTTP-запроса, поставившего задание.
+    """
+
+    def __init__(self, db, max_batch=64, linger=0.002):
+        self._db = db
+        self.max_batch = max_batch
+        self.linger = linger
+        self._queue = queue.Queue()
+        self._jobs = 0
+        self._batches = 0
+        self._largest_batch = 0
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def is_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, fn, *args, **kwargs):
+        """Выполнение fn(*args, **kwargs) в потоке записи с ожиданием результата"""
+        job = _WriteJob(fn, args, kwargs)
+        self._queue.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def stop(self):
+        """Остановка потока записи после уже поставленных заданий"""
+        self._queue.put(None)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch = [job]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._execute(batch)
+                    return
+                batch.append(job)
+            self._execute(batch)
+
+    def _execute(self, batch):
+        try:
+            with self._db.transaction(immediate=True):
+                for job in batch:
+                    try:
+                        with self._db.transaction():
+                            job.result = job.context.run(job.fn, *job.args, **job.kwargs)
+                    except Exception as e:
+                        job.error = e
+        except Exception as e:
+            logger.error(f"Ошибка группового commit ({len(batch)} заданий): {e}")
+            for job in batch:
+                if job.error is None:
+                    job.error = e
+        finally:
+            self._db.release_connection()
+            self._jobs += len(batch)
+            self._batches += 1
+            self._largest_batch = max(self._largest_batch, len(batch))
+            for job in batch:
+                job.done.set()
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'jobs': self._jobs,
+            'batches': self._batches,
+            'avg_batch': round(self._jobs / self._batches, 2) if self._batches else 0.0,
+            'largest_batch': self._largest_batch,
+        }
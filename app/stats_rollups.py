@@ -0,0 +1,258 @@
+import os
+import logging
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLES = ('stats_totals', 'stats_by_level', 'stats_by_day', 'stats_by_category')
+
+SESSION_COLUMNS = ('sessions', 'score_sum', 'percent_sum')
+CATEGORY_COLUMNS = ('answers', 'correct_answers')
+
+# Шарды строк агрегатов: сессия пишет в шард id % SHARDS (миграция 5), чтение суммирует.
+# Число можно менять без миграции - строки прежних шардов продолжают учитываться.
+SHARDS = max(1, int(os.environ.get("STATS_ROLLUP_SHARDS", "16")))
+
+# Ключ конфликта строки агрегата (у stats_totals номер шарда - id)
+_KEYS = {
+    'stats_totals': 'id',
+    'stats_by_level': 'level, shard',
+    'stats_by_day': 'day, shard',
+    'stats_by_category': 'category, shard',
+}
+
+
+def _increment(table, key, columns, source):
+    """INSERT ... ON CONFLICT: прибавление columns к строке агрегата.
+
+    key - вставляемые ключевые колонки (без shard - шард 0 по умолчанию).
+    Одинаковый текст для SQLite (>= 3.24) и PostgreSQL; у source вида
+    INSERT ... SELECT для SQLite обязателен WHERE.
+    """
+    updates = ',\n        '.join(f"{c} = {table}.{c} + excluded.{c}" for c in columns)
+    return f'''
+    INSERT INTO {table} ({key}, {', '.join(columns)})
+    {source}
+    ON CONFLICT ({_KEYS[table]}) DO UPDATE SET
+        {updates}
+    '''
+
+
+# Инкременты при сохранении сессии: по строке test_sessions и ее session_answers
+_SESSION_ROLLUPS = (
+    _increment('stats_totals', 'id', SESSION_COLUMNS,
+               f"SELECT id % {SHARDS}, 1, COALESCE(score, 0), COALESCE(percent, 0) FROM test_sessions WHERE id = ?"),
+    _increment('stats_by_level', 'level, shard', SESSION_COLUMNS,
+               f"SELECT COALESCE(level, ''), id % {SHARDS}, 1, COALESCE(score, 0), COALESCE(percent, 0) "
+               "FROM test_sessions WHERE id = ?"),
+    _increment('stats_by_day', 'day, shard', SESSION_COLUMNS,
+               f"SELECT DATE(completed_at), id % {SHARDS}, 1, COALESCE(score, 0), COALESCE(percent, 0) "
+               "FROM test_sessions WHERE id = ?"),
+)
+
+# Категория ответа - тема вопроса, сохраненная с его версией (компонент, тип проблемы
+# или category вопроса из БД); так учитываются и вопросы банка, которых нет в questions
+_ANSWER_CATEGORY = "COALESCE(qv.category, '')"
+_ANSWERS_SOURCE = "session_answers sa JOIN question_versions qv ON qv.content_hash = sa.content_hash"
+
+_ANSWERS_ROLLUP = _increment('stats_by_category', 'category, shard', CATEGORY_COLUMNS, f'''
+    SELECT {_ANSWER_CATEGORY}, sa.session_id % {SHARDS}, COUNT(*), SUM(CASE WHEN sa.is_correct THEN 1 ELSE 0 END)
+    FROM {_ANSWERS_SOURCE}
+    WHERE sa.session_id = ?
+    GROUP BY {_ANSWER_CATEGORY}, sa.session_id
+    ORDER BY 1
+''')
+
+# Прибавление готовых агрегатов (например, сохраненных вместе с архивом сессий)
+_ADD_TOTALS = _increment('stats_totals', 'id', SESSION_COLUMNS, "VALUES (0, ?, ?, ?)")
+_ADD_LEVEL = _increment('stats_by_level', 'level', SESSION_COLUMNS, "VALUES (?, ?, ?, ?)")
+_ADD_DAY = _increment('stats_by_day', 'day', SESSION_COLUMNS, "VALUES (?, ?, ?, ?)")
+_ADD_CATEGORY = _increment('stats_by_category', 'category', CATEGORY_COLUMNS, "VALUES (?, ?, ?)")
+
+_QUESTIONS_ROLLUP = '''
+    INSERT INTO stats_totals (id, questions) VALUES (0, ?)
+    ON CONFLICT (id) DO UPDATE SET questions = stats_totals.questions + excluded.questions
+'''
+
+# Полный пересчет с нуля
+_REBUILD = (
+    '''
+    INSERT INTO stats_totals (id, questions, sessions, score_sum, percent_sum)
+    SELECT 0, (SELECT COUNT(*) FROM questions), COUNT(*),
+           COALESCE(SUM(score), 0), COALESCE(SUM(percent), 0)
+    FROM test_sessions
+    ''',
+    '''
+    INSERT INTO stats_by_level (level, sessions, score_sum, percent_sum)
+    SELECT COALESCE(level, ''), COUNT(*), COALESCE(SUM(score), 0), COALESCE(SUM(percent), 0)
+    FROM test_sessions
+    GROUP BY COALESCE(level, '')
+    ''',
+    '''
+    INSERT INTO stats_by_day (day, sessions, score_sum, percent_sum)
+    SELECT DATE(completed_at), COUNT(*), COALESCE(SUM(score), 0), COALESCE(SUM(percent), 0)
+    FROM test_sessions
+    WHERE completed_at IS NOT NULL
+    GROUP BY DATE(completed_at)
+    ''',
+    f'''
+    INSERT INTO stats_by_category (category, answers, correct_answers)
+    SELECT {_ANSWER_CATEGORY}, COUNT(*), SUM(CASE WHEN sa.is_correct THEN 1 ELSE 0 END)
+    FROM {_ANSWERS_SOURCE}
+    GROUP BY {_ANSWER_CATEGORY}
+    ''',
+)
+
+
+def record_session(db, session_id):
+    """Учет сохраненной сессии в агрегатах (в транзакции сохранения)"""
+    for statement in _SESSION_ROLLUPS:
+        db.execute_query(statement, (session_id,), prepare=True)
+    record_answers(db, session_id)
+
+
+def record_answers(db, session_id):
+    """Учет ответов сессии по категориям (также при переносе старых сессий)"""
+    db.execute_query(_ANSWERS_ROLLUP, (session_id,), prepare=True)
+
+
+async def record_session_async(tx, session_id):
+    """record_session на транзакции AsyncDatabase"""
+    for statement in _SESSION_ROLLUPS + (_ANSWERS_ROLLUP,):
+        await tx.execute_query(statement, (session_id,))
+
+
+def record_questions(db, count):
+    """Учет добавленных в банк вопросов"""
+    if count:
+        db.execute_query(_QUESTIONS_ROLLUP, (count,))
+
+
+_PERIOD = "completed_at >= ? AND completed_at < ?"
+
+_PERIOD_QUERIES = {
+    'levels': (SESSION_COLUMNS, f'''
+        SELECT COALESCE(level, '') AS key, COUNT(*) AS sessions,
+               COALESCE(SUM(score), 0) AS score_sum, COALESCE(SUM(percent), 0) AS percent_sum
+        FROM test_sessions WHERE {_PERIOD}
+        GROUP BY COALESCE(level, '')
+    '''),
+    'days': (SESSION_COLUMNS, f'''
+        SELECT DATE(completed_at) AS key, COUNT(*) AS sessions,
+               COALESCE(SUM(score), 0) AS score_sum, COALESCE(SUM(percent), 0) AS percent_sum
+        FROM test_sessions WHERE {_PERIOD}
+        GROUP BY DATE(completed_at)
+    '''),
+    'categories': (CATEGORY_COLUMNS, f'''
+        SELECT {_ANSWER_CATEGORY} AS key, COUNT(*) AS answers,
+               SUM(CASE WHEN sa.is_correct THEN 1 ELSE 0 END) AS correct_answers
+        FROM {_ANSWERS_SOURCE}
+        WHERE sa.session_id IN (SELECT id FROM test_sessions WHERE {_PERIOD})
+        GROUP BY {_ANSWER_CATEGORY}
+    '''),
+}
+
+
+def _plain(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def period_aggregates(db, start, end):
+    """Агрегаты сессий за [start, end) в JSON-совместимом виде (сохраняются с архивом)"""
+    result = {}
+    for name, (columns, query) in _PERIOD_QUERIES.items():
+        rows = db.execute_query(query, (start, end)) or []
+        result[name] = [[str(row['key'])] + [_plain(row[c]) for c in columns] for row in rows]
+    return result
+
+
+def apply_aggregates(db, aggregates):
+    """Прибавление агрегатов period_aggregates к таблицам статистики"""
+    levels = aggregates.get('levels', [])
+    if levels:
+        db.execute_query(_ADD_TOTALS, (
+            sum(row[1] for row in levels),
+            sum(row[2] for row in levels),
+            round(sum(row[3] for row in levels), 2)
+        ))
+    for row in levels:
+        db.execute_query(_ADD_LEVEL, tuple(row))
+    for row in aggregates.get('days', []):
+        db.execute_query(_ADD_DAY, tuple(row))
+    for row in aggregates.get('categories', []):
+        db.execute_query(_ADD_CATEGORY, tuple(row))
+
+
+def rebuild_rollups(db, archived=()):
+    """Пересчет всех агрегатов по test_sessions, session_answers и questions.
+
+    archived - агрегаты сессий, уже перенесенных в архив (их строк в
+    test_sessions нет); см. session_archive.rebuild_stats.
+    """
+    with db.transaction():
+        for table in ROLLUP_TABLES:
+            db.execute_query(f"DELETE FROM {table}")
+        for statement in _REBUILD:
+            db.execute_query(statement)
+        for aggregates in archived:
+            apply_aggregates(db, aggregates)
+    logger.info("Агрегаты статистики пересчитаны")
+
+
+def _average(total, count):
+    return float(total) / count if count else 0.0
+
+
+def summary(db):
+    """Итоги для дашборда: вопросов, сессий, средний процент - сумма шардов stats_totals
+    (SUM по PostgreSQL возвращает NUMERIC - счетчики приводятся к int)"""
+    rows = db.execute_query(
+        "SELECT SUM(questions) AS questions, SUM(sessions) AS sessions, SUM(percent_sum) AS percent_sum "
+        "FROM stats_totals", replica=True
+    )
+    row = rows[0] if rows else None
+    if not row or row['sessions'] is None:
+        return {'total_questions': 0, 'total_sessions': 0, 'avg_score': 0.0}
+    return {
+        'total_questions': int(row['questions']),
+        'total_sessions': int(row['sessions']),
+        'avg_score': _average(row['percent_sum'], row['sessions'])
+    }
+
+
+def by_level(db):
+    rows = db.execute_query('''
+        SELECT level, SUM(sessions) AS sessions, SUM(score_sum) AS score_sum, SUM(percent_sum) AS percent_sum
+        FROM stats_by_level GROUP BY level ORDER BY level
+    ''', replica=True) or []
+    return [{
+        'level': row['level'],
+        'sessions': int(row['sessions']),
+        'avg_score': _average(row['score_sum'], row['sessions']),
+        'avg_percent': _average(row['percent_sum'], row['sessions'])
+    } for row in rows]
+
+
+def by_day(db, days=30):
+    """Последние days дней с сессиями (новые первыми)"""
+    rows = db.execute_query('''
+        SELECT day, SUM(sessions) AS sessions, SUM(percent_sum) AS percent_sum
+        FROM stats_by_day GROUP BY day ORDER BY day DESC LIMIT ?
+    ''', (days,), replica=True) or []
+    return [{
+        'day': str(row['day']),
+        'sessions': int(row['sessions']),
+        'avg_percent': _average(row['percent_sum'], row['sessions'])
+    } for row in rows]
+
+
+def by_category(db):
+    rows = db.execute_query('''
+        SELECT category, SUM(answers) AS answers, SUM(correct_answers) AS correct_answers
+        FROM stats_by_category GROUP BY category ORDER BY category
+    ''', replica=True) or []
+    return [{
+        'category': row['category'],
+        'answers': int(row['answers']),
+        'correct_rate': _average(row['correct_answers'] * 100, row['answers'])
+    } for row in rows]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк синхронного и асинхронного бэкендов БД на пути кандидата.
+
+Каждый "кандидат" выполняет то, что делает test_results: чтение настроек и
+сохранение сессии из 50 ответов (save_session / save_session_async).
+Синхронный бэкенд нагружается пулом потоков размером concurrency,
+асинхронный - concurrency корутинами в одном event loop.
+
+Запуск: DATABASE_URL=... python scripts/bench_async_backend.py [кандидатов] [concurrency]
+"""
+
+import os
+import sys
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from database import Database
+from async_database import AsyncDatabase
+from session_storage import save_session, save_session_async
+
+QUESTIONS = [{
+    'question': f'Бенчмарк: вопрос {i}?',
+    'type': 'single_choice',
+    'options': ['A', 'B', 'C', 'D'],
+    'correct': ['A'],
+    'level': 'L1'
+} for i in range(50)]
+
+ANSWERS = [{
+    'question_id': i,
+    'user_answer': ['A' if i % 3 else 'B'],
+    'correct_answer': ['A'],
+    'is_correct': bool(i % 3)
+} for i in range(50)]
+
+
+def run_sync(db, candidates, concurrency):
+    def candidate(n):
+        try:
+            db.execute_query("SELECT key, value FROM settings", prepare=True)
+            save_session(db, f'bench-{n}', 'Bench', QUESTIONS, ANSWERS, 33, 66.0, 'L1')
+        finally:
+            db.release_connection()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(candidate, range(candidates)))
+    return time.perf_counter() - started
+
+
+async def run_async(adb, candidates, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def candidate(n):
+        async with semaphore:
+            await adb.execute_query("SELECT key, value FROM settings")
+            await save_session_async(adb, f'bench-{n}', 'Bench', QUESTIONS, ANSWERS, 33, 66.0, 'L1')
+
+    started = time.perf_counter()
+    await asyncio.gather(*(candidate(n) for n in range(candidates)))
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    candidates = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    db = Database()
+    db.init_database()
+    adb = AsyncDatabase()
+    if not adb.available:
+        print("Асинхронный драйвер не установлен (pip install asyncpg aiosqlite)")
+        sys.exit(1)
+
+    # Прогрев: версии вопросов создаются один раз
+    save_session(db, 'bench-warmup', 'Bench', QUESTIONS, ANSWERS, 33, 66.0, 'L1')
+    db.release_connection()
+
+    elapsed = run_sync(db, candidates, concurrency)
+    print(f"sync:  {candidates} кандидатов, concurrency={concurrency}, пул={db.pool_size}: "
+          f"{elapsed:.2f} с, {candidates / elapsed:.1f} req/s")
+
+    async def main():
+        elapsed = await run_async(adb, candidates, concurrency)
+        print(f"async: {candidates} кандидатов, concurrency={concurrency}, пул={adb.pool_size}: "
+              f"{elapsed:.2f} с, {candidates / elapsed:.1f} req/s")
+        await adb.close()
+
+    asyncio.run(main())
+    db.close()
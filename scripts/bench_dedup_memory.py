@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Проверка памяти долгоживущего генератора: RSS не растет с числом выданных вопросов.
+
+Генератор с синтетической базой выдает пулы по round вопросов с разными seed
+(как повторные вызовы генерации из админки), пока не наберется total; все
+отпечатки попадают в generated_hashes. После каждого раунда печатается RSS
+процесса и состояние фильтра. Рост RSS между второй половиной раундов
+больше tolerance МБ - код возврата 1.
+Уменьшенная версия проверки входит в тесты: tests/test_dedup.py.
+
+Запуск: python scripts/bench_dedup_memory.py [всего] [в раунде] [tolerance МБ]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_parallel_generation import SyntheticGenerator
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    per_round = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    tolerance = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    generator = SyntheticGenerator(bank=False)
+    samples = []
+    generated = 0
+    started = time.perf_counter()
+    for seed in range(total // per_round):
+        pool = generator.generate_question_pool(per_round, seed=seed)
+        generated += len(pool)
+        del pool
+        samples.append(rss_mb())
+        print(f"{generated:>9} вопросов: RSS {samples[-1]:.1f} МБ, фильтр {generator.generated_hashes.stats()}")
+
+    print(f"{generated} вопросов за {time.perf_counter() - started:.0f} с")
+    tail = samples[len(samples) // 2:]
+    growth = max(tail) - min(tail)
+    print(f"Рост RSS во второй половине: {growth:.1f} МБ")
+    sys.exit(0 if growth <= tolerance else 1)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк параллельной генерации банка вопросов: 1..N процессов.
+
+Реального пространства генератора (сотни вопросов) для замера мало, поэтому
+используется синтетическая база знаний того же формата. Для каждого числа
+процессов генерируется пул с одним и тем же seed; отпечатки всех прогонов
+должны совпадать.
+
+Запуск: python scripts/bench_parallel_generation.py [вопросов] [макс. процессов] [seed]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from generators import KnowledgeBase, QuestionGenerator, load_knowledge_base, question_fingerprint
+
+COMPONENTS = 200
+FUNCTIONS = [
+    "обрабатывает и проверяет очередь {name}",
+    "проверяет хранение и очередь {name}",
+    "обрабатывает авторизация и балансировка {name}",
+]
+
+
+class SyntheticGenerator(QuestionGenerator):
+    """Генератор с синтетической базой: ~300 тыс. уникальных вопросов"""
+
+    def __init__(self, bank=None):
+        data = {
+            'components': {
+                f'service-{i}': {'functions': [f.format(name=f'service-{i}') for f in FUNCTIONS]}
+                for i in range(COMPONENTS)
+            },
+            'troubleshooting': load_knowledge_base().troubleshooting
+        }
+        super().__init__(bank, knowledge=KnowledgeBase(data, 'synthetic'))
+
+
+def run(generator, count, workers, seed):
+    generator.generated_hashes.clear()
+    started = time.perf_counter()
+    questions = generator.generate_question_pool(count, seed=seed, workers=workers)
+    elapsed = time.perf_counter() - started
+    return elapsed, [question_fingerprint(q['question'], q['correct']) for q in questions], questions
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 42
+
+    generator = SyntheticGenerator(bank=False)
+    print(f"Пространство: {generator.enumerator.size} вопросов, CPU: {os.cpu_count()}")
+
+    baseline = reference = None
+    for workers in sorted({1, 2, 4, 8, max_workers}):
+        if workers > max_workers:
+            continue
+        elapsed, fingerprints, questions = run(generator, count, workers, seed)
+        if reference is None:
+            baseline, reference = elapsed, (fingerprints, questions)
+        identical = fingerprints == reference[0] and questions == reference[1]
+        print(f"workers={workers}: {len(fingerprints)} вопросов за {elapsed:.2f} с, "
+              f"ускорение x{baseline / elapsed:.2f}, результат {'совпадает' if identical else 'ОТЛИЧАЕТСЯ'}")
+        if not identical:
+            sys.exit(1)
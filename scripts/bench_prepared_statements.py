@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк серверных prepared statements на горячих запросах.
+
+Сравнивает время планирования (Planning Time из EXPLAIN ANALYZE) для обычного
+выполнения и EXECUTE подготовленного запроса, а также общее время N вызовов
+через Database.execute_query с prepare=False/True.
+
+Запуск: DATABASE_URL=postgresql://... python scripts/bench_prepared_statements.py [N]
+"""
+
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from database import Database
+from sql_dialect import translate
+
+# Горячие запросы одного прохождения теста: (SQL, параметры, вызовов на запрос)
+HOT_QUERIES = [
+    ("SELECT key, value FROM settings", None, 1),
+    ("SELECT * FROM questions WHERE category = ? AND level = ? ORDER BY id LIMIT ?",
+     ('generated', 'L1', 50), 1),
+]
+
+
+def planning_time(cursor, sql, params=None):
+    cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+    plan = cursor.fetchone()
+    plan = plan['QUERY PLAN'] if isinstance(plan, dict) else plan[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Planning Time']
+
+
+def bench_planning(db, rounds):
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    total_saved = 0.0
+    try:
+        for sql, params, per_request in HOT_QUERIES:
+            q = translate(sql, db.dialect)
+            plain = [planning_time(cursor, q.text if params else q.raw, params) for _ in range(rounds)]
+
+            cursor.execute("DEALLOCATE ALL")
+            cursor.execute(q.prepare_text)
+            prepared = [planning_time(cursor, q.execute_text, params) for _ in range(rounds)]
+            cursor.execute("DEALLOCATE ALL")
+
+            plain_avg = sum(plain) / rounds
+            prepared_avg = sum(prepared) / rounds
+            saved = (plain_avg - prepared_avg) * per_request
+            total_saved += saved
+            print(f"{q.statement_name}: planning {plain_avg:.4f} ms -> {prepared_avg:.4f} ms "
+                  f"(экономия {saved:.4f} ms на запрос)")
+    finally:
+        cursor.close()
+        conn.rollback()
+        db.release_connection()
+    print(f"Итого экономия на планировании: {total_saved:.4f} ms на HTTP-запрос")
+
+
+def bench_roundtrip(db, rounds):
+    for prepare in (False, True):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for sql, params, _per_request in HOT_QUERIES:
+                db.execute_query(sql, params, prepare=prepare)
+        elapsed = time.perf_counter() - started
+        db.release_connection()
+        print(f"prepare={prepare}: {rounds} итераций за {elapsed:.3f} с "
+              f"({elapsed / rounds * 1000:.3f} ms на итерацию)")
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    db = Database()
+    if not db.is_postgres:
+        print("Бенчмарк требует PostgreSQL (DATABASE_URL=postgresql://...)")
+        sys.exit(1)
+    db.init_database()
+    bench_planning(db, min(rounds, 200))
+    bench_roundtrip(db, rounds)
+    db.close()
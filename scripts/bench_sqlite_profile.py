@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк профилей SQLite: кандидатов в секунду при сохранении результатов.
+
+Несколько процессов (как воркеры gunicorn) с несколькими потоками каждый
+сохраняют сессии из 50 ответов в один файл БД. Сравниваются профиль
+default и production (WAL, synchronous=NORMAL, busy timeout, поток записи
+с групповым commit); считаются также ошибки "database is locked".
+
+Запуск: python scripts/bench_sqlite_profile.py [кандидатов] [процессов] [потоков]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+QUESTIONS = [{
+    'question': f'Бенчмарк: вопрос {i}?',
+    'type': 'single_choice',
+    'options': ['A', 'B', 'C', 'D'],
+    'correct': ['A'],
+    'level': 'L1'
+} for i in range(50)]
+
+ANSWERS = [{
+    'question_id': i,
+    'user_answer': ['A'],
+    'correct_answer': ['A'],
+    'is_correct': True
+} for i in range(50)]
+
+
+def worker(args):
+    db_url, mode, candidates, threads = args
+    os.environ["DATABASE_URL"] = db_url
+    os.environ["DB_SQLITE_MODE"] = mode
+    from database import Database
+    from session_storage import save_session
+
+    db = Database()
+    errors = 0
+
+    def candidate(n):
+        nonlocal errors
+        try:
+            save_session(db, f'bench-{n}', 'Bench', QUESTIONS, ANSWERS, 50, 100.0, 'L2')
+        except Exception:
+            errors += 1
+        finally:
+            db.release_connection()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(candidate, range(candidates)))
+    db.close()
+    return errors
+
+
+def run(mode, candidates, processes, threads):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    db_url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = db_url
+    os.environ["DB_SQLITE_MODE"] = mode
+
+    from database import Database
+    from session_storage import save_session
+    db = Database()
+    db.init_database()
+    save_session(db, 'bench-warmup', 'Bench', QUESTIONS, ANSWERS, 50, 100.0, 'L2')
+    db.close()
+
+    per_process = candidates // processes
+    started = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(processes) as pool:
+        errors = sum(pool.map(worker, [(db_url, mode, per_process, threads)] * processes))
+    elapsed = time.perf_counter() - started
+
+    saved = per_process * processes - errors
+    print(f"{mode:>10}: {saved} сохранено, {errors} ошибок за {elapsed:.2f} с - "
+          f"{saved / elapsed:.1f} кандидатов/с")
+
+
+if __name__ == "__main__":
+    candidates = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    for mode in ('default', 'production'):
+        run(mode, candidates, processes, threads)
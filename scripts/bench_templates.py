@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк движка шаблонов: пропускная способность рендера и размер пространства.
+
+Сравнивает прежний путь (поиск слов по словарю, str.replace, str.format) с
+скомпилированным (render_batch по кортежам номеров) на всех поверхностных
+вариантах вопросов "какой компонент ..." и считает достижимое пространство:
+по формуле (TemplateEngine.count) и прямым перечислением (variants).
+
+Запуск: python scripts/bench_templates.py [повторов]
+"""
+
+import os
+import sys
+import time
+import itertools
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from generators import QuestionGenerator
+
+
+def legacy_render(generator, template, text, digits):
+    slots = [original for original in generator.variations if original in text]
+    result = text
+    for original, choice in zip(slots, digits[1:]):
+        result = result.replace(original, generator.variations[original][choice], 1)
+    return generator.templates['component_function'][digits[0]].format(function=result)
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    generator = QuestionGenerator(bank=False)
+    engine = generator.engine
+    template = 'component_function'
+    functions = [f for data in generator.components_data.values() for f in data['functions']]
+    batches = []
+    for function in functions:
+        radices = [len(engine.templates[template])] + engine.compile_text(function).radices
+        batches.append((function, list(itertools.product(*(range(r) for r in radices)))))
+    total = sum(len(batch) for _, batch in batches)
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        legacy = [legacy_render(generator, template, f, d) for f, batch in batches for d in batch]
+    legacy_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        compiled = [text for f, batch in batches for text in engine.render_batch(template, f, batch)]
+    compiled_time = time.perf_counter() - started
+
+    if compiled != legacy:
+        print("Результаты рендера различаются")
+        sys.exit(1)
+
+    print(f"Вариантов {template}: {total}")
+    print(f"str.replace + str.format: {total * repeats / legacy_time:,.0f} вопросов/с")
+    print(f"render_batch:             {total * repeats / compiled_time:,.0f} вопросов/с "
+          f"(x{legacy_time / compiled_time:.1f})")
+
+    counted = sum(engine.count(template, f) for f in functions)
+    enumerated = sum(1 for f in functions for _ in engine.variants(template, 'function', f))
+    print(f"Пространство {template}: {counted} по формуле, {enumerated} перечислением")
+    print(f"Пространство генератора: {generator.enumerator.size} уникальных вопросов")
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+# Модули приложения импортируются из app/, как при запуске из этого каталога
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from generators import QuestionBank, QuestionGenerator, compile_bank  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def generator():
+    """Генератор на реальной базе знаний (quiz_data.json), без банка"""
+    return QuestionGenerator(bank=False)
+
+
+@pytest.fixture(scope='session')
+def real_bank(generator, tmp_path_factory):
+    """Банк всего пространства вопросов реальной базы знаний с кластерами перефразировок"""
+    path = str(tmp_path_factory.mktemp('bank') / 'question_bank.bin')
+    compile_bank(generator.generate_question_pool(generator.enumerator.size, seed=1), path,
+                 clusters=generator.near_duplicates)
+    return QuestionBank(path)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Чистая SQLite с примененными миграциями (Database требует psycopg2 даже для SQLite)"""
+    pytest.importorskip('psycopg2')
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'quiz.db'}")
+    from database import Database
+    database = Database()
+    assert database.init_database()
+    yield database
+    database.close()
@@ -0,0 +1,53 @@
+import time
+
+from bank_builder import build_question_bank, read_build_meta, schedule_refresh
+from generated_questions import save_generated_questions
+from generators import QuestionGenerator, ReloadableBank, blueprint_sampler, question_fingerprint
+
+ADMIN_QUESTION = {
+    'question': 'Какой порт по умолчанию слушает сервис очередей?',
+    'type': 'single_choice',
+    'options': ['5672', '80', '22', '3306'],
+    'correct': ['5672'],
+    'component': 'queue-broker',
+    'level': 'L2'
+}
+
+
+def fingerprints(bank):
+    return {question_fingerprint(q['question'], q['correct']) for q in (bank[i] for i in range(len(bank)))}
+
+
+def test_admin_question_is_sampleable_after_reload(db, tmp_path):
+    path = str(tmp_path / 'question_bank.bin')
+    compiled = build_question_bank(db, 60, path, seed=5)
+    assert read_build_meta(path) == {'count': 60, 'seed': 5}
+    pool = ReloadableBank(path, check_interval=0)
+    version, bank = pool.snapshot()
+    assert len(bank) == compiled
+    wanted = question_fingerprint(ADMIN_QUESTION['question'], ADMIN_QUESTION['correct'])
+    assert wanted not in fingerprints(bank)
+
+    # Путь /admin/questions/generate: вставка в БД и фоновая пересборка банка
+    assert save_generated_questions(db, [ADMIN_QUESTION])['inserted'] == 1
+    assert schedule_refresh(db, path)
+    deadline = time.monotonic() + 10
+    while pool.snapshot()[0] == version and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    # Тот же seed: сгенерированная часть банка не меняется, добавлен вопрос из БД
+    version, bank = pool.snapshot()
+    assert len(bank) == compiled + 1
+    assert fingerprints(bank) >= {wanted}
+    sampled = blueprint_sampler(bank, {'strata': [{'share': 1}]}, len(bank)).sample()
+    admin = [q for q in sampled if question_fingerprint(q['question'], q['correct']) == wanted]
+    assert admin and admin[0]['component'] == 'queue-broker'
+
+
+def test_generated_questions_saved_in_db_are_banked_once(db, tmp_path):
+    save_generated_questions(db, QuestionGenerator(bank=False).iter_questions(40, seed=5))
+    path = str(tmp_path / 'question_bank.bin')
+    compiled = build_question_bank(db, 60, path, seed=5)
+
+    bank = ReloadableBank(path).snapshot()[1]
+    assert len(fingerprints(bank)) == compiled == len(bank)
@@ -0,0 +1,49 @@
+import gc
+import random
+import weakref
+from collections import Counter
+
+import pytest
+
+from generators import BlueprintError, QuestionBank, QuestionGenerator, blueprint_sampler, question_fingerprint
+
+QUESTIONS_PER_TEST = 50
+
+
+def fingerprints(questions):
+    return {question_fingerprint(q['question'], q['correct']) for q in questions}
+
+
+def test_default_blueprint_serves_full_test(real_bank):
+    questions = blueprint_sampler(real_bank, None, QUESTIONS_PER_TEST).sample(random.Random(3))
+
+    assert len(questions) == QUESTIONS_PER_TEST
+    assert len(fingerprints(questions)) == QUESTIONS_PER_TEST
+    assert Counter(q['type'] for q in questions) == {'multiple_choice': 10, 'single_choice': 40}
+    # Все факты банка в тесте, прежде чем повторяется любой из них
+    per_cluster = Counter(q['cluster'] for q in questions if q['type'] == 'single_choice')
+    assert max(per_cluster.values()) - min(per_cluster.values()) <= 1
+
+
+def test_infeasible_blueprint_fails_loudly(real_bank):
+    blueprint = {'strata': [{'type': 'multiple_choice', 'count': 30}, {'share': 1}]}
+    with pytest.raises(BlueprintError, match='невыполним'):
+        blueprint_sampler(real_bank, blueprint, QUESTIONS_PER_TEST)
+
+
+def test_generator_without_bank_serves_full_test():
+    generator = QuestionGenerator(bank=False)
+    questions = generator.get_test_questions(QUESTIONS_PER_TEST)
+
+    assert len(questions) == QUESTIONS_PER_TEST
+    assert len(fingerprints(questions)) == QUESTIONS_PER_TEST
+
+
+def test_sampler_cache_releases_retired_bank(real_bank):
+    bank = QuestionBank(real_bank.path)
+    assert blueprint_sampler(bank, None, QUESTIONS_PER_TEST) is blueprint_sampler(bank, None, QUESTIONS_PER_TEST)
+    retired = weakref.ref(bank)
+
+    del bank
+    gc.collect()
+    assert retired() is None
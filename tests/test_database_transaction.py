@@ -0,0 +1,39 @@
+import pytest
+
+
+@pytest.fixture
+def notes(db):
+    db.execute_query("CREATE TABLE notes (id SERIAL PRIMARY KEY, body TEXT NOT NULL)")
+    return db
+
+
+def bodies(db):
+    return [row['body'] for row in db.execute_query("SELECT body FROM notes ORDER BY id")]
+
+
+def test_nested_rollback_keeps_outer_work(notes):
+    with notes.transaction():
+        notes.execute_query("INSERT INTO notes (body) VALUES (?)", ('outer',))
+        with pytest.raises(ValueError):
+            with notes.transaction():
+                notes.execute_query("INSERT INTO notes (body) VALUES (?)", ('inner',))
+                raise ValueError('откат savepoint')
+        with notes.transaction():
+            notes.execute_query("INSERT INTO notes (body) VALUES (?)", ('after',))
+
+    assert bodies(notes) == ['outer', 'after']
+
+
+def test_outer_exception_rolls_back_everything(notes):
+    with pytest.raises(RuntimeError):
+        with notes.transaction():
+            notes.execute_query("INSERT INTO notes (body) VALUES (?)", ('outer',))
+            with notes.transaction():
+                notes.execute_query("INSERT INTO notes (body) VALUES (?)", ('inner',))
+            raise RuntimeError('откат всей транзакции')
+
+    assert bodies(notes) == []
+    # После отката соединение снова пригодно: следующая транзакция фиксируется
+    with notes.transaction():
+        notes.execute_query("INSERT INTO notes (body) VALUES (?)", ('next',))
+    assert bodies(notes) == ['next']
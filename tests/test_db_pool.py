@@ -0,0 +1,106 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+def ping(conn):
+    conn.execute("SELECT 1").fetchall()
+
+
+def is_open(conn):
+    try:
+        ping(conn)
+        return True
+    except sqlite3.ProgrammingError:
+        return False
+
+
+def make_pool(tmp_path, **kwargs):
+    path = str(tmp_path / 'pool.db')
+    kwargs.setdefault('timeout', 1.0)
+    return ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False), ping=ping, **kwargs)
+
+
+def test_released_connection_is_reused(tmp_path):
+    pool = make_pool(tmp_path, max_size=2)
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+
+    assert second is first
+    stats = pool.stats()
+    assert (stats['created'], stats['checkouts'], stats['in_use'], stats['size']) == (1, 2, 1, 1)
+
+
+def test_exhausted_pool_times_out_then_serves_released_connection(tmp_path):
+    pool = make_pool(tmp_path, max_size=1, timeout=0.05)
+    entry = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+
+    pool.timeout = 5.0
+    releaser = threading.Timer(0.05, pool.release, (entry,))
+    releaser.start()
+    started = time.monotonic()
+    assert pool.acquire() is entry
+    assert time.monotonic() - started < 2
+    releaser.join()
+
+
+def test_idle_connection_past_max_idle_is_replaced(tmp_path):
+    pool = make_pool(tmp_path, max_idle=1.0)
+    entry = pool.acquire()
+    pool.release(entry)
+    entry.last_used -= 5
+
+    fresh = pool.acquire()
+    assert fresh is not entry
+    assert not is_open(entry.conn)
+    assert pool.stats()['recycled'] == 1 and pool.stats()['size'] == 1
+
+
+def test_connection_past_max_lifetime_is_closed_on_release(tmp_path):
+    pool = make_pool(tmp_path, max_lifetime=1.0)
+    entry = pool.acquire()
+    entry.created_at -= 5
+    pool.release(entry)
+
+    assert not is_open(entry.conn)
+    assert pool.stats()['idle'] == 0 and pool.stats()['size'] == 0
+
+
+def test_broken_idle_connection_fails_ping_and_is_replaced(tmp_path):
+    pool = make_pool(tmp_path, ping_interval=0.0)
+    entry = pool.acquire()
+    pool.release(entry)
+    entry.conn.close()
+
+    fresh = pool.acquire()
+    assert fresh is not entry and is_open(fresh.conn)
+    stats = pool.stats()
+    assert (stats['failed_pings'], stats['size'], stats['in_use']) == (1, 1, 1)
+
+
+def test_discarded_connection_frees_its_slot(tmp_path):
+    pool = make_pool(tmp_path, max_size=1, timeout=0.05)
+    entry = pool.acquire()
+    pool.release(entry, discard=True)
+
+    assert not is_open(entry.conn)
+    assert pool.acquire() is not entry
+
+
+def test_closed_pool_closes_idle_connections_and_refuses_checkout(tmp_path):
+    pool = make_pool(tmp_path)
+    entry = pool.acquire()
+    pool.release(entry)
+    pool.close()
+
+    assert not is_open(entry.conn)
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
@@ -0,0 +1,52 @@
+import tracemalloc
+
+from generators import RotatingBloomFilter
+from test_question_generator import fingerprints, synthetic_generator
+
+
+def test_filter_memory_does_not_grow_with_issued_questions():
+    hashes = RotatingBloomFilter(max_bytes=8 * 1024, error_rate=0.01)
+    traced = []
+    tracemalloc.start()
+    try:
+        for round_no in range(6):
+            for i in range(hashes.capacity):
+                hashes.add(f"{round_no}:{i}")
+            traced.append(tracemalloc.get_traced_memory()[0])
+    finally:
+        tracemalloc.stop()
+
+    assert hashes.rotations == 5
+    assert len(hashes) <= 2 * hashes.capacity
+    # Первые раунды заменяют фильтры, созданные до начала трассировки
+    steady = traced[2:]
+    assert max(steady) - min(steady) < 1024
+    assert max(steady) < 8 * 1024 + 4 * 1024
+
+
+def test_generator_memory_is_flat_across_calls(monkeypatch):
+    monkeypatch.setenv('GENERATED_HASHES_MAX_BYTES', str(4 * 1024))
+    generator = synthetic_generator(components=40)
+    traced = []
+    tracemalloc.start()
+    try:
+        for seed in range(6):
+            generator.generate_question_pool(1000, seed=seed)
+            traced.append(tracemalloc.get_traced_memory()[0])
+    finally:
+        tracemalloc.stop()
+
+    assert len(generator.generated_hashes) <= 2 * generator.generated_hashes.capacity
+    # 6000 отпечатков строками заняли бы больше 500 КБ
+    steady = traced[2:]
+    assert max(steady) - min(steady) < 64 * 1024
+
+
+def test_saturated_filter_does_not_shrink_a_fresh_pool(monkeypatch):
+    # Фильтр на ~50 отпечатков: ложные "уже выдан" почти наверняка
+    monkeypatch.setenv('GENERATED_HASHES_MAX_BYTES', '64')
+    generator = synthetic_generator()
+    pool = generator.generate_question_pool(3000, seed=1)
+
+    assert len(pool) == 3000
+    assert len(set(fingerprints(pool))) == 3000
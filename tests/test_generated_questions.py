@@ -0,0 +1,18 @@
+from generated_questions import save_generated_questions
+from generators import QuestionGenerator
+
+
+def question_count(db):
+    return db.execute_query("SELECT COUNT(*) AS n FROM questions")[0]['n']
+
+
+def test_same_seed_inserts_nothing_new(db):
+    first = save_generated_questions(db, QuestionGenerator(bank=False).iter_questions(300, seed=7))
+    assert first['inserted'] == 300
+    assert question_count(db) == 300
+
+    # Другой процесс (свой фильтр выданных) с тем же seed: дубликаты отклоняет индекс отпечатков
+    again = save_generated_questions(db, QuestionGenerator(bank=False).iter_questions(300, seed=7))
+    assert again['inserted'] == 0
+    assert again['skipped'] == 300
+    assert question_count(db) == 300
@@ -0,0 +1,45 @@
+import random
+from collections import Counter
+
+from generators import QuestionGenerator, question_fingerprint, spread_over_clusters
+
+QUESTIONS_PER_TEST = 50
+
+
+def test_spread_prefers_distinct_clusters():
+    questions = [{'id': i, 'cluster': i % 3} for i in range(9)]
+    picked = spread_over_clusters(questions, 5)
+    assert [q['id'] for q in picked] == [0, 1, 2, 3, 4]
+    assert [q['id'] for q in spread_over_clusters(questions, 2)] == [0, 1]
+
+
+def test_spread_falls_back_to_any_unused_question():
+    questions = [{'id': i, 'cluster': 0 if i < 6 else 1} for i in range(8)]
+    picked = spread_over_clusters(questions, 7)
+    assert len(picked) == 7
+    assert len({q['id'] for q in picked}) == 7
+
+
+def test_real_knowledge_base_fills_full_test(real_bank):
+    clusters_in_bank = {attributes['cluster'] for _, attributes in real_bank.attributes()}
+    assert len(clusters_in_bank) < QUESTIONS_PER_TEST
+
+    picked = real_bank.sample_clusters(QUESTIONS_PER_TEST, random.Random(7))
+
+    assert len(picked) == QUESTIONS_PER_TEST
+    assert len({question_fingerprint(q['question'], q['correct']) for q in picked}) == QUESTIONS_PER_TEST
+    # Все факты представлены, перефразировки распределены равномерно
+    per_cluster = Counter(q['cluster'] for q in picked)
+    assert set(per_cluster) == clusters_in_bank
+    assert max(per_cluster.values()) - min(per_cluster.values()) <= 1
+
+
+def test_reset_starts_empty_index():
+    generator = QuestionGenerator(bank=False)
+    for question in generator.generate_question_pool(20, seed=1):
+        generator.near_duplicates.assign(question)
+    assert generator.near_duplicates.clusters > 0
+
+    index = generator.reset_near_duplicates()
+    assert index is generator.near_duplicates
+    assert index.clusters == 0
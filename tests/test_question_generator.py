@@ -0,0 +1,48 @@
+from generators import KnowledgeBase, QuestionGenerator, load_knowledge_base, question_fingerprint
+
+FUNCTIONS = [
+    "обрабатывает и проверяет очередь {name}",
+    "проверяет хранение и очередь {name}",
+]
+
+
+def synthetic_generator(components=10):
+    """Генератор с синтетической базой знаний: пространство больше одного шарда"""
+    data = {
+        'components': {
+            f'service-{i}': {'functions': [f.format(name=f'service-{i}') for f in FUNCTIONS]}
+            for i in range(components)
+        },
+        'troubleshooting': load_knowledge_base().troubleshooting
+    }
+    return QuestionGenerator(bank=False, knowledge=KnowledgeBase(data, 'synthetic'))
+
+
+def fingerprints(questions):
+    return [question_fingerprint(q['question'], q['correct']) for q in questions]
+
+
+def test_second_call_never_repeats_issued_questions():
+    generator = QuestionGenerator(bank=False)
+    first = fingerprints(generator.generate_question_pool(200, seed=1))
+    second = fingerprints(generator.generate_question_pool(200, seed=2))
+    streamed = fingerprints(generator.iter_questions(200, seed=3))
+
+    assert first and second and streamed
+    # Фильтр Блума не дает ложных "не выдан": пересечений нет совсем
+    assert not set(first) & set(second)
+    assert not (set(first) | set(second)) & set(streamed)
+    assert len(set(first + second + streamed)) == len(first) + len(second) + len(streamed)
+
+
+def test_stream_matches_pool_for_same_seed():
+    pool = synthetic_generator().generate_question_pool(2500, seed=5)
+    streamed = list(synthetic_generator().iter_questions(2500, seed=5))
+    assert fingerprints(streamed) == fingerprints(pool)
+
+
+def test_stream_resumes_from_checkpoint_position():
+    full = list(synthetic_generator().iter_questions(2500, seed=9, positions=True))
+    checkpoint = full[1200][0]
+    resumed = list(synthetic_generator().iter_questions(2500, seed=9, start=checkpoint, positions=True))
+    assert resumed == full[1200:]
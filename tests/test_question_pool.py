@@ -0,0 +1,34 @@
+import os
+import time
+
+from generators import QuestionGenerator, ReloadableBank, compile_bank
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_bank_loads_on_first_snapshot_and_reloads_in_background(tmp_path):
+    generator = QuestionGenerator(bank=False)
+    path = str(tmp_path / 'question_bank.bin')
+    compile_bank(generator.generate_question_pool(50, seed=1), path)
+    prepared = []
+    pool = ReloadableBank(path, check_interval=0, prepare=prepared.append)
+
+    # Конструктор файл не открывает; первая загрузка - без прогрева
+    assert pool.version is None
+    version, bank = pool.snapshot()
+    assert version is not None and len(bank) == 50
+    assert prepared == []
+
+    # Новая сборка прогревается и подменяется в фоне, взятый snapshot остается рабочим
+    count = compile_bank(generator.generate_question_pool(80, seed=2), path + '.new')
+    os.replace(path + '.new', path)
+    assert wait_for(lambda: pool.snapshot()[0] != version)
+    assert len(pool.snapshot()[1]) == count
+    assert [len(b) for b in prepared] == [count]
+    assert pool.reloads == 1
+    assert bank[0]['question']
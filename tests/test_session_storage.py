@@ -0,0 +1,32 @@
+import random
+
+from generators import question_category, question_fingerprint
+from session_storage import load_session, save_session
+
+
+def answered(questions):
+    return [{'user_answer': q['correct'], 'is_correct': True} for q in questions]
+
+
+def test_saved_answers_keep_question_identity(db, real_bank):
+    questions = real_bank.sample(5, random.Random(1))
+    session_id = save_session(db, 'user@example.com', 'User', questions, answered(questions), 5, 100.0, 'L1')
+
+    session = load_session(db, session_id)
+    assert [a['question'] for a in session['answers']] == [q['question'] for q in questions]
+    for answer, question in zip(session['answers'], questions):
+        assert answer['question_key'] == question_fingerprint(question['question'], question['correct'])
+        assert answer['question_version'] == 1
+        assert answer['category'] == question_category(question) != ''
+        assert answer['user_answer'] == question['correct']
+
+
+def test_changed_options_make_next_version(db, real_bank):
+    question = real_bank[0]
+    edited = dict(question, options=list(reversed(question['options'])))
+    first = save_session(db, 'a', 'A', [question], answered([question]), 1, 100.0, 'L1')
+    second = save_session(db, 'b', 'B', [edited, question], answered([edited, question]), 2, 100.0, 'L1')
+
+    versions = [(a['question_key'], a['question_version']) for a in load_session(db, second)['answers']]
+    key = load_session(db, first)['answers'][0]['question_key']
+    assert versions == [(key, 2), (key, 1)]
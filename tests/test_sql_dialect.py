@@ -0,0 +1,70 @@
+import pytest
+
+from sql_dialect import POSTGRES, SQLITE, translate
+
+PLACEHOLDERS = [
+    # sql, text (PostgreSQL), dollar, число параметров
+    ("SELECT * FROM t WHERE a = ? AND b = ?",
+     "SELECT * FROM t WHERE a = %s AND b = %s", "SELECT * FROM t WHERE a = $1 AND b = $2", 2),
+    ("SELECT '?' AS q FROM t WHERE b = ?",
+     "SELECT '?' AS q FROM t WHERE b = %s", "SELECT '?' AS q FROM t WHERE b = $1", 1),
+    ("SELECT 'it''s ?' FROM t WHERE a = ?",
+     "SELECT 'it''s ?' FROM t WHERE a = %s", "SELECT 'it''s ?' FROM t WHERE a = $1", 1),
+    ('SELECT "col?" FROM t WHERE a = ?',
+     'SELECT "col?" FROM t WHERE a = %s', 'SELECT "col?" FROM t WHERE a = $1', 1),
+    ("SELECT 1 -- why?\nFROM t WHERE a = ?",
+     "SELECT 1 -- why?\nFROM t WHERE a = %s", "SELECT 1 -- why?\nFROM t WHERE a = $1", 1),
+    ("SELECT * FROM t WHERE a LIKE 'x%' AND b % 2 = ?",
+     "SELECT * FROM t WHERE a LIKE 'x%%' AND b %% 2 = %s", "SELECT * FROM t WHERE a LIKE 'x%' AND b % 2 = $1", 1),
+    ("SELECT 1", "SELECT 1", "SELECT 1", 0),
+]
+
+
+@pytest.mark.parametrize('sql, text, dollar, count', PLACEHOLDERS)
+def test_postgres_placeholders(sql, text, dollar, count):
+    translated = translate(sql, POSTGRES)
+    assert (translated.text, translated.dollar, translated.param_count) == (text, dollar, count)
+    assert translated.raw == sql
+
+
+@pytest.mark.parametrize('sql, text, dollar, count', PLACEHOLDERS)
+def test_sqlite_keeps_placeholders(sql, text, dollar, count):
+    translated = translate(sql, SQLITE)
+    assert (translated.text, translated.param_count) == (sql, count)
+
+
+@pytest.mark.parametrize('sql, dialect, expected', [
+    ("INSERT OR IGNORE INTO t (a) VALUES (?)", POSTGRES, "INSERT INTO t (a) VALUES (%s)\nON CONFLICT DO NOTHING"),
+    ("  insert or ignore into t (a) VALUES (?);", POSTGRES, "  INSERT INTO t (a) VALUES (%s)\nON CONFLICT DO NOTHING"),
+    ("INSERT OR IGNORE INTO t (a) VALUES (?)", SQLITE, "INSERT OR IGNORE INTO t (a) VALUES (?)"),
+    ("CREATE TABLE t (id SERIAL PRIMARY KEY, a TEXT)", SQLITE,
+     "CREATE TABLE t (id INTEGER PRIMARY KEY AUTOINCREMENT, a TEXT)"),
+    ("CREATE TABLE t (id serial primary key)", SQLITE, "CREATE TABLE t (id INTEGER PRIMARY KEY AUTOINCREMENT)"),
+    ("CREATE TABLE t (id SERIAL PRIMARY KEY)", POSTGRES, "CREATE TABLE t (id SERIAL PRIMARY KEY)"),
+    ("INSERT INTO t (a) VALUES ('SERIAL PRIMARY KEY')", SQLITE, "INSERT INTO t (a) VALUES ('SERIAL PRIMARY KEY')"),
+])
+def test_dialect_rewrites(sql, dialect, expected):
+    assert translate(sql, dialect).text == expected
+
+
+@pytest.mark.parametrize('sql, is_select', [
+    ("SELECT 1", True),
+    ("  select * FROM t", True),
+    ("WITH recent AS (SELECT * FROM t WHERE a > ?) SELECT COUNT(*) FROM recent", True),
+    ("WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 5) SELECT x FROM n", True),
+    ("WITH s AS (SELECT 'DELETE' AS word) SELECT word FROM s", True),
+    ("-- отчет\nSELECT * FROM t", True),
+    ("WITH gone AS (DELETE FROM t WHERE a = ? RETURNING id) SELECT COUNT(*) FROM gone", False),
+    ("WITH s AS (SELECT 1 AS a) INSERT INTO t (a) SELECT a FROM s", False),
+    ("UPDATE t SET a = ? WHERE id = ?", False),
+    ("INSERT INTO t (a) SELECT a FROM s", False),
+    ("CREATE TABLE t (a TEXT)", False),
+])
+def test_is_select(sql, is_select):
+    assert translate(sql, POSTGRES).is_select is is_select
+    assert translate(sql, SQLITE).is_select is is_select
+
+
+def test_statement_name_is_stable_per_text():
+    assert translate("SELECT ?", POSTGRES).statement_name == translate("SELECT ?", SQLITE).statement_name
+    assert translate("SELECT ?", POSTGRES).statement_name != translate("SELECT 1", POSTGRES).statement_name
@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from query_stats import query_stats
+
+
+@pytest.fixture
+def writer_db(tmp_path, monkeypatch):
+    """SQLite в режиме production: записи идут через поток группового commit"""
+    pytest.importorskip('psycopg2')
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'quiz.db'}")
+    monkeypatch.setenv('DB_SQLITE_MODE', 'production')
+    # Окно накопления побольше, чтобы параллельные задания попали в одну пачку
+    monkeypatch.setenv('DB_SQLITE_WRITER_LINGER_MS', '50')
+    from database import Database
+    database = Database()
+    database.execute_query("CREATE TABLE notes (id SERIAL PRIMARY KEY, body TEXT NOT NULL)")
+    yield database
+    database.close()
+
+
+def add_note(db, body, fail=False):
+    db.execute_query("INSERT INTO notes (body) VALUES (?)", (body,))
+    if fail:
+        raise ValueError(body)
+    return body
+
+
+def test_failed_job_rolls_back_only_its_savepoint(writer_db):
+    jobs = 8
+    start = threading.Barrier(jobs)
+    results = {}
+
+    def author(n):
+        start.wait()
+        try:
+            results[n] = writer_db.write(add_note, writer_db, f"note {n}", fail=n == 3)
+        except ValueError as e:
+            results[n] = e
+
+    threads = [threading.Thread(target=author, args=(n,)) for n in range(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert isinstance(results[3], ValueError)
+    assert all(results[n] == f"note {n}" for n in range(jobs) if n != 3)
+    bodies = {row['body'] for row in writer_db.execute_query("SELECT body FROM notes")}
+    assert bodies == {f"note {n}" for n in range(jobs) if n != 3}
+
+    stats = writer_db.pool_stats()['sqlite_writer']
+    # CREATE TABLE + 8 заданий; параллельные задания объединены в общие транзакции
+    assert stats['jobs'] == jobs + 1
+    assert stats['batches'] < stats['jobs']
+    assert stats['largest_batch'] > 1
+
+
+def test_writer_jobs_count_in_request_scope(writer_db):
+    query_stats.begin_request('test')
+    writer_db.write(add_note, writer_db, 'first')
+    writer_db.write(add_note, writer_db, 'second')
+    scope = query_stats.end_request()
+
+    assert scope.count == 2
+    assert sum(scope.statements.values()) == 2
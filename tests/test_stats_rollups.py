@@ -0,0 +1,48 @@
+import json
+import random
+
+import stats_rollups
+from generated_questions import save_generated_questions
+from generators import QuestionGenerator, question_category
+from session_storage import backfill_blob_sessions, save_session
+
+
+def answered(questions, correct=True):
+    return [{'user_answer': q['correct'] if correct else [], 'is_correct': correct} for q in questions]
+
+
+def test_answers_are_counted_by_question_category(db, real_bank):
+    questions = real_bank.sample(50, random.Random(2))
+    save_session(db, 'a', 'A', questions, answered(questions), 50, 100.0, 'L3')
+    save_session(db, 'b', 'B', questions[:10], answered(questions[:10], correct=False), 0, 0.0, 'L1')
+
+    expected = {}
+    for position, question in enumerate(questions):
+        answers, correct = expected.get(question_category(question), (0, 0))
+        expected[question_category(question)] = (answers + 1 + (position < 10), correct + 1)
+    categories = {row['category']: (row['answers'], round(row['correct_rate'] * row['answers'] / 100))
+                  for row in stats_rollups.by_category(db)}
+    assert len(categories) >= 2
+    assert categories == expected
+
+    # Инкременты совпадают с полным пересчетом
+    stats_rollups.rebuild_rollups(db)
+    assert {row['category']: row['answers'] for row in stats_rollups.by_category(db)} == \
+        {category: answers for category, (answers, _) in expected.items()}
+
+
+def test_backfilled_sessions_keep_their_categories(db):
+    questions = [{'question': f'Вопрос {i}?', 'type': 'single_choice', 'options': ['A', 'B'],
+                  'correct': ['A'], 'category': 'net' if i % 2 else 'storage'} for i in range(4)]
+    db.execute_query(
+        "INSERT INTO test_sessions (user_identifier, questions_data, answers_data, score, percent, level) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        ('legacy', json.dumps(questions), json.dumps(answered(questions)), 4, 100.0, 'L1')
+    )
+    assert backfill_blob_sessions(db) == 1
+    assert {row['category']: row['answers'] for row in stats_rollups.by_category(db)} == {'net': 2, 'storage': 2}
+
+
+def test_generated_questions_are_counted_with_the_insert(db):
+    result = save_generated_questions(db, QuestionGenerator(bank=False).iter_questions(120, seed=3))
+    assert stats_rollups.summary(db)['total_questions'] == result['inserted'] == 120